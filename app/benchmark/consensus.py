@@ -0,0 +1,87 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from classification.results import Levels, get_consensus, read_sintax_tsv
+from benchmark.synthetic import make_references, write_sintax_tsv
+
+
+def legacy_consensus(df: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """The original per-asv, per-level consensus loop."""
+    lst = []
+    for asv, asv_subset in df.groupby(by="asv"):
+        num_iterations = len(asv_subset)
+
+        for level in Levels.as_list():
+            best_hit_at_level, best_absolute_score_at_level = (
+                asv_subset[level]
+                .value_counts()
+                .reset_index()
+                .sort_values(by="count", ascending=False)
+                .iloc[0]
+            )
+            best_relative_score = best_absolute_score_at_level / num_iterations
+
+            lst.append(
+                [
+                    asv,
+                    level,
+                    (
+                        best_hit_at_level
+                        if best_relative_score >= threshold
+                        else "unclassified"
+                    ),
+                    best_relative_score,
+                ]
+            )
+
+    return pd.DataFrame(lst, columns=["asv", "level", "hit", "score"])
+
+
+def timed(func, *args) -> tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(num_asvs: int, iterations: int, threshold: float, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        refs = make_references(2000, seq_len=100, seed=seed)
+        sintax_tsv = write_sintax_tsv(
+            tmpdir / "sintax.tsv", refs, num_asvs, iterations, seed=seed
+        )
+
+        df, read_sec = timed(read_sintax_tsv, sintax_tsv)
+        legacy_df, legacy_sec = timed(legacy_consensus, df.astype(object), threshold)
+        vectorized_df, vectorized_sec = timed(get_consensus, df, threshold)
+
+        legacy_df.to_csv(tmpdir / "legacy.tsv", sep="\t", index=False)
+        vectorized_df.to_csv(tmpdir / "vectorized.tsv", sep="\t", index=False)
+        identical = (tmpdir / "legacy.tsv").read_bytes() == (
+            tmpdir / "vectorized.tsv"
+        ).read_bytes()
+
+    print(f"asvs: {num_asvs}, iterations: {iterations}, rows: {len(df)}")
+    print(f"read_sintax_tsv:  {read_sec:.2f}s")
+    print(f"legacy consensus: {legacy_sec:.2f}s")
+    print(f"get_consensus:    {vectorized_sec:.2f}s")
+    print(f"speedup:          {legacy_sec / vectorized_sec:.1f}x")
+    print(f"identical output: {identical}")
+
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_asvs", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("-s", "--sintax_threshold", type=float, default=0.80)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main(args.num_asvs, args.iterations, args.sintax_threshold, args.seed)
@@ -0,0 +1,117 @@
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Scripts that are started for every run (or every worker process).
+ENTRY_POINTS = ["main", "watch", "serve", "database"]
+
+# Packages that entry points may only import in the code paths that use them.
+LAZY_PACKAGES = ["plotly", "dash", "Bio"]
+
+# Maximum cumulative import time (ms) of each entry point.
+BUDGET_MS = 1500
+
+IMPORTTIME_PAT = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def importtime(module: str) -> pd.DataFrame:
+    """Self and cumulative import time (ms) of each module imported by module.
+
+    Measured with `python -X importtime` in a fresh interpreter, as the
+    scripts are started from the app directory.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr}")
+
+    rows = [
+        (name, len(indent) // 2, int(self_us) / 1000, int(cumulative_us) / 1000)
+        for line in process.stderr.splitlines()
+        if (match := IMPORTTIME_PAT.match(line))
+        for self_us, cumulative_us, indent, name in [match.groups()]
+    ]
+
+    return pd.DataFrame(rows, columns=["module", "depth", "self_ms", "cumulative_ms"])
+
+
+def total_ms(df: pd.DataFrame, module: str) -> float:
+    return df.loc[(df["module"] == module) & (df["depth"] == 0), "cumulative_ms"].sum()
+
+
+def lazy_violations(df: pd.DataFrame) -> list[str]:
+    """Top-level packages of LAZY_PACKAGES that were imported."""
+    imported = set(df["module"].str.split(".").str[0])
+
+    return [package for package in LAZY_PACKAGES if package in imported]
+
+
+def heaviest(df: pd.DataFrame, top: int) -> pd.DataFrame:
+    """Top-level packages with the most self time, summed over their modules."""
+    packages = df.assign(package=df["module"].str.split(".").str[0])
+
+    return (
+        packages.groupby("package")["self_ms"]
+        .sum()
+        .sort_values(ascending=False)
+        .head(top)
+        .reset_index()
+    )
+
+
+def main(modules: list[str], runs: int, budget_ms: float, top: int) -> bool:
+    """Print import times of modules, True if all are within budget and lazy."""
+    passed = True
+
+    for module in modules:
+        # The fastest of several runs, since the page cache and other processes
+        # only ever make imports slower.
+        runs_df = [importtime(module) for _ in range(runs)]
+        df = min(runs_df, key=lambda df: total_ms(df, module))
+        total = total_ms(df, module)
+        violations = lazy_violations(df)
+
+        print(f"{module}: {total:.0f} ms (budget {budget_ms:.0f} ms)")
+        print(heaviest(df, top).to_string(index=False, float_format="{:.1f}".format))
+
+        if total > budget_ms:
+            print(f"{module} is over budget.")
+            passed = False
+
+        if violations:
+            print(f"{module} imports {', '.join(violations)} at startup.")
+            passed = False
+
+        print()
+
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--modules", nargs="+", default=ENTRY_POINTS, help="Modules to import."
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget_ms",
+        type=float,
+        default=BUDGET_MS,
+        help="Maximum cumulative import time of each module.",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if not main(args.modules, args.runs, args.budget_ms, args.top):
+        sys.exit(1)
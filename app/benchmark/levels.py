@@ -0,0 +1,154 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from classification.results import (
+    Levels,
+    aggregate_abundance,
+    parse_headers,
+    parse_sintax_tsv,
+)
+from common.lineage import load_lineage
+from benchmark.synthetic import (
+    make_references,
+    write_lineage_db,
+    write_otutab,
+    write_sintax_tsv,
+)
+
+
+def legacy_results(
+    sintax_tsv: Path, otutab_df: pd.DataFrame, threshold: float
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """The original string based parsing, consensus and aggregation."""
+    levels = Levels.as_list()
+
+    df = pd.read_csv(
+        sintax_tsv, sep="\t", names=["asv", "ref", "num_hits", "iteration"]
+    )
+    df = pd.concat([df[["asv"]], parse_headers(df["ref"])], axis=1)
+
+    num_iterations = df.groupby(by="asv").size()
+    long_df = (
+        df[["asv", *levels]]
+        .melt(id_vars="asv", var_name="level", value_name="hit", ignore_index=False)
+        .reset_index(names="row")
+    )
+    counts_df = (
+        long_df.groupby(by=["asv", "level", "hit"], sort=False)["row"]
+        .agg(["size", "min"])
+        .reset_index()
+    )
+    counts_df["level_index"] = counts_df["level"].map(
+        {level: i for i, level in enumerate(levels)}
+    )
+    best_df = counts_df.sort_values(
+        by=["asv", "level_index", "size", "min"],
+        ascending=[True, True, False, True],
+    ).drop_duplicates(subset=["asv", "level_index"])
+    score = best_df["size"] / best_df["asv"].map(num_iterations)
+
+    parsed_df = pd.DataFrame(
+        {
+            "asv": best_df["asv"],
+            "level": best_df["level"],
+            "hit": best_df["hit"].where(score >= threshold, "unclassified"),
+            "score": score,
+        }
+    ).reset_index(drop=True)
+
+    agg_df = (
+        parsed_df.merge(otutab_df, on="asv", how="left")
+        .groupby(by=["level", "hit"])["reads"]
+        .sum()
+        .reset_index()
+    )
+    agg_df["abundance"] = agg_df["reads"] / otutab_df["reads"].sum()
+    agg_df = agg_df.sort_values(by=["level", "abundance"], ascending=[False, False])
+
+    return parsed_df, agg_df
+
+
+def coded_results(
+    sintax_tsv: Path,
+    otutab_df: pd.DataFrame,
+    threshold: float,
+    lineage: pd.DataFrame | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    parsed_df = parse_sintax_tsv(sintax_tsv, threshold, lineage)
+
+    return parsed_df, aggregate_abundance(parsed_df, otutab_df)
+
+
+def profiled(func, *args) -> tuple[tuple[pd.DataFrame, pd.DataFrame], float, float]:
+    """Runtime, and peak memory in a second (traced, hence slower) run."""
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed_sec = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed_sec, peak / 1024**2
+
+
+def main(num_asvs: int, iterations: int, threshold: float, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        refs = make_references(2000, seq_len=100, seed=seed)
+        sintax_tsv = write_sintax_tsv(
+            tmpdir / "sintax.tsv", refs, num_asvs, iterations, seed=seed
+        )
+        otutab_df = pd.read_csv(
+            write_otutab(tmpdir / "otutab.tsv", num_asvs, seed=seed), sep="\t"
+        )
+
+        # The same hits, as short headers of a database with a lineage table.
+        short_tsv = write_sintax_tsv(
+            tmpdir / "short.tsv", refs, num_asvs, iterations, seed, short_headers=True
+        )
+        lineage = load_lineage(write_lineage_db(tmpdir / "db.fasta", refs))
+
+        legacy, legacy_sec, legacy_mb = profiled(
+            legacy_results, sintax_tsv, otutab_df, threshold
+        )
+        coded, coded_sec, coded_mb = profiled(
+            coded_results, sintax_tsv, otutab_df, threshold
+        )
+        joined = coded_results(short_tsv, otutab_df, threshold, lineage)
+
+    # Compared as written, i.e. with names materialized.
+    identical = all(
+        a.to_csv(sep="\t", index=False) == b.to_csv(sep="\t", index=False)
+        for a, b in zip(legacy, coded)
+    )
+    identical_joined = all(
+        a.to_csv(sep="\t", index=False) == b.to_csv(sep="\t", index=False)
+        for a, b in zip(legacy, joined)
+    )
+
+    print(f"asvs: {num_asvs}, iterations: {iterations}")
+    print(f"legacy:        {legacy_sec:.2f}s, peak {legacy_mb:.1f} MiB")
+    print(f"integer-coded: {coded_sec:.2f}s, peak {coded_mb:.1f} MiB")
+    print(f"identical output: {identical}")
+    print(f"identical output with a lineage table: {identical_joined}")
+
+    if not (identical and identical_joined):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_asvs", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("-s", "--sintax_threshold", type=float, default=0.80)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main(args.num_asvs, args.iterations, args.sintax_threshold, args.seed)
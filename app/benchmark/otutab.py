@@ -0,0 +1,94 @@
+import argparse
+import re
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+from Bio import SeqIO
+
+from cluster.otutab import get_otutab
+from benchmark.synthetic import write_centroids
+
+
+def legacy_otutab(centroids: Path, outdir: Path) -> tuple[Path, Path]:
+    """The original Biopython and pandas implementation."""
+    size_pat = re.compile(r"size=(?P<size>\d+);$")
+
+    asv_fasta = outdir / "asv.fasta"
+    otutab_tsv = outdir / "otutab.tsv"
+
+    recs, otutab_lst = [], []
+
+    for i, rec in enumerate(SeqIO.parse(centroids, "fasta")):
+        if (match := size_pat.search(rec.description)) is None:
+            raise ValueError(f"Size missing from {rec.description}")
+
+        size = int(match.groupdict()["size"])
+        asv = f"asv_{i}"
+
+        rec.id = asv
+        rec.description = ""
+
+        if size <= 1:
+            break
+
+        otutab_lst.append([asv, size])
+        recs.append(rec)
+
+    with asv_fasta.open("w") as f:
+        SeqIO.write(recs, f, "fasta")
+
+    otutab_df = pd.DataFrame(otutab_lst, columns=["asv", "reads"])
+    otutab_df.to_csv(otutab_tsv, sep="\t", index=False)
+
+    return (asv_fasta, otutab_tsv)
+
+
+def profiled(func, *args) -> tuple[tuple[Path, Path], float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed_sec = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed_sec, peak / 1024**2
+
+
+def main(num_centroids: int, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        (legacy_dir := tmpdir / "legacy").mkdir()
+        (streaming_dir := tmpdir / "streaming").mkdir()
+
+        centroids = write_centroids(
+            tmpdir / "centroids.fasta", num_centroids, seed=seed
+        )
+
+        legacy, legacy_sec, legacy_mb = profiled(legacy_otutab, centroids, legacy_dir)
+        streaming, streaming_sec, streaming_mb = profiled(
+            get_otutab, centroids, streaming_dir
+        )
+
+        identical = all(
+            a.read_bytes() == b.read_bytes() for a, b in zip(legacy, streaming)
+        )
+
+    print(f"centroids: {num_centroids}")
+    print(f"legacy:     {legacy_sec:.2f}s, peak {legacy_mb:.1f} MiB")
+    print(f"get_otutab: {streaming_sec:.2f}s, peak {streaming_mb:.1f} MiB")
+    print(f"identical output: {identical}")
+
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_centroids", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main(args.num_centroids, args.seed)
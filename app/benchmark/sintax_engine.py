@@ -0,0 +1,161 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from classification.config import SintaxConfig
+from classification.kmer_index import write_kmer_index
+from classification.results import Levels, parse_sintax_tsv
+from classification.sintax import sintax
+from classification.sintax_numpy import sintax_numpy
+from benchmark.synthetic import Reference, make_references, mutate, write_db_fasta
+from common.fasta import write_fasta
+from reference.primers import reverse_complement
+
+
+def write_asvs(
+    asv_fasta: Path,
+    refs: list[Reference],
+    num_asvs: int,
+    error_rate: float,
+    seed: int,
+    minus_fraction: float = 0.5,
+) -> pd.DataFrame:
+    """Asvs mutated from random references, and the lineage they come from.
+
+    As with reads that are not oriented, minus_fraction of the asvs are on the
+    minus strand.
+    """
+    rng = random.Random(seed)
+    truth = {}
+
+    with asv_fasta.open("w") as f:
+        for i in range(num_asvs):
+            ref = rng.choice(refs)
+            seq = mutate(ref.seq, error_rate, rng)
+            if rng.random() < minus_fraction:
+                seq = reverse_complement(seq)
+
+            truth[f"asv_{i}"] = ref.lineage
+            write_fasta(f, f"asv_{i}", seq)
+
+    return pd.DataFrame.from_dict(truth, orient="index", columns=Levels.as_list()[::-1])
+
+
+def consensus(sintax_tsv: Path, threshold: float) -> pd.DataFrame:
+    """Consensus hit and score, one row per asv and one column pair per level."""
+    df = parse_sintax_tsv(sintax_tsv, threshold).astype({"asv": str, "hit": str})
+
+    return df.pivot(index="asv", columns="level", values=["hit", "score"])
+
+
+def accuracy(df: pd.DataFrame, truth: pd.DataFrame) -> pd.Series:
+    """Fraction of asvs with the true consensus hit, per level."""
+    hits = df["hit"].reindex(truth.index)
+
+    return pd.Series({level: (hits[level] == truth[level]).mean() for level in truth})
+
+
+def compare(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """Per level agreement of consensus hits and mean score difference."""
+    a, b = a.align(b, join="outer", axis=0)
+
+    return pd.DataFrame(
+        {
+            "agreement": [
+                (a["hit"][level] == b["hit"][level]).mean()
+                for level in Levels.as_list()
+            ],
+            "mean_abs_score_diff": [
+                (a["score"][level] - b["score"][level]).abs().mean()
+                for level in Levels.as_list()
+            ],
+        },
+        index=Levels.as_list(),
+    )
+
+
+def timed(func, *args) -> tuple[Path, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(
+    num_refs: int,
+    num_asvs: int,
+    error_rate: float,
+    threshold: float,
+    seed: int,
+    database: Path | None,
+    asv_fasta: Path | None,
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        (rs_dir := tmpdir / "sintax_rs").mkdir()
+        (numpy_dir := tmpdir / "numpy").mkdir()
+
+        # Without a database and asvs, synthetic ones with a known lineage.
+        truth = None
+        if database is None or asv_fasta is None:
+            refs = make_references(num_refs, seq_len=1500, seed=seed)
+            database = write_db_fasta(tmpdir / "db.fasta", refs)
+            asv_fasta = tmpdir / "asv.fasta"
+            truth = write_asvs(asv_fasta, refs, num_asvs, error_rate, seed)
+
+        cfg = SintaxConfig(engine="numpy")
+
+        _, index_sec = timed(write_kmer_index, database, cfg.kmer_size)
+        numpy_tsv, numpy_sec = timed(sintax_numpy, asv_fasta, database, numpy_dir, cfg)
+        numpy_df = consensus(numpy_tsv, threshold)
+
+        print(f"k-mer index: {index_sec:.2f}s")
+        print(f"numpy:       {numpy_sec:.2f}s")
+
+        if truth is not None:
+            print("numpy accuracy:")
+            print(accuracy(numpy_df, truth).to_string(float_format="{:.3f}".format))
+
+        if shutil.which("sintax_rs") is None:
+            print("sintax_rs not found, skipping the comparison.")
+            return
+
+        rs_tsv, rs_sec = timed(sintax, asv_fasta, database, rs_dir, SintaxConfig())
+        rs_df = consensus(rs_tsv, threshold)
+
+        print(f"sintax_rs:   {rs_sec:.2f}s")
+
+        if truth is not None:
+            print("sintax_rs accuracy:")
+            print(accuracy(rs_df, truth).to_string(float_format="{:.3f}".format))
+
+        print("agreement:")
+        print(compare(rs_df, numpy_df).to_string(float_format="{:.3f}".format))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_refs", type=int, default=1000)
+    parser.add_argument("--num_asvs", type=int, default=500)
+    parser.add_argument("--error_rate", type=float, default=0.01)
+    parser.add_argument("-s", "--sintax_threshold", type=float, default=0.80)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--database", default=None, help="Compare on this db.fasta (with --asv_fasta)"
+    )
+    parser.add_argument("--asv_fasta", default=None, help="Asvs to classify")
+    args = parser.parse_args()
+
+    main(
+        args.num_refs,
+        args.num_asvs,
+        args.error_rate,
+        args.sintax_threshold,
+        args.seed,
+        Path(args.database) if args.database else None,
+        Path(args.asv_fasta) if args.asv_fasta else None,
+    )
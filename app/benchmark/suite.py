@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+from pydantic import BaseModel
+
+from benchmark import synthetic
+from blast.parse import parse_blast_tsv
+from classification.results import (
+    get_results,
+    get_sankey_fig,
+    parse_sintax_tsv,
+    pivot_df,
+)
+from classification.report import write_plotly_js, write_report
+from cluster.otutab import get_otutab
+from database import write_db
+
+# External tools needed for the end-to-end benchmark.
+TOOLS = ("fastq_rs", "usearch", "sintax_rs")
+
+
+class Size(BaseModel):
+    """Input sizes for one benchmark round."""
+
+    num_refs: int
+    num_asvs: int
+    iterations: int
+    hits_per_asv: int
+    num_centroids: int
+    num_reads: int
+
+
+SIZES = {
+    "small": Size(
+        num_refs=200,
+        num_asvs=50,
+        iterations=100,
+        hits_per_asv=20,
+        num_centroids=500,
+        num_reads=500,
+    ),
+    "medium": Size(
+        num_refs=2000,
+        num_asvs=500,
+        iterations=100,
+        hits_per_asv=50,
+        num_centroids=5000,
+        num_reads=5000,
+    ),
+    "large": Size(
+        num_refs=20000,
+        num_asvs=5000,
+        iterations=100,
+        hits_per_asv=100,
+        num_centroids=50000,
+        num_reads=50000,
+    ),
+}
+
+
+class Inputs(BaseModel):
+    """Synthetic input files for one size."""
+
+    db_fasta: Path
+    emu_fasta: Path
+    emu_taxonomy: Path
+    sintax_tsv: Path
+    otutab_tsv: Path
+    centroids: Path
+    blast_tsv: Path
+    reads: Path | None
+
+
+def make_inputs(size: Size, outdir: Path, reads: bool, seed: int) -> Inputs:
+    refs = synthetic.make_references(size.num_refs, seed=seed)
+    emu_fasta, emu_taxonomy = synthetic.write_emu_files(outdir, refs)
+
+    return Inputs(
+        db_fasta=synthetic.write_db_fasta(outdir / "db.fasta", refs),
+        emu_fasta=emu_fasta,
+        emu_taxonomy=emu_taxonomy,
+        sintax_tsv=synthetic.write_sintax_tsv(
+            outdir / "sintax.tsv", refs, size.num_asvs, size.iterations, seed=seed
+        ),
+        otutab_tsv=synthetic.write_otutab(
+            outdir / "otutab.tsv", size.num_asvs, seed=seed
+        ),
+        centroids=synthetic.write_centroids(
+            outdir / "centroids.fasta", size.num_centroids, seed=seed
+        ),
+        blast_tsv=synthetic.write_blast_tsv(
+            outdir / "blast.tsv", refs, size.num_asvs, size.hits_per_asv, seed=seed
+        ),
+        reads=(
+            synthetic.write_reads(
+                outdir / "reads.fastq.gz", refs, size.num_reads, seed=seed
+            )
+            if reads
+            else None
+        ),
+    )
+
+
+def run_end_to_end(inputs: Inputs, workdir: Path) -> None:
+    from main import run_sample
+
+    run_sample(inputs.reads, inputs.db_fasta, 0.8, False, workdir)
+
+
+def report_stage(inputs: Inputs, workdir: Path) -> None:
+    get_results(inputs.sintax_tsv, inputs.otutab_tsv, 0.8, workdir)
+    shutil.copyfile(inputs.otutab_tsv, workdir / "otutab.tsv")
+    write_report(workdir, write_plotly_js(workdir))
+
+
+def get_stages(inputs: Inputs) -> dict[str, Callable[[Path], object]]:
+    """Python-side stages, each called with an empty working directory.
+
+    Decorated stages are called through __wrapped__, so that the spinner and
+    metrics bookkeeping are not part of the timing.
+    """
+    pivoted_df = pivot_df(parse_sintax_tsv(inputs.sintax_tsv, 0.8))
+
+    stages = {
+        "parse_sintax_tsv": lambda _: parse_sintax_tsv(inputs.sintax_tsv, 0.8),
+        "get_results": lambda workdir: get_results(
+            inputs.sintax_tsv, inputs.otutab_tsv, 0.8, workdir
+        ),
+        "get_otutab": lambda workdir: get_otutab(inputs.centroids, workdir),
+        "parse_blast_tsv": lambda _: parse_blast_tsv(inputs.blast_tsv),
+        "write_db": lambda workdir: write_db.__wrapped__(
+            workdir, inputs.emu_fasta, inputs.emu_taxonomy
+        ),
+        "get_sankey_fig": lambda _: get_sankey_fig(pivoted_df),
+        "write_report": lambda workdir: report_stage(inputs, workdir),
+    }
+
+    if inputs.reads is not None:
+        stages["run_sample"] = lambda workdir: run_end_to_end(inputs, workdir)
+
+    return stages
+
+
+def time_stage(stage: Callable[[Path], object], repeats: int) -> float:
+    """Best of `repeats` wall times, each in a fresh working directory."""
+    timings = []
+
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Some stages show plots, which print to stdout when headless.
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                stage(Path(tmp))
+                timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def run_suite(
+    sizes: list[str], repeats: int, end_to_end: bool, seed: int
+) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+
+    for size_name in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            inputs = make_inputs(SIZES[size_name], Path(tmp), end_to_end, seed)
+
+            for stage_name, stage in get_stages(inputs).items():
+                elapsed_sec = time_stage(stage, repeats)
+                results.setdefault(stage_name, {})[size_name] = elapsed_sec
+                print(f"{size_name:<8}{stage_name:<20}{elapsed_sec:.3f}s")
+
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+    min_diff_sec: float,
+) -> pd.DataFrame:
+    """Stages that are more than `tolerance` (relative) slower than the baseline.
+
+    Differences below min_diff_sec are considered noise.
+    """
+    rows = [
+        [stage, size, baseline[stage][size], elapsed_sec]
+        for stage, sizes in results.items()
+        for size, elapsed_sec in sizes.items()
+        if size in baseline.get(stage, {})
+    ]
+    df = pd.DataFrame(rows, columns=["stage", "size", "baseline_sec", "current_sec"])
+    df["ratio"] = df["current_sec"] / df["baseline_sec"]
+    df["regression"] = (df["ratio"] > 1 + tolerance) & (
+        df["current_sec"] - df["baseline_sec"] > min_diff_sec
+    )
+
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=list(SIZES),
+        default=["small", "medium"],
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--end_to_end",
+        action="store_true",
+        help=f"Also time run_sample on synthetic reads (needs {', '.join(TOOLS)})",
+    )
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="Baseline json to compare against")
+    parser.add_argument("--save_baseline", help="Write the results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min_diff_sec", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.end_to_end and (missing := [t for t in TOOLS if not shutil.which(t)]):
+        parser.error(f"--end_to_end needs {', '.join(missing)} on PATH")
+
+    results = run_suite(args.sizes, args.repeats, args.end_to_end, args.seed)
+
+    report = {
+        "metadata": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["results"]
+        df = find_regressions(results, baseline, args.tolerance, args.min_diff_sec)
+        print(df.to_string(index=False))
+
+        if df["regression"].any():
+            print("Performance regressions found.")
+            sys.exit(1)
@@ -0,0 +1,256 @@
+import gzip
+import random
+from pathlib import Path
+
+import pandas as pd
+from pydantic import BaseModel
+
+from common.fasta import write_fasta
+from common.lineage import RANKS as RANK_NAMES
+from common.lineage import short_header, write_lineage, write_manifest
+
+RANKS = ["d", "p", "c", "o", "f", "g", "s"]
+
+
+class Reference(BaseModel):
+    accession: str
+    tax_id: int
+    lineage: list[str]
+    seq: str
+
+    @property
+    def header(self) -> str:
+        """db.fasta header, as written by database.write_db."""
+        taxonomy = "|".join(f"{rank}:{name}" for rank, name in zip(RANKS, self.lineage))
+        return f"accession={self.accession};tax_id={self.tax_id};taxonomy={taxonomy}"
+
+    @property
+    def short_header(self) -> str:
+        """db.fasta header of a database with a lineage table."""
+        return short_header(self.accession, self.tax_id)
+
+
+def mutate(seq: str, rate: float, rng: random.Random) -> str:
+    """Random substitutions at the given per-base rate."""
+    return "".join(
+        rng.choice("ACGT".replace(base, "")) if rng.random() < rate else base
+        for base in seq
+    )
+
+
+def make_references(
+    num_refs: int, seq_len: int = 1500, seed: int = 42
+) -> list[Reference]:
+    """16S-like references, where species of the same genus differ by ~2%."""
+    rng = random.Random(seed)
+
+    num_genera = max(1, num_refs // 10)
+    root = "".join(rng.choices("ACGT", k=seq_len))
+    genera = [mutate(root, 0.10, rng) for _ in range(num_genera)]
+
+    refs = []
+    for i in range(num_refs):
+        genus = rng.randrange(num_genera)
+        lineage = [
+            "bacteria",
+            f"phylum_{genus % 5}",
+            f"class_{genus % 11}",
+            f"order_{genus % 23}",
+            f"family_{genus % 47}",
+            f"genus_{genus}",
+            f"species_{i}",
+        ]
+        refs.append(
+            Reference(
+                accession=f"NR_{i:06d}.1",
+                tax_id=i,
+                lineage=lineage,
+                seq=mutate(genera[genus], 0.02, rng),
+            )
+        )
+
+    return refs
+
+
+def write_db_fasta(db_fasta: Path, refs: list[Reference]) -> Path:
+    with db_fasta.open("w") as f:
+        for ref in refs:
+            write_fasta(f, ref.header, ref.seq)
+
+    return db_fasta
+
+
+def write_lineage_db(db_fasta: Path, refs: list[Reference]) -> Path:
+    """db.fasta with short headers, its lineage table and manifest."""
+    with db_fasta.open("w") as f:
+        for ref in refs:
+            write_fasta(f, ref.short_header, ref.seq)
+
+    lineage_df = pd.DataFrame(
+        [[ref.tax_id, *ref.lineage] for ref in refs], columns=["tax_id", *RANK_NAMES]
+    )
+    write_lineage(lineage_df, db_fasta)
+    write_manifest(db_fasta, len(refs))
+
+    return db_fasta
+
+
+def write_emu_files(outdir: Path, refs: list[Reference]) -> tuple[Path, Path]:
+    """emu.fasta and emu.tsv in the format of the EMU database."""
+    emu_fasta = outdir / "emu.fasta"
+    emu_taxonomy = outdir / "emu.tsv"
+
+    with emu_fasta.open("w") as f:
+        for i, ref in enumerate(refs):
+            write_fasta(f, f"{ref.tax_id}:emu_db:{i} {ref.accession} 16S", ref.seq)
+
+    with emu_taxonomy.open("w") as f:
+        f.write(
+            "tax_id\tspecies\tgenus\tfamily\torder\tclass\tphylum\tclade"
+            "\tsuperkingdom\tsubspecies\tspecies subgroup\tspecies group\n"
+        )
+        for ref in refs:
+            domain, phylum, clas, order, family, genus, species = ref.lineage
+            f.write(
+                f"{ref.tax_id}\t{species}\t{genus}\t{family}\t{order}\t{clas}"
+                f"\t{phylum}\t\t{domain}\t\t\t\n"
+            )
+
+    return emu_fasta, emu_taxonomy
+
+
+def nanopore_read(seq: str, error_rate: float, rng: random.Random) -> tuple[str, str]:
+    """Read with Nanopore-like errors, roughly half substitutions and half indels.
+
+    Returns the read and its phred+33 quality string, where erroneous bases
+    get low qualities.
+    """
+    bases, quals = [], []
+
+    for base in seq:
+        if rng.random() >= error_rate:
+            bases.append(base)
+            quals.append(rng.randint(15, 40))
+            continue
+
+        match rng.random():
+            case r if r < 0.5:
+                bases.append(rng.choice("ACGT".replace(base, "")))
+                quals.append(rng.randint(2, 12))
+            case r if r < 0.75:
+                bases += [base, rng.choice("ACGT")]
+                quals += [rng.randint(15, 40), rng.randint(2, 12)]
+            case _:
+                pass
+
+    return "".join(bases), "".join(chr(q + 33) for q in quals)
+
+
+def write_reads(
+    fastq_gz: Path,
+    refs: list[Reference],
+    num_reads: int,
+    error_rate: float = 0.05,
+    num_taxa: int = 20,
+    seed: int = 42,
+) -> Path:
+    """Full-length 16S reads from a skewed community of num_taxa references."""
+    rng = random.Random(seed)
+
+    community = rng.sample(refs, k=min(num_taxa, len(refs)))
+    weights = [rng.paretovariate(1.0) for _ in community]
+
+    with gzip.open(fastq_gz, "wt") as f:
+        for i in range(num_reads):
+            ref = rng.choices(community, weights=weights)[0]
+            seq, qual = nanopore_read(ref.seq, error_rate, rng)
+            f.write(f"@read_{i} ref={ref.accession}\n{seq}\n+\n{qual}\n")
+
+    return fastq_gz
+
+
+def write_sintax_tsv(
+    sintax_tsv: Path,
+    refs: list[Reference],
+    num_asvs: int,
+    iterations: int,
+    seed: int = 42,
+    short_headers: bool = False,
+) -> Path:
+    """Sintax output where each asv bootstraps between a few references.
+
+    With short_headers, hits refer to a database written by write_lineage_db.
+    """
+    rng = random.Random(seed)
+    headers = [ref.short_header if short_headers else ref.header for ref in refs]
+
+    with sintax_tsv.open("w") as f:
+        for i in range(num_asvs):
+            candidates = rng.sample(headers, k=rng.randint(1, 4))
+            weights = [rng.random() for _ in candidates]
+
+            for iteration in range(iterations):
+                ref = rng.choices(candidates, weights=weights)[0]
+                f.write(f"asv_{i}\t{ref}\t{rng.randint(1, 32)}\t{iteration}\n")
+
+    return sintax_tsv
+
+
+def write_centroids(
+    centroids: Path, num_centroids: int, seq_len: int = 1500, seed: int = 42
+) -> Path:
+    """Centroids with usearch -sizeout headers, sorted by decreasing size."""
+    rng = random.Random(seed)
+
+    # Roughly a fifth of the centroids are singletons.
+    sizes = sorted(
+        (
+            1 if rng.random() < 0.2 else int(rng.paretovariate(1.0) * 2)
+            for _ in range(num_centroids)
+        ),
+        reverse=True,
+    )
+
+    with centroids.open("w") as f:
+        for i, size in enumerate(sizes):
+            seq = "".join(rng.choices("ACGT", k=seq_len))
+            f.write(f">read_{i} runid=abc;size={size};\n{seq}\n")
+
+    return centroids
+
+
+def write_otutab(otutab_tsv: Path, num_asvs: int, seed: int = 42) -> Path:
+    rng = random.Random(seed)
+
+    with otutab_tsv.open("w") as f:
+        f.write("asv\treads\n")
+        for i in range(num_asvs):
+            f.write(f"asv_{i}\t{rng.randint(2, 5000)}\n")
+
+    return otutab_tsv
+
+
+def write_blast_tsv(
+    blast_tsv: Path,
+    refs: list[Reference],
+    num_asvs: int,
+    hits_per_asv: int,
+    seed: int = 42,
+) -> Path:
+    """blastn -outfmt 6 output with the references as query and asvs as subject."""
+    rng = random.Random(seed)
+
+    with blast_tsv.open("w") as f:
+        for i in range(num_asvs):
+            for ref in rng.sample(refs, k=min(hits_per_asv, len(refs))):
+                qlen = len(ref.seq)
+                slen = qlen + rng.randint(-20, 20)
+                length = min(qlen, slen) - rng.randint(0, 200)
+                pident = rng.uniform(85, 100)
+
+                f.write(
+                    f"{ref.header}\t{qlen}\t1\t{length}\t1\tasv_{i}\t{slen}"
+                    f"\t1\t{length}\t1\t{length}\t{pident:.3f}\n"
+                )
+
+    return blast_tsv
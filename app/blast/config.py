@@ -15,3 +15,8 @@ class ParseConfig(BaseModel):
 
     pident: float = 0.90
     perc_aln: float = 0.90
+    # Number of hits to report per asv. Hits with equal scores share a rank, of
+    # those the first in blast.tsv are reported.
+    top_n: int = 1
+    # Rows read at a time, bounds memory for large blast.tsv files.
+    chunk_size: int = 1_000_000
@@ -1,25 +1,87 @@
 from .config import BlastnConfig
-from .parse import parse_blast_tsv
-from sh import blastn, makeblastdb, RunningCommand
+from .parse import COLS, parse_blast_tsv
+from sh import RunningCommand
 from pathlib import Path
+import json
 import logging
 from common.decorator import with_yaspin
+from common.cache import cached, file_digest
+from common.memo import memoized_tsv
+from common.lineage import load_lineage
 
 log = logging.getLogger(__name__)
 
+OUTFMT = (
+    "6 qseqid qlen qstart qend qframe {subject} slen sstart send sframe length pident"
+)
 
-def run_makeblastdb(asv_fasta: Path, outdir: Path) -> Path:
-    nucl_db = outdir / "nucl_db"
 
-    makeblastdb("-in", asv_fasta, "-dbtype", "nucl", "-out", nucl_db)
+def get_blast_db_prefix(db_fasta: Path) -> Path:
+    """Prefix of the prebuilt BLAST database for db_fasta, e.g. db.fasta -> db."""
+    return db_fasta.with_suffix("")
+
+
+def blast_db_manifest_path(db_fasta: Path) -> Path:
+    return db_fasta.with_name(f"{db_fasta.stem}.blastdb.json")
+
+
+def find_blast_db(db_fasta: Path) -> Path | None:
+    """Prebuilt BLAST database for db_fasta, if one exists and matches it."""
+    prefix = get_blast_db_prefix(db_fasta)
+
+    if not any(
+        prefix.with_name(prefix.name + ext).is_file() for ext in (".nal", ".nin")
+    ):
+        return None
+
+    manifest_json = blast_db_manifest_path(db_fasta)
+    if not manifest_json.is_file():
+        built_from = None
+    else:
+        built_from = json.loads(manifest_json.read_text())["sha256"]
+
+    if built_from != file_digest(db_fasta):
+        log.warning(
+            f"BLAST database {prefix} was not built from {db_fasta}, ignoring it. "
+            "Rebuild it with database.py --blast_db."
+        )
+        return None
+
+    return prefix
+
+
+def run_makeblastdb(fasta: Path, nucl_db: Path) -> Path:
+    # Imported here, so that the database and benchmark modules import without BLAST.
+    from sh import makeblastdb
+
+    makeblastdb("-in", fasta, "-dbtype", "nucl", "-out", nucl_db)
+    return nucl_db
+
+
+def build_blast_db(db_fasta: Path) -> Path:
+    """Prebuilt BLAST database of db_fasta, with the checksum it was built from."""
+    nucl_db = run_makeblastdb(db_fasta, get_blast_db_prefix(db_fasta))
+
+    blast_db_manifest_path(db_fasta).write_text(
+        json.dumps({"name": db_fasta.name, "sha256": file_digest(db_fasta)}, indent=2)
+    )
+
     return nucl_db
 
 
-def run_blastn(database: Path, nucl_db: Path, outdir: Path, cfg: BlastnConfig) -> Path:
+def run_blastn(
+    query: Path,
+    nucl_db: Path,
+    outdir: Path,
+    cfg: BlastnConfig,
+    subject_field: str = "sseqid",
+) -> Path:
+    from sh import blastn
+
     blast_tsv = outdir / "blast.tsv"
     rc: RunningCommand = blastn(
         "-query",
-        database,
+        query,
         "-db",
         nucl_db,
         "-num_threads",
@@ -33,7 +95,7 @@ def run_blastn(database: Path, nucl_db: Path, outdir: Path, cfg: BlastnConfig) -
         "-out",
         blast_tsv,
         "-outfmt",
-        "6 qseqid qlen qstart qend qframe sseqid slen sstart send sframe length pident",
+        OUTFMT.format(subject=subject_field),
         _return_cmd=True,
     )
 
@@ -45,16 +107,62 @@ def run_blastn(database: Path, nucl_db: Path, outdir: Path, cfg: BlastnConfig) -
     return blast_tsv
 
 
+@cached("blast.tsv")
+def search(asv_fasta: Path, db_fasta: Path, outdir: Path, cfg: BlastnConfig) -> Path:
+    """Reference sequences as query against a per-sample database of the asvs."""
+    nucl_db = run_makeblastdb(asv_fasta, outdir / "nucl_db")
+
+    return run_blastn(db_fasta, nucl_db, outdir, cfg)
+
+
+@cached("blast.tsv")
+def search_prebuilt(
+    asv_fasta: Path, db_fasta: Path, outdir: Path, cfg: BlastnConfig
+) -> Path:
+    """Asvs as query against the prebuilt database of the reference sequences."""
+    nucl_db = get_blast_db_prefix(db_fasta)
+
+    # Databases built without -parse_seqids only keep the full header as title.
+    return run_blastn(asv_fasta, nucl_db, outdir, cfg, subject_field="stitle")
+
+
 @with_yaspin(progress_text="Running BLASTn classification...")
-def run_blast(asv_fasta: Path, db_fasta: Path, outdir: Path) -> Path:
+def run_blast(
+    asv_fasta: Path, db_fasta: Path, outdir: Path, cfg: BlastnConfig | None = None
+) -> Path:
     # Create sub-directory for BLAST results.
     outdir = outdir / "blast"
     outdir.mkdir(exist_ok=True)
 
-    cfg = BlastnConfig()
-
-    nucl_db = run_makeblastdb(asv_fasta, outdir)
-
-    blast_tsv = run_blastn(db_fasta, nucl_db, outdir, cfg)
+    cfg = cfg or BlastnConfig()
 
-    return parse_blast_tsv(blast_tsv)
+    # Only asvs that are not in the classification memo are BLASTed.
+    match find_blast_db(db_fasta):
+        case None:
+            blast_tsv = memoized_tsv(
+                "blastn",
+                db_fasta,
+                cfg,
+                asv_fasta,
+                outdir / "blast.tsv",
+                id_col=COLS.index("subject_id"),
+                run=lambda query, query_outdir: search(
+                    query, db_fasta, query_outdir, cfg
+                ),
+            )
+            return parse_blast_tsv(blast_tsv, lineage=load_lineage(db_fasta))
+        case _:
+            blast_tsv = memoized_tsv(
+                "blastn_prebuilt",
+                db_fasta,
+                cfg,
+                asv_fasta,
+                outdir / "blast.tsv",
+                id_col=COLS.index("query_id"),
+                run=lambda query, query_outdir: search_prebuilt(
+                    query, db_fasta, query_outdir, cfg
+                ),
+            )
+            return parse_blast_tsv(
+                blast_tsv, asvs_as_query=True, lineage=load_lineage(db_fasta)
+            )
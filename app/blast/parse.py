@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
 from .config import ParseConfig
+from common.lineage import split_headers
 
 log = logging.getLogger(__name__)
 
@@ -21,34 +23,122 @@ COLS = [
 ]
 
 
-def get_best_hit_per_asv(s: pd.DataFrame) -> pd.DataFrame:
-    return s.sort_values(by=["pident", "perc_aln"], ascending=[False, False]).iloc[0]
+DTYPES = {
+    "query_id": str,
+    "query_len": "int32",
+    "query_start": "int32",
+    "query_end": "int32",
+    "query_frame": "int8",
+    "subject_id": str,
+    "subject_len": "int32",
+    "subject_start": "int32",
+    "subject_end": "int32",
+    "subject_frame": "int8",
+    "alignment_len": "int32",
+    "pident": "float64",
+}
 
 
-def parse_blast_tsv(blast_tsv: Path) -> pd.DataFrame:
-    cfg = ParseConfig()
-    df = pd.read_csv(blast_tsv, sep="\t", names=COLS)
+def rank_hits(df: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    """Rank hits per asv by pident and perc_aln, keep the top_n ranks.
 
+    Hits with equal scores share a rank (dense ranking), so all hits tied with
+    the top_n-th best are kept and there may be more than top_n hits per asv.
+    This is what lets parse_blast_tsv count ties over all chunks, before it
+    cuts the hits to top_n. Ties keep their order in blast.tsv.
+    """
+    df = df.sort_values(
+        by=["subject_id", "pident", "perc_aln"],
+        ascending=[True, False, False],
+        kind="stable",
+    )
+
+    same_as_previous = (
+        df["subject_id"].eq(df["subject_id"].shift())
+        & df["pident"].eq(df["pident"].shift())
+        & df["perc_aln"].eq(df["perc_aln"].shift())
+    )
+    rank = (~same_as_previous).groupby(df["subject_id"]).cumsum()
+
+    return df.assign(rank=rank)[rank <= top_n]
+
+
+def filter_hits(df: pd.DataFrame, cfg: ParseConfig) -> pd.DataFrame:
     df = df.assign(
-        perc_aln=df["alignment_len"] / df[["subject_len", "query_len"]].min(axis=1),
+        perc_aln=df["alignment_len"] / np.minimum(df["subject_len"], df["query_len"]),
         # Note, it is rather inefficient to convert to fraction, so for performance reasons
         # we should actually stick with percent.
         pident=df["pident"] / 100,
     )
 
     # Remove low quality hits.
-    df = df.query(f"pident >= {cfg.pident} and perc_aln >= {cfg.perc_aln}")
+    df = df[(df["pident"] >= cfg.pident) & (df["perc_aln"] >= cfg.perc_aln)]
+
+    return rank_hits(df, cfg.top_n).drop(columns="rank")
+
+
+def swap_query_subject(col: str) -> str:
+    if col.startswith("query_"):
+        return col.replace("query_", "subject_", 1)
+    if col.startswith("subject_"):
+        return col.replace("subject_", "query_", 1)
+    return col
+
+
+def parse_blast_tsv(
+    blast_tsv: Path,
+    asvs_as_query: bool = False,
+    cfg: ParseConfig | None = None,
+    lineage: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """Best reference hit(s) per asv.
+
+    By default the reference sequences are the query and the asvs the subject.
+    With asvs_as_query (prebuilt reference database) the roles are swapped back
+    on read, so that subject_id is always the asv.
+
+    Returns at most cfg.top_n hits per asv, best first. Of hits with equal
+    scores, the first in blast.tsv are reported, so with the default top_n=1
+    there is exactly one hit per asv. num_ties is the number of hits that are
+    tied with the best one (including itself), reported or not. With the lineage
+    table of the database, species are looked up by tax_id instead of parsed
+    from the reference headers.
+    """
+    cfg = cfg or ParseConfig()
+    names = [swap_query_subject(col) for col in COLS] if asvs_as_query else COLS
+
+    # Only the top ranked hits of each chunk are kept, so memory is bounded by
+    # the chunk size plus the number of asvs times top_n.
+    chunks = pd.read_csv(
+        blast_tsv,
+        sep="\t",
+        names=names,
+        dtype={name: DTYPES[col] for name, col in zip(names, COLS)},
+        chunksize=cfg.chunk_size,
+    )
+    df = pd.concat(
+        [filter_hits(chunk[COLS], cfg) for chunk in chunks]
+        or [pd.DataFrame(columns=COLS).astype(DTYPES).assign(perc_aln=0.0)]
+    )
+
+    # Get the best database hit(s) per asv, ties are counted before the cut.
+    df = rank_hits(df, cfg.top_n)
+    df["num_ties"] = (df["rank"] == 1).groupby(df["subject_id"]).transform("sum")
+    df = df.groupby(by="subject_id").head(cfg.top_n).reset_index(drop=True)
 
-    # Get the best database hit per asv.
-    df = df.groupby(by="subject_id").apply(get_best_hit_per_asv).reset_index(drop=True)
-    assert df["subject_id"].is_unique
+    if cfg.top_n == 1:
+        assert df["subject_id"].is_unique
 
     # Extract species, remove all other taxonomy.
-    df["species"] = df["query_id"].str.extract(r"s:(?P<species>.*)$")
+    if lineage is not None:
+        tax_ids = split_headers(df["query_id"])["tax_id"]
+        df["species"] = tax_ids.map(lineage["species"])
+    else:
+        df["species"] = df["query_id"].str.extract(r"s:(?P<species>.*)$", expand=False)
     assert df["species"].isna().sum() == 0
 
     # NOTE - this log warning probably won't show due to yaspin.
     if df.empty:
         log.warning("No valid BLAST hits found.")
 
-    return df[["subject_id", "species", "pident", "perc_aln"]]
+    return df[["subject_id", "species", "pident", "perc_aln", "rank", "num_ties"]]
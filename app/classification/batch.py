@@ -0,0 +1,63 @@
+from pathlib import Path
+from common.fasta import read_fasta, write_fasta
+
+# Separates the sample name from the asv in pooled query ids.
+SEPARATOR = "::"
+
+
+def pool_asvs(
+    asv_fastas: dict[str, Path], pooled_fasta: Path
+) -> dict[str, list[tuple[str, str]]]:
+    """Write the unique asv sequences of all samples to one query fasta.
+
+    Each unique sequence is written once, with the sample-prefixed id of its
+    first occurrence. Returns the (sample_name, asv) pairs behind each pooled id.
+    """
+    pooled_ids: dict[str, str] = {}
+    members: dict[str, list[tuple[str, str]]] = {}
+
+    with pooled_fasta.open("w") as f:
+        for sample_name, asv_fasta in asv_fastas.items():
+            for asv, seq in read_fasta(asv_fasta):
+                if (pooled_id := pooled_ids.get(seq)) is None:
+                    pooled_id = pooled_ids[seq] = f"{sample_name}{SEPARATOR}{asv}"
+                    members[pooled_id] = []
+                    write_fasta(f, pooled_id, seq)
+
+                members[pooled_id].append((sample_name, asv))
+
+    return members
+
+
+def split_sintax_tsv(
+    pooled_tsv: Path,
+    members: dict[str, list[tuple[str, str]]],
+    sample_dirs: dict[str, Path],
+) -> dict[str, Path]:
+    """Write the pooled sintax results back to a sintax.tsv per sample."""
+    sintax_tsvs = {
+        sample_name: sample_dir / "sintax.tsv"
+        for sample_name, sample_dir in sample_dirs.items()
+    }
+
+    # May be stage cache links, see common.cache.link_or_copy.
+    for sintax_tsv in sintax_tsvs.values():
+        sintax_tsv.unlink(missing_ok=True)
+
+    handles = {
+        sample_name: sintax_tsv.open("w")
+        for sample_name, sintax_tsv in sintax_tsvs.items()
+    }
+
+    try:
+        with pooled_tsv.open("r") as f:
+            for line in f:
+                pooled_id, rest = line.split("\t", 1)
+
+                for sample_name, asv in members[pooled_id]:
+                    handles[sample_name].write(f"{asv}\t{rest}")
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    return sintax_tsvs
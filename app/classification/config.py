@@ -0,0 +1,14 @@
+from pathlib import Path
+from typing import Literal
+from pydantic import BaseModel
+
+
+class SintaxConfig(BaseModel):
+    num_query_hashes: int = 32
+    num_bootstrap: int = 100
+    kmer_size: int = 15
+    # sintax_rs, or the in-process engine with a k-mer index (sintax_numpy).
+    engine: Literal["sintax_rs", "numpy"] = "sintax_rs"
+    # Socket of a running daemon (see daemon.py) that classifies for the numpy
+    # engine, with the index already loaded.
+    socket: Path | None = None
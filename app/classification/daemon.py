@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, TextIO
+from common.cache import cached, file_digest
+from common.fasta import read_fasta
+from .config import SintaxConfig
+from .kmer_index import KmerIndex, get_kmer_index
+from .sintax_numpy import bootstrap
+from itertools import islice
+import json
+import logging
+import socket
+import socketserver
+import threading
+
+log = logging.getLogger(__name__)
+
+# Asvs per request, so that large samples are streamed in parts.
+BATCH_SIZE = 500
+
+# Seconds to wait for a daemon to answer a request.
+TIMEOUT = 600
+
+
+class SintaxServer(socketserver.ThreadingUnixStreamServer):
+    """Classifies asvs against a k-mer index that stays loaded between requests.
+
+    Requests and responses are JSON objects, one per line:
+
+    {"op": "info"} -> {"database": ..., "sha256": ..., "kmer_size": ...}
+    {"op": "classify", "config": {...}, "sequences": [[header, seq], ...]}
+        -> {"rows": [[header, ref_header, hits, iteration], ...]}
+
+    Failed requests get {"error": ...}. Each connection is handled in a thread
+    of its own, and a connection may send any number of requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, database: Path, kmer_size: int):
+        self.database = database
+        self.kmer_size = kmer_size
+        self._lock = threading.Lock()
+
+        # Loaded (and if needed built) before accepting connections.
+        self.index()
+
+        super().__init__(str(socket_path), SintaxHandler)
+
+    def index(self) -> KmerIndex:
+        """The index of the current database, reloaded if it has changed."""
+        with self._lock:
+            return get_kmer_index(self.database, self.kmer_size)
+
+    def info(self) -> dict:
+        return {
+            "database": str(self.database.resolve()),
+            "sha256": file_digest(self.database),
+            "kmer_size": self.kmer_size,
+        }
+
+    def classify(self, cfg: SintaxConfig, sequences: list[list[str]]) -> list[list]:
+        if cfg.kmer_size != self.kmer_size:
+            raise ValueError(f"Serving k={self.kmer_size}, got k={cfg.kmer_size}")
+
+        index = self.index()
+
+        return [
+            [header, index.header(ref), num_hits, iteration]
+            for header, seq in sequences
+            for ref, num_hits, iteration in bootstrap(seq, index, cfg)
+        ]
+
+    def respond(self, request: dict) -> dict:
+        match request:
+            case {"op": "info"}:
+                return self.info()
+            case {"op": "classify", "config": config, "sequences": sequences}:
+                cfg = SintaxConfig.model_validate(config)
+                return {"rows": self.classify(cfg, sequences)}
+            case _:
+                raise ValueError(f"Unknown request {request}")
+
+
+class SintaxHandler(socketserver.StreamRequestHandler):
+    server: SintaxServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self.server.respond(json.loads(line))
+            except Exception as e:
+                log.exception("Request failed.")
+                response = {"error": repr(e)}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+@contextmanager
+def connect(socket_path: Path) -> Iterator[TextIO]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT)
+        sock.connect(str(socket_path))
+
+        with sock.makefile("rw", encoding="utf-8") as f:
+            yield f
+
+
+def request(f: TextIO, request: dict) -> dict:
+    f.write(json.dumps(request) + "\n")
+    f.flush()
+
+    response = json.loads(f.readline() or "null")
+    match response:
+        case None:
+            raise ConnectionError("Connection closed by the sintax daemon.")
+        case {"error": error}:
+            raise RuntimeError(f"Sintax daemon: {error}")
+
+    return response
+
+
+def is_serving(socket_path: Path, database: Path, kmer_size: int) -> bool:
+    """If a daemon at socket_path serves (a copy of) database with kmer_size."""
+    try:
+        with connect(socket_path) as f:
+            info = request(f, {"op": "info"})
+    except (OSError, ValueError, RuntimeError):
+        # Nothing listening, or a reply that is not valid JSON or an error.
+        return False
+
+    match info:
+        case {"sha256": str(sha256), "kmer_size": int(served_kmer_size)}:
+            return sha256 == file_digest(database) and served_kmer_size == kmer_size
+        case _:
+            return False
+
+
+@cached("sintax.tsv")
+def sintax_daemon(
+    asv_fasta: Path, database: Path, outdir: Path, cfg: SintaxConfig
+) -> Path:
+    """sintax_numpy, but classified by the daemon at cfg.socket."""
+    sintax_tsv = outdir / "sintax.tsv"
+    config = cfg.model_dump(mode="json", exclude={"socket"})
+    records = read_fasta(asv_fasta)
+
+    with connect(cfg.socket) as conn, sintax_tsv.open("w") as f:
+        while batch := list(islice(records, BATCH_SIZE)):
+            response = request(
+                conn, {"op": "classify", "config": config, "sequences": batch}
+            )
+
+            for header, ref_header, num_hits, iteration in response["rows"]:
+                f.write(f"{header}\t{ref_header}\t{num_hits}\t{iteration}\n")
+
+    assert sintax_tsv.is_file()
+    return sintax_tsv
@@ -0,0 +1,200 @@
+from pathlib import Path
+from numpy.lib.stride_tricks import sliding_window_view
+from common.cache import file_digest
+from common.fasta import read_fasta
+import numpy as np
+import json
+import logging
+import os
+import shutil
+
+log = logging.getLogger(__name__)
+
+KMER_INDEX_VERSION = 1
+
+# K-mers are packed into uint32, 2 bits per base.
+MAX_KMER_SIZE = 16
+
+# 2-bit base codes, anything else (N, IUPAC codes) is 4 and skipped.
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for i, base in enumerate(b"ACGT"):
+    BASE_CODES[base] = BASE_CODES[base + 32] = i
+
+_indexes: dict[tuple, "KmerIndex"] = {}
+
+
+def encode_kmers(
+    seq: str, kmer_size: int, reverse_complement: bool = False
+) -> np.ndarray:
+    """Distinct k-mers (2 bits per base) of seq, sorted.
+
+    With reverse_complement, those of the minus strand.
+    """
+    codes = BASE_CODES[np.frombuffer(seq.encode(), dtype=np.uint8)]
+
+    if reverse_complement:
+        codes = np.where(codes < 4, 3 - codes, codes)[::-1]
+
+    if len(codes) < kmer_size:
+        return np.empty(0, dtype=np.uint32)
+
+    windows = sliding_window_view(codes, kmer_size)
+    windows = windows[(windows < 4).all(axis=1)].astype(np.uint32)
+
+    powers = (4 ** np.arange(kmer_size - 1, -1, -1)).astype(np.uint32)
+
+    return np.unique(windows @ powers)
+
+
+def check_kmer_size(kmer_size: int) -> None:
+    if not 1 <= kmer_size <= MAX_KMER_SIZE:
+        raise ValueError(
+            f"k-mer size must be between 1 and {MAX_KMER_SIZE}, got {kmer_size}."
+        )
+
+
+def index_path(database: Path, kmer_size: int) -> Path:
+    return database.with_name(f"{database.stem}.k{kmer_size}.index")
+
+
+class KmerIndex:
+    """Memory-mapped k-mer index of the references in a database.
+
+    kmers holds the distinct k-mers of all references (sorted), and the
+    references that contain kmers[i] are refs[offsets[i]:offsets[i + 1]]
+    (sorted). Reference i has the fasta header headers[i].
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # Plain arrays backed by the mapped files, without np.memmap overhead.
+        self.kmers, self.offsets, self.refs, self.headers = (
+            np.asarray(np.load(path / f"{name}.npy", mmap_mode="r"))
+            for name in ("kmers", "offsets", "refs", "headers")
+        )
+
+    @property
+    def num_refs(self) -> int:
+        return len(self.headers)
+
+    def header(self, ref: int) -> str:
+        return self.headers[ref].decode()
+
+    def postings(self, kmers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Start offsets and lengths in refs of each k-mer, 0 length if absent."""
+        if len(self.kmers) == 0:
+            return np.zeros(len(kmers), dtype=np.int64), np.zeros(len(kmers), np.int64)
+
+        pos = np.minimum(np.searchsorted(self.kmers, kmers), len(self.kmers) - 1)
+        found = self.kmers[pos] == kmers
+
+        starts = np.where(found, self.offsets[pos], 0)
+        lengths = np.where(found, self.offsets[pos + 1] - starts, 0)
+
+        return starts, lengths
+
+
+def write_kmer_index(database: Path, kmer_size: int) -> Path:
+    """Build the k-mer index of database and write it next to it.
+
+    The index is written to a temporary directory and renamed, so that
+    processes building it at the same time do not see partial indexes.
+    """
+    check_kmer_size(kmer_size)
+
+    path = index_path(database, kmer_size)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.mkdir(parents=True, exist_ok=True)
+
+    headers, ref_kmers = [], []
+    for header, seq in read_fasta(database):
+        headers.append(header)
+        ref_kmers.append(encode_kmers(seq, kmer_size))
+
+    # (k-mer, reference) pairs sorted by k-mer, then reference.
+    keys = np.concatenate(
+        [np.empty(0, dtype=np.uint64)]
+        + [
+            (kmers.astype(np.uint64) << np.uint64(32)) | np.uint64(ref)
+            for ref, kmers in enumerate(ref_kmers)
+        ]
+    )
+    del ref_kmers
+    keys.sort()
+
+    all_kmers = (keys >> np.uint64(32)).astype(np.uint32)
+    refs = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    del keys
+
+    starts = np.flatnonzero(np.diff(all_kmers.astype(np.int64), prepend=-1) != 0)
+
+    np.save(tmp_path / "kmers.npy", all_kmers[starts])
+    np.save(tmp_path / "offsets.npy", np.r_[starts, len(refs)].astype(np.int64))
+    np.save(tmp_path / "refs.npy", refs)
+    np.save(
+        tmp_path / "headers.npy",
+        np.array([header.encode() for header in headers], dtype=np.bytes_),
+    )
+
+    stat = database.stat()
+    meta = {
+        "version": KMER_INDEX_VERSION,
+        "kmer_size": kmer_size,
+        "database": {
+            "name": database.name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(database),
+        },
+        "num_refs": len(headers),
+        "num_kmers": len(starts),
+        "num_postings": len(refs),
+    }
+    (tmp_path / "index.json").write_text(json.dumps(meta, indent=2))
+
+    try:
+        tmp_path.rename(path)
+    except OSError:
+        # Built by another process in the meantime.
+        shutil.rmtree(tmp_path)
+
+    return path
+
+
+def is_valid(path: Path, database: Path, kmer_size: int) -> bool:
+    if not (path / "index.json").is_file():
+        return False
+
+    meta = json.loads((path / "index.json").read_text())
+    if meta["version"] != KMER_INDEX_VERSION or meta["kmer_size"] != kmer_size:
+        return False
+
+    stat, db_meta = database.stat(), meta["database"]
+    if (db_meta["size"], db_meta["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+        return True
+
+    # Copied or touched databases are compared by content.
+    return meta["database"]["sha256"] == file_digest(database)
+
+
+def get_kmer_index(database: Path, kmer_size: int) -> KmerIndex:
+    """The k-mer index of database, which is built on first use."""
+    check_kmer_size(kmer_size)
+
+    path = index_path(database, kmer_size)
+    stat = database.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if (index := _indexes.get(memo_key)) is not None:
+        return index
+
+    if not is_valid(path, database, kmer_size):
+        log.info(f"Building k-mer index {path}.")
+
+        if path.exists():
+            shutil.rmtree(path)
+        write_kmer_index(database, kmer_size)
+
+    index = _indexes[memo_key] = KmerIndex(path)
+
+    return index
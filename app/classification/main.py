@@ -1,8 +1,11 @@
 from pathlib import Path
+from .config import SintaxConfig
 from .sintax import run_sintax
 from .results import get_results
+from .batch import pool_asvs, split_sintax_tsv
 import pandas as pd
 from common.decorator import with_yaspin
+from common.lineage import load_lineage
 
 
 @with_yaspin("Running SINTAX classification...")
@@ -12,9 +15,54 @@ def classify(
     database: Path,
     sintax_threshold: float,
     outdir: Path,
+    sintax_cfg: SintaxConfig | None = None,
 ) -> pd.DataFrame:
-    sintax_tsv = run_sintax(asv_fasta, database, outdir)
+    sintax_tsv = run_sintax(asv_fasta, database, outdir, sintax_cfg)
 
-    agg_df = get_results(sintax_tsv, otutab_tsv, sintax_threshold, outdir)
+    agg_df = get_results(
+        sintax_tsv, otutab_tsv, sintax_threshold, outdir, load_lineage(database)
+    )
 
     return agg_df
+
+
+@with_yaspin("Running batched SINTAX classification...")
+def classify_batch(
+    samples: dict[str, tuple[Path, Path, Path]],
+    database: Path,
+    sintax_threshold: float,
+    outdir: Path,
+    sintax_cfg: SintaxConfig | None = None,
+) -> dict[str, pd.DataFrame]:
+    """Classify the asvs of several samples with a single sintax_rs call.
+
+    samples maps each sample name to its (asv_fasta, otutab_tsv, sample_dir).
+    """
+    batch_dir = outdir / "batch"
+    batch_dir.mkdir(exist_ok=True)
+
+    pooled_fasta = batch_dir / "pooled.fasta"
+    members = pool_asvs(
+        {sample_name: asv_fasta for sample_name, (asv_fasta, _, _) in samples.items()},
+        pooled_fasta,
+    )
+
+    pooled_tsv = run_sintax(pooled_fasta, database, batch_dir, sintax_cfg)
+
+    sintax_tsvs = split_sintax_tsv(
+        pooled_tsv,
+        members,
+        {
+            sample_name: sample_dir
+            for sample_name, (_, _, sample_dir) in samples.items()
+        },
+    )
+
+    lineage = load_lineage(database)
+
+    return {
+        sample_name: get_results(
+            sintax_tsvs[sample_name], otutab_tsv, sintax_threshold, sample_dir, lineage
+        )
+        for sample_name, (_, otutab_tsv, sample_dir) in samples.items()
+    }
@@ -0,0 +1,60 @@
+from pathlib import Path
+import os
+import pandas as pd
+from .results import aggregate_abundance, get_abundance_fig, get_sankey_fig, pivot_df
+from common.decorator import with_yaspin
+
+PLOTLY_JS = "plotly.min.js"
+
+
+def write_plotly_js(outdir: Path) -> Path:
+    """The plotly.js bundle that all reports in outdir refer to, written once."""
+    from plotly.offline import get_plotlyjs
+
+    plotly_js = outdir / PLOTLY_JS
+
+    if not plotly_js.is_file():
+        tmp_js = plotly_js.with_suffix(f".{os.getpid()}.tmp")
+        tmp_js.write_text(get_plotlyjs())
+        tmp_js.replace(plotly_js)
+
+    return plotly_js
+
+
+def write_report(sample_dir: Path, plotly_js: Path) -> tuple[Path, Path]:
+    """Write sankey.html and abundance_perc.html from parsed.tsv and otutab.tsv.
+
+    Sankey links are weighted by the number of reads of each asv. The html
+    files load plotly_js instead of embedding it.
+    """
+    parsed_df = pd.read_csv(sample_dir / "parsed.tsv", sep="\t")
+    otutab_df = pd.read_csv(sample_dir / "otutab.tsv", sep="\t")
+
+    include_plotlyjs = os.path.relpath(plotly_js, sample_dir)
+
+    sankey_html = sample_dir / "sankey.html"
+    pivoted_df = (
+        pivot_df(parsed_df).merge(otutab_df, on="asv", how="left").fillna({"reads": 0})
+    )
+    get_sankey_fig(pivoted_df, weight="reads").write_html(
+        sankey_html, include_plotlyjs=include_plotlyjs
+    )
+
+    abundance_html = sample_dir / "abundance_perc.html"
+    get_abundance_fig(aggregate_abundance(parsed_df, otutab_df)).write_html(
+        abundance_html, include_plotlyjs=include_plotlyjs
+    )
+
+    return sankey_html, abundance_html
+
+
+@with_yaspin("Writing reports...")
+def write_reports(sample_dirs: list[Path], outdir: Path) -> list[Path]:
+    """Reports of several samples, sharing one plotly.js bundle in outdir."""
+    plotly_js = write_plotly_js(outdir)
+
+    return [
+        html
+        for sample_dir in sample_dirs
+        for html in write_report(sample_dir, plotly_js)
+    ]
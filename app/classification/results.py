@@ -1,10 +1,16 @@
 from enum import Enum, unique
 from pathlib import Path
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.graph_objects import Figure
+
+from common.lineage import split_headers
+
+# plotly is only imported by the functions that draw, it is slow to import and
+# most runs never draw a figure.
+if TYPE_CHECKING:
+    from plotly.graph_objects import Figure
 
 
 @unique
@@ -26,73 +32,175 @@ class Levels(Enum):
         return {i: c for i, c in enumerate(cls.as_list()[::-1])}
 
 
-def parse_sintax_tsv(tsv: Path, threshold: float) -> pd.DataFrame:
-    # ---
-    df = pd.read_csv(tsv, sep="\t", names=["asv", "ref", "num_hits", "iteration"])
-
-    # ---
+def parse_headers(refs: pd.Series) -> pd.DataFrame:
+    """accession, tax_id and one column per level of full db.fasta headers."""
     acc_id_tax = (
-        df["ref"]
-        .str.split(";", expand=True)
+        refs.str.split(";", expand=True)
         .rename(columns={0: "accession", 1: "tax_id", 2: "taxonomy"})
         .replace(regex=r"accession=|tax_id=|taxonomy=", value="")
     )
-    df = pd.concat([df, acc_id_tax], axis=1).drop(
-        columns=["ref", "num_hits", "iteration"]
-    )
 
-    # ---
     full_tax_df = (
-        df["taxonomy"]
+        acc_id_tax["taxonomy"]
         .str.split("|", expand=True)
         .replace(value="", regex=r"^d:|^p:|^c:|^o:|^f:|^g:|^s:")
         .rename(columns=Levels.pandas_column_rename())
     )
-    df = pd.concat([df, full_tax_df], axis=1).drop(columns="taxonomy")
+
+    return pd.concat([acc_id_tax.drop(columns="taxonomy"), full_tax_df], axis=1)
+
+
+def read_sintax_tsv(tsv: Path, lineage: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Read raw sintax results into one row per bootstrap with one column per level.
+
+    With the lineage table of the database (see common.lineage), levels are
+    joined on tax_id, otherwise they are parsed from the reference headers.
+    Either way, each distinct reference is only looked up once and all
+    columns are categorical, i.e. integer codes into the distinct names.
+    """
+    # ---
+    df = pd.read_csv(
+        tsv,
+        sep="\t",
+        names=["asv", "ref", "num_hits", "iteration"],
+        usecols=["asv", "ref"],
+        dtype="category",
+    )
+    refs = pd.Series(df["ref"].cat.categories)
+
+    match lineage:
+        case None:
+            refs_df = parse_headers(refs)
+        case _:
+            refs_df = split_headers(refs).join(lineage, on="tax_id")
 
     # ---
-    lst = []
-    for asv, asv_subset in df.groupby(by="asv"):
-        num_iterations = len(asv_subset)
-
-        for level in Levels.as_list():
-            (best_hit_at_level, best_absolute_score_at_level) = (
-                asv_subset[level]
-                .value_counts()
-                .reset_index()
-                .sort_values(by="count", ascending=False)
-                .iloc[0]
-            )
-            best_relative_score = best_absolute_score_at_level / num_iterations
-
-            lst.append(
-                [
-                    asv,
-                    level,
-                    best_hit_at_level
-                    if best_relative_score >= threshold
-                    else "unclassified",
-                    best_relative_score,
-                ]
-            )
+    ref_codes = df["ref"].cat.codes.to_numpy()
+    columns = {"asv": df["asv"]}
+
+    # Ranks of the lineage table are categorical already, their codes refer to
+    # its categories (factorize would return them in a different order).
+    for col in refs_df.columns:
+        codes, names = _codes(refs_df[col])
+        columns[col] = pd.Categorical.from_codes(codes[ref_codes], categories=names)
 
-    result_df = pd.DataFrame(lst, columns=["asv", "level", "hit", "score"])
+    return pd.DataFrame(columns)
 
-    return result_df
 
+def _codes(col: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Integer codes (-1 for missing values) and the names they refer to."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), col.cat.categories
+
+    return pd.factorize(col)
+
+
+def _best_hits(
+    asv_codes: np.ndarray, hit_codes: np.ndarray, num_hits: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """asv, hit and count of the most frequent hit per asv, in asv order.
+
+    Ties are broken by the first occurrence (row) of the hit.
+    """
+    rows = np.flatnonzero(hit_codes >= 0)
+    keys = asv_codes[rows].astype(np.int64) * num_hits + hit_codes[rows]
+
+    keys, first, size = np.unique(keys, return_index=True, return_counts=True)
+    asv, hit = np.divmod(keys, num_hits)
+
+    # Arg-max per asv.
+    order = np.lexsort((rows[first], -size, asv))
+    best = order[np.diff(asv[order], prepend=-1) != 0]
+
+    return asv[best], hit[best], size[best]
+
+
+def get_consensus(df: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """Bootstrap consensus, i.e. the most frequent hit per asv and level.
+
+    Hits are counted per level on integer codes, i.e. (asv, hit) pairs,
+    without materializing a long table of names. Ties are broken by the
+    first occurrence in the sintax output. asv, level and hit of the result
+    are categorical.
+    """
+    levels = Levels.as_list()
+
+    # Renumbered, so that asv codes are in the order of the asv names.
+    asv_codes, asvs = _codes(df["asv"])
+    order = asvs.argsort()
+    asv_codes, asvs = np.argsort(order)[asv_codes], asvs[order]
+    num_iterations = np.bincount(asv_codes, minlength=len(asvs))
+
+    level_codes, level_names = zip(*(_codes(df[level]) for level in levels))
+
+    # One code space for the hits of all levels, plus unclassified.
+    hits = pd.Index([*np.concatenate(level_names), "unclassified"]).unique()
+
+    asv_lst, level_lst, hit_lst, size_lst = [], [], [], []
+    for i, (codes, names) in enumerate(zip(level_codes, level_names)):
+        asv, hit, size = _best_hits(asv_codes, codes, len(names))
+
+        asv_lst.append(asv)
+        level_lst.append(np.full(len(asv), i))
+        hit_lst.append(hits.get_indexer(names)[hit])
+        size_lst.append(size)
+
+    # Levels are concatenated in order, so a stable sort groups them per asv.
+    order = np.argsort(np.concatenate(asv_lst), kind="stable")
+    asv, level, hit, size = (
+        np.concatenate(lst)[order] for lst in (asv_lst, level_lst, hit_lst, size_lst)
+    )
+
+    score = size / num_iterations[asv]
+    hit = np.where(score >= threshold, hit, hits.get_loc("unclassified"))
+
+    return pd.DataFrame(
+        {
+            "asv": pd.Categorical.from_codes(asv, asvs),
+            "level": pd.Categorical.from_codes(level, levels),
+            "hit": pd.Categorical.from_codes(hit, hits),
+            "score": score,
+        }
+    )
+
+
+def parse_sintax_tsv(
+    tsv: Path, threshold: float, lineage: pd.DataFrame | None = None
+) -> pd.DataFrame:
+    df = read_sintax_tsv(tsv, lineage)
+
+    return get_consensus(df, threshold)
+
+
+def get_sankey_fig(df: pd.DataFrame, weight: str | None = None) -> "Figure":
+    """Sankey diagram of a pivoted table (see pivot_df).
+
+    Links are the number of asvs between two nodes, or with weight, the sum
+    of that column (e.g. reads) over those asvs.
+    """
+    import plotly.graph_objects as go
 
-def get_sankey_fig(df: pd.DataFrame) -> Figure:
     levels = Levels.as_list()[::-1]
     edges = []
 
     for i in range(len(levels) - 1):
         src_col, tgt_col = levels[i], levels[i + 1]
 
-        edges += df[[src_col, tgt_col]].values.tolist()
+        edges += df[[src_col, tgt_col, *([weight] if weight else [])]].values.tolist()
 
     # Convert to DataFrame for counting connections
-    edges_df = pd.DataFrame(edges, columns=["source", "target"])
-    edges_count = edges_df.value_counts().reset_index(name="value")
+    match weight:
+        case None:
+            edges_df = pd.DataFrame(edges, columns=["source", "target"])
+            edges_count = edges_df.value_counts().reset_index(name="value")
+        case _:
+            edges_df = pd.DataFrame(edges, columns=["source", "target", "value"])
+            edges_count = (
+                edges_df.groupby(by=["source", "target"], sort=False)["value"]
+                .sum()
+                .reset_index()
+                .sort_values(by="value", ascending=False, kind="stable")
+            )
 
     # Build unique nodes
     all_nodes = pd.Index(
@@ -123,48 +231,47 @@ def get_sankey_fig(df: pd.DataFrame) -> Figure:
     return fig
 
 
+def pivot_index(df: pd.DataFrame) -> list[str]:
+    """Columns that identify an asv, which includes the sample for multi-sample tables."""
+    return [col for col in ("sample_name", "asv") if col in df.columns]
+
+
 def pivot_df(df: pd.DataFrame) -> pd.DataFrame:
     pivoted_df = (
-        df.pivot(columns="level", index="asv", values="hit").reset_index().dropna()
+        df.pivot(columns="level", index=pivot_index(df), values="hit")
+        .reset_index()
+        .dropna()
     )
 
     for level in Levels.as_list():
-        pivoted_df[level] = pivoted_df[level].apply(lambda x: f"{level[0]}:{x}")
+        pivoted_df[level] = f"{level[0]}:" + pivoted_df[level].astype(str)
 
     return pivoted_df
 
 
-def plot_sankey_diagram(df: pd.DataFrame, outdir: Path):
-    fig = get_sankey_fig(df)
-    fig.show()
-    fig.write_html(outdir / "sankey.html")
-
-
-def sankey_diagram(parsed_df: pd.DataFrame, outdir: Path):
-    pivoted_df = pivot_df(parsed_df)
-    plot_sankey_diagram(pivoted_df, outdir)
-
-
-def get_results(
-    sintax_tsv: Path, otutab_tsv: Path, threshold: float, outdir: Path
+def aggregate_abundance(
+    parsed_df: pd.DataFrame, otutab_df: pd.DataFrame
 ) -> pd.DataFrame:
-    parsed_df = parse_sintax_tsv(sintax_tsv, threshold)
-    parsed_df.to_csv(outdir / "parsed.tsv", sep="\t", index=False)
-
-    # Currently, don't consider abundance.
-    sankey_diagram(parsed_df, outdir)
+    """Reads and relative abundance per level and hit.
 
-    otutab_df = pd.read_csv(otutab_tsv, sep="\t")
+    Grouped on the (categorical) codes of parsed_df, names are only
+    materialized for the aggregated rows.
+    """
     total_reads = otutab_df["reads"].sum()
+    asv_codes, asvs = _codes(parsed_df["asv"])
+    reads = otutab_df.set_index("asv")["reads"].reindex(asvs).to_numpy()[asv_codes]
 
     agg_df = (
-        parsed_df.merge(otutab_df, on="asv", how="left")
-        .groupby(by=["level", "hit"])["reads"]
+        parsed_df[["level", "hit"]]
+        .assign(reads=reads)
+        .groupby(by=["level", "hit"], observed=True)["reads"]
         .sum()
         .reset_index()
+        .astype({"level": str, "hit": str})
+        .sort_values(by=["level", "hit"], ignore_index=True)
     )
 
-    agg_df["abundance"] = agg_df["reads"].apply(lambda x: x / total_reads)
+    agg_df["abundance"] = agg_df["reads"] / total_reads
 
     # Sort to ensure proper abundance positioning.
     agg_df = agg_df.sort_values(by=["level", "abundance"], ascending=[False, False])
@@ -175,7 +282,13 @@ def get_results(
         ordered=True,
     )
 
-    fig = px.bar(
+    return agg_df
+
+
+def get_abundance_fig(agg_df: pd.DataFrame) -> "Figure":
+    import plotly.express as px
+
+    return px.bar(
         agg_df,
         y="abundance",
         x="level",
@@ -183,6 +296,22 @@ def get_results(
         barmode="relative",
         color_discrete_sequence=px.colors.qualitative.Antique_r,
     )
-    fig.write_html(outdir / "abundance_perc.html")
 
-    return agg_df
+
+def get_results(
+    sintax_tsv: Path,
+    otutab_tsv: Path,
+    threshold: float,
+    outdir: Path,
+    lineage: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """Write parsed.tsv and return the abundance per level and hit.
+
+    Plots are written separately, see classification.report.
+    """
+    parsed_df = parse_sintax_tsv(sintax_tsv, threshold, lineage)
+    parsed_df.to_csv(outdir / "parsed.tsv", sep="\t", index=False)
+
+    otutab_df = pd.read_csv(otutab_tsv, sep="\t")
+
+    return aggregate_abundance(parsed_df, otutab_df)
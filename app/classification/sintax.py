@@ -1,16 +1,18 @@
-from sh import sintax_rs
 from pathlib import Path
-from pydantic import BaseModel
+from common.cache import cached
+from common.memo import memoized_tsv
+from .config import SintaxConfig
+from .daemon import is_serving, sintax_daemon
+from .sintax_numpy import sintax_numpy
+import logging
 
+log = logging.getLogger(__name__)
 
-class SintaxConfig(BaseModel):
-    num_query_hashes: int = 32
-    num_bootstrap: int = 100
-    kmer_size: int = 15
 
-
-def run_sintax(asv_fasta: Path, database: Path, outdir: Path) -> Path:
-    cfg = SintaxConfig()
+@cached("sintax.tsv")
+def sintax(asv_fasta: Path, database: Path, outdir: Path, cfg: SintaxConfig) -> Path:
+    # Imported here, so that the numpy engine also runs without sintax_rs.
+    from sh import sintax_rs
 
     sintax_tsv = outdir / "sintax.tsv"
 
@@ -31,3 +33,29 @@ def run_sintax(asv_fasta: Path, database: Path, outdir: Path) -> Path:
 
     assert sintax_tsv.is_file()
     return sintax_tsv
+
+
+def run_sintax(
+    asv_fasta: Path, database: Path, outdir: Path, cfg: SintaxConfig | None = None
+) -> Path:
+    cfg = cfg or SintaxConfig()
+
+    match cfg.engine:
+        case "sintax_rs":
+            engine = sintax
+        case "numpy" if cfg.socket and is_serving(cfg.socket, database, cfg.kmer_size):
+            engine = sintax_daemon
+        case "numpy":
+            if cfg.socket:
+                log.warning(f"No sintax daemon for {database} at {cfg.socket}.")
+            engine = sintax_numpy
+
+    return memoized_tsv(
+        "sintax",
+        database,
+        cfg,
+        asv_fasta,
+        outdir / "sintax.tsv",
+        id_col=0,
+        run=lambda query, query_outdir: engine(query, database, query_outdir, cfg),
+    )
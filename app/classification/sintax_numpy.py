@@ -0,0 +1,141 @@
+from pathlib import Path
+from common.cache import cached
+from common.fasta import read_fasta
+from .config import SintaxConfig
+from .kmer_index import KmerIndex, encode_kmers, get_kmer_index
+import numpy as np
+import zlib
+
+# Bootstrap hits are counted exactly for this many references, the ones that
+# contain the most of the sampled k-mers. Other references can not win an
+# iteration, i.e. the engine is an approximation of counting all references.
+NUM_CANDIDATES = 500
+
+# K-mers in more than this fraction of the references (conserved regions) do
+# not rank candidates, since they add a hit to nearly every reference.
+MAX_RANKING_FRACTION = 0.05
+
+
+def _gather(refs: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """refs[starts[i]:starts[i] + lengths[i]] of all i, concatenated."""
+    ends = np.cumsum(lengths)
+    positions = np.repeat(starts - (ends - lengths), lengths) + np.arange(
+        ends[-1] if len(ends) else 0
+    )
+
+    return refs[positions]
+
+
+def get_candidates(
+    index: KmerIndex, starts: np.ndarray, lengths: np.ndarray
+) -> np.ndarray:
+    """References (sorted) that contain the most of the given k-mers."""
+    found = lengths > 0
+    if not found.any():
+        return np.empty(0, dtype=np.int64)
+
+    ranking = found & (lengths <= MAX_RANKING_FRACTION * index.num_refs)
+    if not ranking.any():
+        ranking = found
+
+    refs, counts = np.unique(
+        _gather(index.refs, starts[ranking], lengths[ranking]), return_counts=True
+    )
+
+    if len(refs) > NUM_CANDIDATES:
+        refs = np.sort(refs[np.argpartition(-counts, NUM_CANDIDATES)[:NUM_CANDIDATES]])
+
+    return refs
+
+
+def bootstrap(
+    seq: str, index: KmerIndex, cfg: SintaxConfig
+) -> list[tuple[int, int, int]]:
+    """(reference, hits, iteration) of each bootstrap iteration of seq.
+
+    The references are indexed on the plus strand, and asvs may be on either
+    strand, so seq is classified on the strand that shares more k-mers with
+    the index. Each iteration samples cfg.num_query_hashes k-mers of seq (with
+    replacement), and the reference that contains most of them wins, ties are
+    broken at random. Sampling is seeded by seq, so that identical asvs get
+    identical results. Iterations without any hit are left out.
+    """
+    num_bootstrap = cfg.num_bootstrap
+    kmers = max(
+        (
+            encode_kmers(seq, cfg.kmer_size),
+            encode_kmers(seq, cfg.kmer_size, reverse_complement=True),
+        ),
+        key=lambda kmers: int(np.count_nonzero(index.postings(kmers)[1])),
+    )
+    if len(kmers) == 0:
+        return []
+
+    rng = np.random.default_rng(zlib.crc32(seq.encode()))
+    samples = rng.integers(0, len(kmers), size=(num_bootstrap, cfg.num_query_hashes))
+
+    # Each distinct sampled k-mer is only looked up once.
+    sampled, inverse = np.unique(samples, return_inverse=True)
+    starts, lengths = index.postings(kmers[sampled])
+
+    candidates = get_candidates(index, starts, lengths)
+    if len(candidates) == 0:
+        return []
+
+    # Which candidates contain each sampled k-mer. Short postings are matched
+    # against the candidates, long ones are searched for the candidates.
+    contains = np.zeros((len(sampled), len(candidates)), dtype=np.float32)
+    short = (lengths > 0) & (lengths <= len(candidates))
+
+    refs = _gather(index.refs, starts[short], lengths[short])
+    rows = np.repeat(np.flatnonzero(short), lengths[short])
+    pos = np.minimum(np.searchsorted(candidates, refs), len(candidates) - 1)
+    is_candidate = candidates[pos] == refs
+    contains[rows[is_candidate], pos[is_candidate]] = 1
+
+    for i in np.flatnonzero(lengths > len(candidates)):
+        posting = index.refs[starts[i] : starts[i] + lengths[i]]
+        pos = np.minimum(np.searchsorted(posting, candidates), lengths[i] - 1)
+        contains[i] = posting[pos] == candidates
+
+    # Number of times each distinct k-mer was sampled per iteration.
+    iterations = np.repeat(np.arange(num_bootstrap), cfg.num_query_hashes)
+    times_sampled = (
+        np.bincount(
+            iterations * len(sampled) + inverse.ravel(),
+            minlength=num_bootstrap * len(sampled),
+        )
+        .reshape(num_bootstrap, len(sampled))
+        .astype(np.float32)
+    )
+
+    hits = (times_sampled @ contains).astype(np.int64)
+    best = np.argmax(hits + rng.random(hits.shape), axis=1)
+    best_hits = hits[np.arange(num_bootstrap), best]
+
+    return [
+        (int(candidates[ref]), int(num_hits), iteration)
+        for iteration, (ref, num_hits) in enumerate(zip(best, best_hits))
+        if num_hits > 0
+    ]
+
+
+@cached("sintax.tsv")
+def sintax_numpy(
+    asv_fasta: Path, database: Path, outdir: Path, cfg: SintaxConfig
+) -> Path:
+    """sintax_rs compatible output, classified in-process with a k-mer index.
+
+    The index is memory-mapped, so processes that classify against the same
+    database share it through the page cache.
+    """
+    sintax_tsv = outdir / "sintax.tsv"
+    index = get_kmer_index(database, cfg.kmer_size)
+
+    with sintax_tsv.open("w") as f:
+        for header, seq in read_fasta(asv_fasta):
+            for ref, num_hits, iteration in bootstrap(seq, index, cfg):
+                f.write(f"{header}\t{index.header(ref)}\t{num_hits}\t{iteration}\n")
+
+    assert sintax_tsv.is_file()
+    return sintax_tsv
@@ -0,0 +1,152 @@
+from pathlib import Path
+from pydantic import BaseModel
+from common.fasta import read_fasta, write_fasta
+from .otutab import SIZE_PAT
+from .usearch import UsearchConfig, usearch_cluster, usearch_map
+import numpy as np
+import pandas as pd
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+DEPTH_JSON = "depth.json"
+
+
+class DepthConfig(BaseModel):
+    # Cluster at most this many reads.
+    max_reads: int | None = None
+    # Stop once doubling the number of clustered reads adds less than this
+    # fraction of new asvs.
+    saturation: float | None = None
+    # Reads clustered in the first saturation round.
+    start_reads: int = 10_000
+    seed: int = 42
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_reads is not None or self.saturation is not None
+
+
+def count_reads(fasta: Path) -> int:
+    with fasta.open("rb") as f:
+        return sum(1 for line in f if line.startswith(b">"))
+
+
+def count_asvs(centroids: Path) -> int:
+    """Number of non-singleton centroids, as in get_otutab."""
+    num_asvs = 0
+
+    for header, _ in read_fasta(centroids):
+        if int(SIZE_PAT.search(header)["size"]) <= 1:
+            break
+        num_asvs += 1
+
+    return num_asvs
+
+
+def subsample(fasta: Path, ranks: np.ndarray, num_reads: int, outdir: Path) -> Path:
+    """The reads with rank < num_reads, in their original order.
+
+    Since every read has a fixed random rank, smaller subsamples are always
+    contained in larger ones.
+    """
+    subsample_fasta = outdir / "subsample.fasta"
+
+    with subsample_fasta.open("w") as f:
+        for rank, (header, seq) in zip(ranks, read_fasta(fasta)):
+            if rank < num_reads:
+                write_fasta(f, header, seq)
+
+    return subsample_fasta
+
+
+def cluster_subsample(
+    fasta: Path, outdir: Path, cfg: UsearchConfig, depth_cfg: DepthConfig
+) -> Path:
+    """Cluster a reproducible random subsample of the reads.
+
+    With a saturation criterion, the subsample starts at start_reads and is
+    doubled until the number of asvs levels off (or all reads are used).
+    Writes the number of asvs per round to depth.json.
+    """
+    total_reads = count_reads(fasta)
+    max_reads = min(total_reads, depth_cfg.max_reads or total_reads)
+
+    # A random permutation, so that the first n ranks are a random sample of n reads.
+    rng = np.random.default_rng(depth_cfg.seed)
+    ranks = np.argsort(rng.random(total_reads)).argsort()
+
+    num_reads = (
+        max_reads
+        if depth_cfg.saturation is None
+        else min(depth_cfg.start_reads, max_reads)
+    )
+    rounds = []
+
+    while True:
+        if num_reads < total_reads:
+            reads_fasta = subsample(fasta, ranks, num_reads, outdir)
+            centroids = usearch_cluster(reads_fasta, outdir, cfg)
+            reads_fasta.unlink()
+        else:
+            centroids = usearch_cluster(fasta, outdir, cfg)
+        rounds.append({"reads": num_reads, "asvs": count_asvs(centroids)})
+
+        if num_reads >= max_reads or depth_cfg.saturation is None:
+            break
+
+        if len(rounds) > 1:
+            previous, current = rounds[-2]["asvs"], rounds[-1]["asvs"]
+            new_fraction = (current - previous) / max(current, 1)
+
+            if new_fraction < depth_cfg.saturation:
+                log.info(f"ASVs saturated at {num_reads} of {total_reads} reads.")
+                break
+
+        num_reads = min(2 * num_reads, max_reads)
+
+    (outdir / DEPTH_JSON).write_text(
+        json.dumps({"total_reads": total_reads, "rounds": rounds}, indent=2)
+    )
+
+    return centroids
+
+
+def count_mapped_reads(
+    fasta: Path, asv_fasta: Path, otutab_tsv: Path, outdir: Path, cfg: UsearchConfig
+) -> Path:
+    """Re-count the reads per asv in otutab.tsv by mapping all reads to the asvs.
+
+    Reads that do not map to any asv are not counted. As with get_otutab,
+    asvs without reads are dropped and the rest are numbered by decreasing
+    reads, in both otutab.tsv and asv_fasta.
+    """
+    mapped_tsv = usearch_map(fasta, asv_fasta, outdir, cfg)
+
+    mapped_df = pd.read_csv(mapped_tsv, sep="\t", names=["read", "asv"], dtype=str)
+    counts = mapped_df["asv"].value_counts()
+
+    otutab_df = pd.read_csv(otutab_tsv, sep="\t")
+    otutab_df["reads"] = otutab_df["asv"].map(counts).fillna(0).astype(int)
+    otutab_df = otutab_df[otutab_df["reads"] > 0].sort_values(
+        by="reads", ascending=False, kind="stable"
+    )
+
+    names = {asv: f"asv_{i}" for i, asv in enumerate(otutab_df["asv"])}
+    seqs = dict(read_fasta(asv_fasta))
+
+    with asv_fasta.open("w") as f:
+        for asv, name in names.items():
+            write_fasta(f, name, seqs[asv])
+
+    otutab_df.assign(asv=otutab_df["asv"].map(names)).to_csv(
+        otutab_tsv, sep="\t", index=False
+    )
+
+    log.info(
+        f"Mapped {len(mapped_df)} reads to {len(otutab_df)} ASVs, "
+        f"dropped {len(seqs) - len(otutab_df)} ASVs without reads."
+    )
+
+    return otutab_tsv
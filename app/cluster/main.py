@@ -1,12 +1,27 @@
 from pathlib import Path
-from .usearch import usearch_cluster
+from .usearch import usearch_cluster, UsearchConfig
 from .otutab import get_otutab
+from .depth import DepthConfig, cluster_subsample, count_mapped_reads
 from common.decorator import with_yaspin
 
 
 @with_yaspin(progress_text="Generating ASVs...")
-def cluster(fasta: Path, outdir: Path) -> tuple[Path, Path]:
-    centroids = usearch_cluster(fasta, outdir)
+def cluster(
+    fasta: Path,
+    outdir: Path,
+    cfg: UsearchConfig | None = None,
+    depth_cfg: DepthConfig | None = None,
+) -> tuple[Path, Path]:
+    cfg = cfg or UsearchConfig()
+
+    match depth_cfg:
+        case DepthConfig(enabled=True):
+            # Find asvs in a subsample, then count all reads against them.
+            centroids = cluster_subsample(fasta, outdir, cfg, depth_cfg)
+            asv_fasta, otutab_tsv = get_otutab(centroids, outdir)
+            count_mapped_reads(fasta, asv_fasta, otutab_tsv, outdir, cfg)
+        case _:
+            centroids = usearch_cluster(fasta, outdir, cfg)
+            asv_fasta, otutab_tsv = get_otutab(centroids, outdir)
 
-    asv_fasta, otutab_tsv = get_otutab(centroids, outdir)
     return asv_fasta, otutab_tsv
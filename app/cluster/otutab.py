@@ -1,40 +1,34 @@
 from pathlib import Path
-from Bio import SeqIO
 import re
-import pandas as pd
+from common.fasta import read_fasta, write_fasta
 
+SIZE_PAT = re.compile(r"size=(?P<size>\d+);$")
 
-def get_otutab(centroids: Path, outdir: Path) -> tuple[Path, Path]:
-    size_pat = re.compile(r"size=(?P<size>\d+);$")
 
+def get_otutab(centroids: Path, outdir: Path) -> tuple[Path, Path]:
     asv_fasta = outdir / "asv.fasta"
     otutab_tsv = outdir / "otutab.tsv"
 
-    recs, otutab_lst = [], []
+    # Both files are written while reading, one centroid at a time.
+    with asv_fasta.open("w") as f_fasta, otutab_tsv.open("w") as f_otutab:
+        f_otutab.write("asv\treads\n")
 
-    for i, rec in enumerate(SeqIO.parse(centroids, "fasta")):
-        if (match := size_pat.search(rec.description)) is None:
-            raise ValueError(f"Size missing from {rec.description}")
+        for i, (header, seq) in enumerate(read_fasta(centroids)):
+            if (match := SIZE_PAT.search(header)) is None:
+                raise ValueError(f"Size missing from {header}")
 
-        size = int(match.groupdict()["size"])
-        asv = f"asv_{i}"
+            size = int(match.groupdict()["size"])
+            asv = f"asv_{i}"
 
-        rec.id = asv
-        rec.description = ""
+            # Skip singletons. Centroids are sorted by decreasing size, so
+            # nothing after the first singleton can be an asv.
+            if size <= 1:
+                break
 
-        # Skip singletons.
-        if size <= 1:
-            break
+            write_fasta(f_fasta, asv, seq)
+            f_otutab.write(f"{asv}\t{size}\n")
 
-        otutab_lst.append([asv, size])
-        recs.append(rec)
-
-    with asv_fasta.open("w") as f:
-        SeqIO.write(recs, f, "fasta")
     assert asv_fasta.is_file()
-
-    otutab_df = pd.DataFrame(otutab_lst, columns=["asv", "reads"])
-    otutab_df.to_csv(otutab_tsv, sep="\t", index=False)
     assert otutab_tsv.is_file()
 
     return (asv_fasta, otutab_tsv)
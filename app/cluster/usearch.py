@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from pathlib import Path
 from sh import usearch
+from common.cache import cached
 
 
 class UsearchConfig(BaseModel):
@@ -8,9 +9,8 @@ class UsearchConfig(BaseModel):
     pident: float = 0.80
 
 
-def usearch_cluster(fasta: Path, outdir: Path) -> Path:
-    cfg = UsearchConfig()
-
+@cached("centroids.fasta")
+def usearch_cluster(fasta: Path, outdir: Path, cfg: UsearchConfig) -> Path:
     centroid_fasta = outdir / "centroids.fasta"
     usearch(
         "-cluster_fast",
@@ -28,3 +28,28 @@ def usearch_cluster(fasta: Path, outdir: Path) -> Path:
 
     assert centroid_fasta.is_file()
     return centroid_fasta
+
+
+@cached("mapped.tsv")
+def usearch_map(fasta: Path, asv_fasta: Path, outdir: Path, cfg: UsearchConfig) -> Path:
+    """Assign each read to its closest asv, as tab-separated read and asv ids."""
+    mapped_tsv = outdir / "mapped.tsv"
+    usearch(
+        "-usearch_global",
+        fasta,
+        "-db",
+        asv_fasta,
+        "-id",
+        cfg.pident,
+        "-strand",
+        "both",
+        "-userout",
+        mapped_tsv,
+        "-userfields",
+        "query+target",
+        "-threads",
+        cfg.threads,
+    )
+
+    assert mapped_tsv.is_file()
+    return mapped_tsv
@@ -0,0 +1,199 @@
+from pathlib import Path
+from typing import Any, Callable, TypeVar, ParamSpec
+from functools import wraps
+from pydantic import BaseModel
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+# Bump to invalidate all existing cache entries.
+CACHE_VERSION = 1
+
+# Settings that change how fast a stage runs, but not what it produces.
+IGNORED_CONFIG_FIELDS = {"threads", "socket"}
+
+_CACHE: "StageCache | None" = None
+
+_digests: dict[tuple[str, int, int], str] = {}
+
+
+def file_digest(f: Path) -> str:
+    """sha256 of the file content, memoized on path, size and mtime."""
+    stat = f.stat()
+    memo_key = (str(f.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if (digest := _digests.get(memo_key)) is None:
+        with f.open("rb") as fh:
+            digest = hashlib.file_digest(fh, "sha256").hexdigest()
+        _digests[memo_key] = digest
+
+    return digest
+
+
+def _fingerprint(value: Any) -> Any:
+    match value:
+        case Path() if value.is_file():
+            return {"file": file_digest(value)}
+        case BaseModel():
+            return value.model_dump(mode="json", exclude=IGNORED_CONFIG_FIELDS)
+        case _:
+            return repr(value)
+
+
+class StageCache:
+    """Content-addressed cache of stage output files.
+
+    Entries are keyed by the stage, the content of its input files and its
+    effective config, so that e.g. a changed sintax threshold re-uses the
+    preprocessed reads, centroids and raw sintax results of a previous run.
+    """
+
+    def __init__(self, cache_dir: Path, force: bool = False):
+        self.cache_dir = cache_dir
+        self.force = force
+
+    def key(self, stage: str, arguments: dict[str, Any]) -> str:
+        payload = {
+            "version": CACHE_VERSION,
+            "stage": stage,
+            "arguments": {k: _fingerprint(v) for k, v in arguments.items()},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def fetch(self, key: str, outputs: list[Path]) -> bool:
+        """Link cached outputs into place. Returns False on a cache miss."""
+        entry_dir = self.entry_dir(key)
+
+        if self.force or not all((entry_dir / o.name).is_file() for o in outputs):
+            return False
+
+        for output in outputs:
+            link_or_copy(entry_dir / output.name, output)
+
+        # The entry directory mtime tracks when the entry was last used.
+        os.utime(entry_dir)
+        return True
+
+    def store(self, key: str, stage: str, outputs: list[Path]) -> None:
+        entry_dir = self.entry_dir(key)
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary directory first, so that concurrent samples
+        # never see a partially written entry.
+        tmp_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent))
+        for output in outputs:
+            link_or_copy(output, tmp_dir / output.name)
+        (tmp_dir / "entry.json").write_text(
+            json.dumps(
+                {
+                    "stage": stage,
+                    "outputs": [output.name for output in outputs],
+                    "created": time.time(),
+                }
+            )
+        )
+
+        if entry_dir.exists():
+            shutil.rmtree(entry_dir)
+
+        try:
+            tmp_dir.rename(entry_dir)
+        except OSError:
+            # Another process stored the same entry in the meantime.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def prune(self, max_age_days: float) -> int:
+        """Remove entries that have not been used for max_age_days."""
+        if not self.cache_dir.is_dir():
+            return 0
+
+        cutoff = time.time() - max_age_days * 24 * 3600
+        removed = 0
+
+        for entry_dir in self.cache_dir.glob("*/*"):
+            if entry_dir.is_dir() and entry_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                removed += 1
+
+        return removed
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard link dst to src, or copy it where links are not possible.
+
+    Cached outputs share their content with the cache entry, so files that
+    may be cached outputs are unlinked before they are written again.
+    """
+    dst.unlink(missing_ok=True)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        # E.g. a cache directory on another file system.
+        shutil.copyfile(src, dst)
+
+
+def configure_cache(cache_dir: Path | None, force: bool = False) -> None:
+    """Enable (or with cache_dir=None, disable) the stage cache in this process."""
+    global _CACHE
+    _CACHE = StageCache(cache_dir, force) if cache_dir is not None else None
+
+
+def cached(output: str, *extra_outputs: str) -> Callable[P, T]:
+    """Decorator that caches the `output` file a stage writes to its outdir.
+
+    The decorated function must take an `outdir` argument and return the path
+    of `output` in it. Files named in extra_outputs, which the stage also
+    writes to its outdir, are cached along with it. All other arguments make
+    up the cache key.
+    """
+
+    def with_cache(func: Callable[P, T]) -> Callable[P, T]:
+        signature = inspect.signature(func)
+        stage = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def inner(*args: P.args, **kwargs: P.kwargs) -> T:
+            if _CACHE is None:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            arguments = dict(bound.arguments)
+            outdir = arguments.pop("outdir")
+            target = outdir / output
+            targets = [target, *(outdir / extra for extra in extra_outputs)]
+
+            key = _CACHE.key(stage, arguments)
+
+            if _CACHE.fetch(key, targets):
+                log.info(f"Re-using cached {output} for {stage}.")
+                return target
+
+            # Linked to another entry by an earlier run, which the stage would
+            # otherwise overwrite in place.
+            for path in targets:
+                path.unlink(missing_ok=True)
+
+            result = func(*args, **kwargs)
+            _CACHE.store(key, stage, targets)
+
+            return result
+
+        return inner
+
+    return with_cache
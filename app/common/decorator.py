@@ -1,24 +1,89 @@
 from yaspin import yaspin
+from yaspin.core import Yaspin
 from typing import Callable, TypeVar, ParamSpec
 from functools import wraps
-import time
-
+from common.metrics import measure
+import logging
+import sys
+import threading
 
 T = TypeVar("Type")
 P = ParamSpec("ParamSpec")
 
+log = logging.getLogger(__name__)
+
+# Spinners from several worker processes sharing one terminal garble each other,
+# so the scheduler turns them off in its workers.
+_SPINNER_ENABLED = True
+
+
+def set_spinner(enabled: bool) -> None:
+    """Enable or disable progress spinners for the current process."""
+    global _SPINNER_ENABLED
+    _SPINNER_ENABLED = enabled
+
+
+class _Progress:
+    """One spinner for all stages running in this process.
+
+    Stages may run concurrently (in threads), the spinner then lists all of
+    them and each finished stage is written on a line of its own.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spinner: Yaspin | None = None
+        self.active: list[str] = []
+
+    def start(self, progress_text: str, color: str) -> None:
+        with self.lock:
+            self.active.append(progress_text)
+
+            if self.spinner is None:
+                self.spinner = yaspin(color=color)
+                self.spinner.start()
+
+            self.spinner.text = " | ".join(self.active)
+
+    def finish(self, progress_text: str, status: str) -> None:
+        with self.lock:
+            self.active.remove(progress_text)
+            self.spinner.write(f"{status} {progress_text}")
+
+            if self.active:
+                self.spinner.text = " | ".join(self.active)
+            else:
+                self.spinner.stop()
+                self.spinner = None
+
+
+_PROGRESS = _Progress()
+
 
 def with_yaspin(progress_text: str, color: str = "cyan") -> Callable[P, T]:
-    """Decorator that adds a progress spinner."""
+    """Decorator that adds a progress spinner and records stage metrics.
+
+    The spinner is skipped when disabled or when stdout is not a terminal,
+    metrics are recorded regardless. Concurrent stages share one spinner.
+    """
 
     def with_progress(func: Callable[P, T]) -> Callable[P, T]:
         @wraps(func)
         def inner(*args: P.args, **kwargs: P.kwargs) -> T:
-            with yaspin(text=progress_text, color=color) as sp:
-                start = time.time()
-                result = func(*args, **kwargs)
-                elapsed_sec = round(time.time() - start)
-                sp.ok(f"✔ ({elapsed_sec}s)")
+            if not _SPINNER_ENABLED or not sys.stdout.isatty():
+                result, metrics = measure(func.__name__, func, *args, **kwargs)
+                log.info(f"{progress_text} ✔ ({metrics.wall_sec:.1f}s)")
+
+                return result
+
+            _PROGRESS.start(progress_text, color)
+            status = "✘"
+
+            try:
+                result, metrics = measure(func.__name__, func, *args, **kwargs)
+                status = f"✔ ({metrics.wall_sec:.1f}s)"
+            finally:
+                _PROGRESS.finish(progress_text, status)
 
             return result
 
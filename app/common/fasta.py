@@ -0,0 +1,30 @@
+from pathlib import Path
+from typing import Iterator, TextIO
+
+LINE_WIDTH = 60
+
+
+def read_fasta(fasta: Path) -> Iterator[tuple[str, str]]:
+    """Lightweight, streaming FASTA reader that yields (header, sequence)."""
+    header, seq = None, []
+
+    with fasta.open("r") as f:
+        for line in f:
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(seq)
+
+                header, seq = line[1:].rstrip(), []
+            else:
+                seq.append(line.strip())
+
+    if header is not None:
+        yield header, "".join(seq)
+
+
+def write_fasta(f: TextIO, header: str, seq: str) -> None:
+    """Write one record, wrapped the same way as Bio.SeqIO."""
+    f.write(f">{header}\n")
+
+    for i in range(0, len(seq), LINE_WIDTH):
+        f.write(f"{seq[i : i + LINE_WIDTH]}\n")
@@ -0,0 +1,138 @@
+from pathlib import Path
+from common.cache import file_digest
+import pandas as pd
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Lineage table columns, in the order of the ranks in db.fasta taxonomy strings.
+RANKS = ["kingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+_lineages: dict[tuple, pd.DataFrame] = {}
+
+
+class LineageTableError(Exception):
+    pass
+
+
+def short_header(accession: str, tax_id: int) -> str:
+    """db.fasta header of a record whose lineage is in the lineage table."""
+    return f"{accession}:{tax_id}"
+
+
+def split_headers(headers: pd.Series) -> pd.DataFrame:
+    """accession and tax_id columns of short headers."""
+    parts = headers.str.rpartition(":")
+
+    return pd.DataFrame(
+        {"accession": parts[0], "tax_id": parts[2].astype("int64")},
+        index=headers.index,
+    )
+
+
+def lineage_path(database: Path) -> Path:
+    return database.with_name(f"{database.stem}.lineage.parquet")
+
+
+def manifest_path(database: Path) -> Path:
+    return database.with_name(f"{database.stem}.manifest.json")
+
+
+def write_lineage(lineage_df: pd.DataFrame, database: Path) -> Path:
+    """Write the lineage table (tax_id and one column per rank) next to database.
+
+    Rank names are dictionary encoded, i.e. stored once and referenced by
+    integer codes.
+    """
+    lineage_parquet = lineage_path(database)
+
+    lineage_df = lineage_df[["tax_id", *RANKS]].astype(
+        {"tax_id": "int64", **{rank: "category" for rank in RANKS}}
+    )
+    lineage_df.sort_values(by="tax_id").to_parquet(lineage_parquet, index=False)
+
+    return lineage_parquet
+
+
+def write_manifest(database: Path, num_records: int) -> Path:
+    """Checksums that tie the lineage table to the database it was built with."""
+    manifest_json = manifest_path(database)
+    lineage_parquet = lineage_path(database)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "header": "accession:tax_id",
+        "database": {
+            "name": database.name,
+            "sha256": file_digest(database),
+            "records": num_records,
+        },
+        "lineage": {
+            "name": lineage_parquet.name,
+            "sha256": file_digest(lineage_parquet),
+        },
+    }
+    manifest_json.write_text(json.dumps(manifest, indent=2))
+
+    return manifest_json
+
+
+def has_full_headers(database: Path) -> bool:
+    """If the headers of database carry the lineage (database.py --full_headers)."""
+    with database.open("r") as f:
+        return "taxonomy=" in f.readline()
+
+
+def check_headers(database: Path, reason: str) -> None:
+    """Raise if the lineages of database can not be parsed from its headers."""
+    if has_full_headers(database):
+        return
+
+    raise LineageTableError(
+        f"{reason}. The lineages of {database} (accession:tax_id headers) are "
+        f"only in {lineage_path(database).name}, rebuild it with database.py."
+    )
+
+
+def load_lineage(database: Path) -> pd.DataFrame | None:
+    """Lineage table of database, indexed by tax_id.
+
+    Returns None for a database with full headers and no (or an outdated)
+    lineage table, in which case lineages are parsed from the fasta headers
+    instead. Raises LineageTableError for a database with short headers.
+    """
+    manifest_json, lineage_parquet = manifest_path(database), lineage_path(database)
+
+    if not manifest_json.is_file() or not lineage_parquet.is_file():
+        check_headers(
+            database, f"{manifest_json.name} or {lineage_parquet.name} is missing"
+        )
+        return None
+
+    memo_key = tuple(
+        (str(f.resolve()), f.stat().st_size, f.stat().st_mtime_ns)
+        for f in (database, lineage_parquet)
+    )
+
+    if (lineage_df := _lineages.get(memo_key)) is not None:
+        return lineage_df
+
+    manifest = json.loads(manifest_json.read_text())
+    checksums = [
+        (manifest["database"]["sha256"], file_digest(database)),
+        (manifest["lineage"]["sha256"], file_digest(lineage_parquet)),
+    ]
+
+    if any(expected != actual for expected, actual in checksums):
+        check_headers(database, f"{manifest_json.name} does not match {database.name}")
+        log.warning(f"{manifest_json} does not match {database}, ignoring it.")
+        return None
+
+    # Ranks stay categorical, i.e. each name is only held in memory once.
+    lineage_df = pd.read_parquet(lineage_parquet).set_index("tax_id")
+    _lineages[memo_key] = lineage_df
+
+    return lineage_df
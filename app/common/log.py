@@ -0,0 +1,11 @@
+import logging
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Log to stderr, for the entry point scripts."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+    # sh logs every command it starts at INFO.
+    logging.getLogger("sh").setLevel(logging.WARNING)
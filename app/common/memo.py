@@ -0,0 +1,207 @@
+from pathlib import Path
+from typing import Callable, Iterator
+from contextlib import contextmanager
+from pydantic import BaseModel
+from common.cache import IGNORED_CONFIG_FIELDS, file_digest
+from common.fasta import read_fasta, write_fasta
+import hashlib
+import json
+import logging
+import sqlite3
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+# SQLite limits the number of variables per statement.
+CHUNK_SIZE = 500
+
+_MEMO: "ClassificationMemo | None" = None
+
+
+def sequence_hash(seq: str) -> str:
+    return hashlib.sha256(seq.upper().encode()).hexdigest()
+
+
+def get_namespace(tool: str, database: Path, cfg: BaseModel) -> str:
+    """Everything except the asv sequence that determines a tool's result rows."""
+    payload = {
+        "tool": tool,
+        "database": file_digest(database),
+        "config": cfg.model_dump(mode="json", exclude=IGNORED_CONFIG_FIELDS),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ClassificationMemo:
+    """On-disk memo of classification result rows per asv sequence.
+
+    Rows are stored per namespace (tool, database checksum and tool settings)
+    and sequence hash. The least recently used entries are evicted once there
+    are more than max_entries.
+    """
+
+    def __init__(self, db: Path, max_entries: int = 1_000_000):
+        self.db = db
+        self.max_entries = max_entries
+
+        with self.connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS memo ("
+                "namespace TEXT NOT NULL, seq_hash TEXT NOT NULL, rows TEXT NOT NULL, "
+                "last_used REAL NOT NULL, PRIMARY KEY (namespace, seq_hash))"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS memo_last_used ON memo (last_used)")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "tool TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        # Several sample workers may share the memo.
+        con = sqlite3.connect(self.db, timeout=300)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def get(self, namespace: str, seq_hashes: list[str]) -> dict[str, list[list[str]]]:
+        found = {}
+
+        with self.connect() as con:
+            for i in range(0, len(seq_hashes), CHUNK_SIZE):
+                chunk = seq_hashes[i : i + CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                params = [namespace, *chunk]
+
+                for seq_hash, rows in con.execute(
+                    "SELECT seq_hash, rows FROM memo "
+                    f"WHERE namespace = ? AND seq_hash IN ({placeholders})",
+                    params,
+                ):
+                    found[seq_hash] = json.loads(rows)
+
+                con.execute(
+                    "UPDATE memo SET last_used = ? "
+                    f"WHERE namespace = ? AND seq_hash IN ({placeholders})",
+                    [time.time(), *params],
+                )
+
+        return found
+
+    def put(self, namespace: str, rows: dict[str, list[list[str]]]) -> None:
+        now = time.time()
+
+        with self.connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, seq_hash, json.dumps(seq_rows), now)
+                    for seq_hash, seq_rows in rows.items()
+                ],
+            )
+
+            (num_entries,) = con.execute("SELECT COUNT(*) FROM memo").fetchone()
+            if (num_evict := num_entries - self.max_entries) > 0:
+                con.execute(
+                    "DELETE FROM memo WHERE rowid IN "
+                    "(SELECT rowid FROM memo ORDER BY last_used LIMIT ?)",
+                    (num_evict,),
+                )
+
+    def record(self, tool: str, hits: int, misses: int) -> None:
+        with self.connect() as con:
+            con.execute(
+                "INSERT INTO stats VALUES (?, ?, ?) ON CONFLICT (tool) DO UPDATE "
+                "SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                (tool, hits, misses),
+            )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self.connect() as con:
+            (num_entries,) = con.execute("SELECT COUNT(*) FROM memo").fetchone()
+            tools = {
+                tool: {"hits": hits, "misses": misses}
+                for tool, hits, misses in con.execute("SELECT * FROM stats")
+            }
+
+        return {"entries": num_entries, **tools}
+
+
+def configure_memo(db: Path | None, max_entries: int = 1_000_000) -> None:
+    """Enable (or with db=None, disable) the classification memo in this process."""
+    global _MEMO
+    _MEMO = ClassificationMemo(db, max_entries) if db is not None else None
+
+
+def memoized_tsv(
+    tool: str,
+    database: Path,
+    cfg: BaseModel,
+    query_fasta: Path,
+    output: Path,
+    id_col: int,
+    run: Callable[[Path, Path], Path],
+) -> Path:
+    """Produce a tool's tsv output for query_fasta, only running it for new asvs.
+
+    Results are memoized per tool, database content and cfg.
+    run(query_fasta, outdir) runs the tool and returns its tsv, in which
+    column id_col holds the query asv id. The combined rows of memoized and
+    new asvs are written to output, in query_fasta order.
+    """
+    if _MEMO is None:
+        return run(query_fasta, output.parent)
+
+    namespace = get_namespace(tool, database, cfg)
+
+    queries = [(asv, seq, sequence_hash(seq)) for asv, seq in read_fasta(query_fasta)]
+    memoized = _MEMO.get(namespace, list({seq_hash for _, _, seq_hash in queries}))
+
+    # One query asv per unseen sequence.
+    misses, missing_hashes = {}, set()
+    for asv, _, seq_hash in queries:
+        if seq_hash not in memoized and seq_hash not in missing_hashes:
+            misses[asv] = seq_hash
+            missing_hashes.add(seq_hash)
+
+    _MEMO.record(tool, hits=len(queries) - len(misses), misses=len(misses))
+
+    if misses:
+        seqs = {asv: seq for asv, seq, _ in queries}
+
+        with tempfile.TemporaryDirectory(dir=output.parent) as tmp:
+            tmpdir = Path(tmp)
+            misses_fasta = tmpdir / "query.fasta"
+
+            with misses_fasta.open("w") as f:
+                for asv in misses:
+                    write_fasta(f, asv, seqs[asv])
+
+            new_rows: dict[str, list[list[str]]] = {
+                seq_hash: [] for seq_hash in misses.values()
+            }
+            with run(misses_fasta, tmpdir).open("r") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    seq_hash = misses[fields[id_col]]
+                    fields[id_col] = ""
+                    new_rows[seq_hash].append(fields)
+
+        _MEMO.put(namespace, new_rows)
+        memoized.update(new_rows)
+
+    # May be a stage cache link, see common.cache.link_or_copy.
+    output.unlink(missing_ok=True)
+
+    with output.open("w") as f:
+        for asv, _, seq_hash in queries:
+            for fields in memoized[seq_hash]:
+                fields = fields.copy()
+                fields[id_col] = asv
+                f.write("\t".join(fields) + "\n")
+
+    return output
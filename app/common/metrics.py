@@ -0,0 +1,224 @@
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+from contextlib import contextmanager
+from pydantic import BaseModel
+import pandas as pd
+import json
+import resource
+import time
+
+T = TypeVar("T")
+
+METRICS_JSON = "metrics.json"
+METRICS_TSV = "metrics.tsv"
+
+# Nullable, so that uncounted values stay empty instead of turning into floats.
+INT_COLUMNS = {
+    "input_bytes": "Int64",
+    "input_records": "Int64",
+    "output_bytes": "Int64",
+    "output_records": "Int64",
+}
+
+# Stage metrics of the sample (or database build) currently running in this process.
+_RECORDS: list["StageMetrics"] | None = None
+
+_record_counts: dict[tuple[str, int, int], int | None] = {}
+
+
+class StageMetrics(BaseModel):
+    """Resource usage of one pipeline stage."""
+
+    stage: str
+    wall_sec: float
+    cpu_sec: float
+    children_cpu_sec: float
+    # High-water marks of the process (and its waited-for children) so far, not of
+    # the stage: pool workers run several stages and samples.
+    process_peak_rss_mb: float
+    process_children_peak_rss_mb: float
+    input_bytes: int
+    input_records: int | None
+    output_bytes: int | None
+    output_records: int | None
+
+
+def count_records(f: Path) -> int | None:
+    """Number of records in an uncompressed fasta, fastq or tsv file.
+
+    Compressed files are not counted, since that would mean decompressing
+    them once more just for the metrics.
+    """
+    stat = f.stat()
+    memo_key = (str(f.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if memo_key in _record_counts:
+        return _record_counts[memo_key]
+
+    match "".join(f.suffixes[-1:]):
+        case ".fasta" | ".fa":
+            with f.open("rb") as fh:
+                num_records = sum(1 for line in fh if line.startswith(b">"))
+        case ".fastq" | ".fq":
+            with f.open("rb") as fh:
+                num_records = sum(1 for _ in fh) // 4
+        case ".tsv":
+            with f.open("rb") as fh:
+                num_records = sum(1 for _ in fh)
+        case _:
+            num_records = None
+
+    _record_counts[memo_key] = num_records
+    return num_records
+
+
+def _files(values: Any) -> list[Path]:
+    match values:
+        case Path() if values.is_file():
+            return [values]
+        case list() | tuple():
+            return [f for value in values for f in _files(value)]
+        case dict():
+            return _files(list(values.values()))
+        case _:
+            return []
+
+
+def _io_size(values: Any) -> tuple[int, int | None]:
+    files = _files(values)
+    counts = [count_records(f) for f in files]
+
+    num_bytes = sum(f.stat().st_size for f in files)
+    num_records = None if None in counts else sum(counts)
+
+    return num_bytes, num_records
+
+
+def _dataframes(values: Any) -> list[pd.DataFrame]:
+    match values:
+        case pd.DataFrame():
+            return [values]
+        case list() | tuple():
+            return [df for value in values for df in _dataframes(value)]
+        case dict():
+            return _dataframes(list(values.values()))
+        case _:
+            return []
+
+
+def _cpu_sec(usage: resource.struct_rusage) -> float:
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(
+    stage: str, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> tuple[T, StageMetrics]:
+    """Run func and measure its wall time, CPU time and input/output.
+
+    CPU time of child processes covers the external tools a stage runs.
+    The peak RSS of the process so far is recorded along with it.
+    CPU times are process-wide as well, so stages that run concurrently
+    (see main.run_sample) include each other's CPU time.
+    """
+    input_bytes, input_records = _io_size([*args, *kwargs.values()])
+
+    self_start = resource.getrusage(resource.RUSAGE_SELF)
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+
+    result = func(*args, **kwargs)
+
+    wall_sec = time.perf_counter() - start
+    self_end = resource.getrusage(resource.RUSAGE_SELF)
+    children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # Stages that return tables report their number of rows.
+    match _dataframes(result):
+        case []:
+            output_bytes, output_records = _io_size(result)
+        case dfs:
+            output_bytes, output_records = None, sum(len(df) for df in dfs)
+
+    metrics = StageMetrics(
+        stage=stage,
+        wall_sec=wall_sec,
+        cpu_sec=_cpu_sec(self_end) - _cpu_sec(self_start),
+        children_cpu_sec=_cpu_sec(children_end) - _cpu_sec(children_start),
+        # ru_maxrss is in KiB on Linux.
+        process_peak_rss_mb=self_end.ru_maxrss / 1024,
+        process_children_peak_rss_mb=children_end.ru_maxrss / 1024,
+        input_bytes=input_bytes,
+        input_records=input_records,
+        output_bytes=output_bytes,
+        output_records=output_records,
+    )
+
+    if _RECORDS is not None:
+        _RECORDS.append(metrics)
+
+    return result, metrics
+
+
+@contextmanager
+def recording() -> Iterator[list[StageMetrics]]:
+    """Collect the metrics of all stages that run within the context.
+
+    A nested recording shares the list of the enclosing one.
+    """
+    global _RECORDS
+
+    if _RECORDS is not None:
+        yield _RECORDS
+        return
+
+    previous, _RECORDS = _RECORDS, []
+
+    try:
+        yield _RECORDS
+    finally:
+        _RECORDS = previous
+
+
+def write_metrics(records: list[StageMetrics], outdir: Path) -> Path:
+    """Write metrics.json and metrics.tsv to outdir."""
+    metrics_json = outdir / METRICS_JSON
+
+    rows = [record.model_dump() for record in records]
+    metrics_json.write_text(json.dumps(rows, indent=2))
+    pd.DataFrame(rows, columns=list(StageMetrics.model_fields)).astype(
+        INT_COLUMNS
+    ).to_csv(outdir / METRICS_TSV, sep="\t", index=False)
+
+    return metrics_json
+
+
+def aggregate_metrics(sample_dirs: dict[str, Path], outdir: Path) -> Path:
+    """Combine the per-sample metrics into run-level metrics files.
+
+    Writes one row per sample and stage to metrics.tsv and per-stage totals
+    to metrics.json. Process peak RSS values are left out of the totals, as
+    they are not specific to a stage.
+    """
+    df = pd.concat(
+        [
+            pd.read_json(sample_dir / METRICS_JSON).assign(sample_name=sample_name)
+            for sample_name, sample_dir in sample_dirs.items()
+            if (sample_dir / METRICS_JSON).is_file()
+        ]
+        or [pd.DataFrame(columns=[*StageMetrics.model_fields, "sample_name"])]
+    ).astype(INT_COLUMNS)
+    df.to_csv(outdir / METRICS_TSV, sep="\t", index=False)
+
+    stages_df = df.groupby(by="stage", sort=False).agg(
+        num_samples=("sample_name", "nunique"),
+        wall_sec=("wall_sec", "sum"),
+        cpu_sec=("cpu_sec", "sum"),
+        children_cpu_sec=("children_cpu_sec", "sum"),
+        input_bytes=("input_bytes", "sum"),
+        output_bytes=("output_bytes", "sum"),
+    )
+
+    metrics_json = outdir / METRICS_JSON
+    metrics_json.write_text(stages_df.reset_index().to_json(orient="records", indent=2))
+
+    return metrics_json
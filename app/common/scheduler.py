@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, TypeVar
+from pydantic import BaseModel
+import logging
+import os
+from common.decorator import set_spinner
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SchedulerConfig(BaseModel):
+    """Settings for running several samples concurrently."""
+
+    jobs: int = 1
+    max_threads: int | None = None
+
+    def threads_per_job(self) -> int | None:
+        """Share of the global core budget for each concurrent sample.
+
+        Returns None when neither a budget nor parallelism is requested, meaning
+        that every stage keeps its own default thread count.
+        """
+        if self.max_threads is None and self.jobs == 1:
+            return None
+
+        budget = self.max_threads or os.cpu_count() or 1
+        return max(1, budget // self.jobs)
+
+
+def _init_worker(
+    initializer: Callable[..., None] | None, initargs: tuple[Any, ...]
+) -> None:
+    set_spinner(False)
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def run_parallel(
+    func: Callable[..., T],
+    tasks: dict[str, tuple[Any, ...]],
+    jobs: int,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+) -> tuple[dict[str, T], dict[str, BaseException]]:
+    """Run func(*args) for every task, at most `jobs` at a time.
+
+    A failing task is logged and recorded, the remaining tasks keep running.
+    Returns the results and the exceptions, both keyed by task name. The
+    optional initializer sets up per-process state in each worker, it is
+    expected to already have been called in the current process.
+    """
+    results, failed = {}, {}
+
+    if jobs <= 1:
+        for name, args in tasks.items():
+            try:
+                results[name] = func(*args)
+            except Exception as e:
+                log.exception(f"{name} failed.")
+                failed[name] = e
+
+        return results, failed
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(initializer, initargs),
+    ) as executor:
+        futures = {executor.submit(func, *args): name for name, args in tasks.items()}
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                log.info(f"{name} finished.")
+            except Exception as e:
+                log.error(f"{name} failed: {e!r}")
+                failed[name] = e
+
+    return results, failed
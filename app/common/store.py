@@ -0,0 +1,110 @@
+from pathlib import Path
+from typing import Any
+import pandas as pd
+
+STORE_DIR = "store"
+
+# Rows per parquet row group. Tables are sorted, so that filtered reads only
+# decode the row groups of the requested samples and levels.
+ROW_GROUP_SIZE = 100_000
+
+TABLES = ("samples", "parsed", "otutab", "abundance")
+
+
+def table_path(store: Path, table: str) -> Path:
+    return store / f"{table}.parquet"
+
+
+def write_table(df: pd.DataFrame, store: Path, table: str, sort_by: list[str]) -> Path:
+    df = df.sort_values(by=sort_by, kind="stable").reset_index(drop=True)
+
+    # Repeated strings are stored once per row group.
+    for col in ("sample_name", "level"):
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype("category")
+
+    path = table_path(store, table)
+    df.to_parquet(path, index=False, row_group_size=ROW_GROUP_SIZE)
+
+    return path
+
+
+def write_run_store(
+    agg_dfs: dict[str, pd.DataFrame], sample_dirs: dict[str, Path], outdir: Path
+) -> Path:
+    """Combine the results of all samples into parquet tables in outdir/store.
+
+    Writes samples (one row per sample), parsed (parsed.tsv), otutab
+    (otutab.tsv) and abundance (the aggregated abundance per level and hit),
+    each with a sample_name column.
+    """
+    store = outdir / STORE_DIR
+    store.mkdir(exist_ok=True)
+
+    parsed_df = pd.concat(
+        [
+            pd.read_csv(sample_dirs[sample_name] / "parsed.tsv", sep="\t").assign(
+                sample_name=sample_name
+            )
+            for sample_name in agg_dfs
+        ]
+        or [pd.DataFrame(columns=["asv", "level", "hit", "score", "sample_name"])]
+    )
+    otutab_df = pd.concat(
+        [
+            pd.read_csv(sample_dirs[sample_name] / "otutab.tsv", sep="\t").assign(
+                sample_name=sample_name
+            )
+            for sample_name in agg_dfs
+        ]
+        or [pd.DataFrame(columns=["asv", "reads", "sample_name"])]
+    )
+    abundance_df = pd.concat(
+        [
+            agg_df.assign(sample_name=sample_name)
+            for sample_name, agg_df in agg_dfs.items()
+        ]
+        or [pd.DataFrame(columns=["level", "hit", "reads", "abundance", "sample_name"])]
+    )
+    abundance_df["level"] = abundance_df["level"].astype(str)
+
+    samples_df = (
+        otutab_df.groupby(by="sample_name")
+        .agg(num_asvs=("asv", "size"), reads=("reads", "sum"))
+        .reindex(list(agg_dfs), fill_value=0)
+        .rename_axis("sample_name")
+        .reset_index()
+    )
+
+    write_table(samples_df, store, "samples", ["sample_name"])
+    write_table(parsed_df, store, "parsed", ["sample_name", "asv"])
+    write_table(otutab_df, store, "otutab", ["sample_name", "asv"])
+    write_table(abundance_df, store, "abundance", ["level", "sample_name"])
+
+    return store
+
+
+def read_table(
+    store: Path,
+    table: str,
+    columns: list[str] | None = None,
+    **filters: Any,
+) -> pd.DataFrame:
+    """Read the matching rows and columns of a store table.
+
+    Filters are column=value or column=[values], applied while reading.
+    """
+    parquet_filters = [
+        (
+            (col, "in", list(value))
+            if isinstance(value, (list, tuple))
+            else (col, "==", value)
+        )
+        for col, value in filters.items()
+    ]
+
+    return pd.read_parquet(
+        table_path(store, table),
+        columns=columns,
+        filters=parquet_filters or None,
+    )
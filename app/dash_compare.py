@@ -0,0 +1,157 @@
+from pathlib import Path
+from functools import lru_cache
+import pandas as pd
+import plotly.express as px
+from dash import Dash, dcc, html, Input, Output
+from plotly.graph_objects import Figure
+import argparse
+import os
+from classification.results import Levels
+from common.store import read_table, table_path
+
+# Figures kept in memory, one per combination of inputs.
+FIGURE_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def get_abundance(
+    store: Path, level: str, sample_names: tuple[str, ...], top_n: int
+) -> pd.DataFrame:
+    """Abundance of the top_n hits (by mean abundance) at level, one column per sample.
+
+    Only the rows of the requested level and samples are read.
+    """
+    df = read_table(
+        store,
+        "abundance",
+        columns=["sample_name", "hit", "abundance"],
+        level=level,
+        sample_name=list(sample_names),
+    )
+
+    wide_df = (
+        df.pivot_table(
+            index="hit",
+            columns="sample_name",
+            values="abundance",
+            aggfunc="sum",
+            observed=True,
+        )
+        .reindex(columns=list(sample_names))
+        .fillna(0.0)
+    )
+
+    # Everything outside the top hits is summed up as other.
+    top_hits = wide_df.mean(axis=1).sort_values(ascending=False).index[:top_n]
+    other = wide_df.drop(index=top_hits).sum()
+
+    top_df = wide_df.loc[top_hits]
+    if len(wide_df) > len(top_hits):
+        top_df.loc["other"] = other
+
+    return top_df
+
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def get_heatmap(
+    store: Path, level: str, sample_names: tuple[str, ...], top_n: int
+) -> Figure:
+    df = get_abundance(store, level, sample_names, top_n)
+
+    fig = px.imshow(
+        df,
+        aspect="auto",
+        color_continuous_scale="Viridis",
+        labels=dict(x="sample", y=level, color="abundance"),
+    )
+    fig.update_layout(title_text=f"Relative abundance ({level})", font_size=10)
+
+    return fig
+
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def get_stacked_bars(
+    store: Path, level: str, sample_names: tuple[str, ...], top_n: int
+) -> Figure:
+    df = get_abundance(store, level, sample_names, top_n)
+    long_df = df.reset_index(names="hit").melt(
+        id_vars="hit", var_name="sample_name", value_name="abundance"
+    )
+
+    fig = px.bar(
+        long_df,
+        x="sample_name",
+        y="abundance",
+        color="hit",
+        barmode="stack",
+        color_discrete_sequence=px.colors.qualitative.Antique_r,
+    )
+    fig.update_layout(title_text=f"Relative abundance ({level})", font_size=10)
+
+    return fig
+
+
+def dash_wrapper(store: Path):
+    # Only the (small) sample table is read up front.
+    samples_df = read_table(store, "samples")
+    sample_names = samples_df["sample_name"].astype(str).tolist()
+
+    app = Dash(__name__)
+
+    app.layout = html.Div(
+        [
+            html.H4("Sample comparison"),
+            html.P("Samples"),
+            dcc.Dropdown(
+                id="samples",
+                options=sample_names,
+                value=sample_names,
+                multi=True,
+            ),
+            html.P("Level"),
+            dcc.Dropdown(
+                id="level",
+                options=Levels.as_list(),
+                value=Levels.GENUS.value,
+                clearable=False,
+            ),
+            html.P("Number of taxa"),
+            dcc.Slider(id="top_n", min=5, max=50, value=20, step=5),
+            dcc.Graph(id="heatmap"),
+            dcc.Graph(id="bars"),
+        ]
+    )
+
+    @app.callback(
+        Output("heatmap", "figure"),
+        Output("bars", "figure"),
+        Input("samples", "value"),
+        Input("level", "value"),
+        Input("top_n", "value"),
+    )
+    def compare(selected: list[str], level: str, top_n: int):
+        selected = tuple(selected or sample_names)
+
+        return (
+            get_heatmap(store, level, selected, top_n),
+            get_stacked_bars(store, level, selected, top_n),
+        )
+
+    app.run(debug=True, port=os.environ.get("DASH_PORT"), host="0.0.0.0")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--store",
+        required=True,
+        help="Path to the 'store' directory of a run",
+    )
+
+    args = parser.parse_args()
+
+    store = Path(args.store)
+    if not table_path(store, "samples").is_file():
+        raise FileNotFoundError(table_path(store, "samples"))
+
+    dash_wrapper(store)
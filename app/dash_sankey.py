@@ -1,14 +1,72 @@
 from pathlib import Path
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from dash import Dash, dcc, html, Input, Output
+from plotly.graph_objects import Figure
 import argparse
 import os
-from classification.results import get_sankey_fig, pivot_df
+from classification.results import Levels, get_sankey_fig, pivot_index
 from common.file import _file
 
+ALLOWED_PARSED_ENDINGS = (".tsv", ".parquet")
 
-def dash_wrapper(tsv: Path):
-    df = pd.read_csv(tsv, sep="\t")
+# Figures kept in memory, one per slider value.
+FIGURE_CACHE_SIZE = 32
+
+
+def read_parsed(parsed: Path) -> pd.DataFrame:
+    match parsed.suffix:
+        case ".parquet":
+            return pd.read_parquet(parsed)
+        case _:
+            return pd.read_csv(parsed, sep="\t")
+
+
+class SankeyData:
+    """parsed.tsv pivoted to one row per asv, with hits and scores per level.
+
+    Hits are prefixed with their level (as in pivot_df) up front, so that a
+    threshold only needs a vectorized mask.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.levels = Levels.as_list()
+        index = pivot_index(df)
+
+        wide_df = df.pivot(index=index, columns="level", values=["hit", "score"])
+        wide_df = wide_df.dropna()
+
+        self.index_df = wide_df.index.to_frame(index=False)
+        self.hits = np.stack(
+            [
+                (f"{level[0]}:" + wide_df["hit"][level].astype(str)).to_numpy()
+                for level in self.levels
+            ],
+            axis=1,
+        )
+        self.scores = wide_df["score"][self.levels].to_numpy(dtype=np.float64)
+        self.unclassified = np.array(
+            [f"{level[0]}:unclassified" for level in self.levels]
+        )
+
+        self.min_score = float(df["score"].min()) if len(df) else 0.0
+
+    def at_threshold(self, threshold: float) -> pd.DataFrame:
+        """Pivoted hits where scores below threshold are unclassified."""
+        hits = np.where(self.scores >= threshold, self.hits, self.unclassified)
+
+        return pd.concat(
+            [self.index_df, pd.DataFrame(hits, columns=self.levels)], axis=1
+        )
+
+
+def dash_wrapper(parsed: Path):
+    data = SankeyData(read_parsed(parsed))
+
+    @lru_cache(maxsize=FIGURE_CACHE_SIZE)
+    def get_figure(threshold: float) -> Figure:
+        return get_sankey_fig(data.at_threshold(threshold))
 
     app = Dash(__name__)
 
@@ -19,9 +77,9 @@ def dash_wrapper(tsv: Path):
             html.P("Threshold"),
             dcc.Slider(
                 id="slider",
-                min=round(df["score"].min(), 1),
+                min=round(data.min_score, 1),
                 max=1.0,
-                value=round(df["score"].min(), 1),
+                value=round(data.min_score, 1),
                 step=0.1,
             ),
         ]
@@ -29,18 +87,8 @@ def dash_wrapper(tsv: Path):
 
     @app.callback(Output("graph", "figure"), Input("slider", "value"))
     def sankey_diagram(threshold: float):
-        local_df = df.copy()
-
-        # Update the dataframe with unclassified when threshold is updated.
-        local_df["hit"] = local_df.apply(
-            lambda x: x["hit"] if x["score"] >= threshold else "unclassified",
-            axis=1,
-        )
-
-        local_df = pivot_df(local_df)
-        fig = get_sankey_fig(local_df)
-
-        return fig
+        # Update the diagram with unclassified hits when threshold is updated.
+        return get_figure(round(threshold, 6))
 
     app.run(debug=True, port=os.environ.get("DASH_PORT"), host="0.0.0.0")
 
@@ -50,11 +98,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--parsed_tsv",
         required=True,
-        help="Path to the 'parsed.tsv' file",
+        help="Path to the 'parsed.tsv' (or parsed.parquet) file",
     )
 
     args = parser.parse_args()
 
-    tsv = _file(args.parsed_tsv, allowed_file_endings=(".tsv"))
+    parsed = _file(args.parsed_tsv, allowed_file_endings=ALLOWED_PARSED_ENDINGS)
 
-    dash_wrapper(tsv)
+    dash_wrapper(parsed)
@@ -1,10 +1,18 @@
 import argparse
 from pathlib import Path
-from Bio import SeqIO
+from typing import Iterator
 import pandas as pd
 import re
-from sh import curl
 from common.decorator import with_yaspin
+from common.log import configure_logging
+from common.metrics import recording, write_metrics
+from common.lineage import RANKS, short_header, write_lineage, write_manifest
+from blast.main import build_blast_db
+from classification.config import SintaxConfig
+from classification.kmer_index import write_kmer_index
+from reference.build import BuildConfig, build_db
+from reference.primers import REGIONS
+from reference.taxonomy import sanitize
 
 # Path to EMU github
 EMU_GITHUB = Path(
@@ -33,19 +41,8 @@ def get_accession(rec_desc: str) -> str:
             return accession_match.group(0)
 
 
-def sanitize(s: str) -> str:
-    return s.lower().replace(" ", "_")
-
-
-def get_taxonomy(tax_id: int, df: pd.DataFrame) -> str:
-    query = df.query(f"tax_id == {tax_id}")
-
-    if len(query) != 1:
-        raise ValueError(f"{tax_id}, {query}")
-
-    query = query.iloc[0]
-
-    _, species, genus, family, order, clas, phylum, _, domain, *_ = query
+def get_lineage(row: tuple) -> str:
+    _, species, genus, family, order, clas, phylum, _, domain, *_ = row
 
     taxonomy = (
         f"d:{domain}|p:{phylum}|c:{clas}|o:{order}|f:{family}|g:{genus}|s:{species}"
@@ -56,7 +53,29 @@ def get_taxonomy(tax_id: int, df: pd.DataFrame) -> str:
     return sanitized_taxonomy
 
 
+def load_taxonomy(emu_taxonomy: Path) -> dict[int, str]:
+    """Map each tax_id to its sanitized lineage.
+
+    Ambiguous (duplicated) tax_ids are left out and fail on lookup instead.
+    """
+    df = pd.read_csv(emu_taxonomy, sep="\t")
+    df = df[~df["tax_id"].duplicated(keep=False)]
+
+    return {
+        int(row[0]): get_lineage(row) for row in df.itertuples(index=False, name=None)
+    }
+
+
+def get_taxonomy(tax_id: int, taxonomy: dict[int, str]) -> str:
+    if (lineage := taxonomy.get(int(tax_id))) is None:
+        raise ValueError(f"{tax_id} is missing from or duplicated in the taxonomy.")
+
+    return lineage
+
+
 def fetch_fasta(outdir: Path) -> Path:
+    from sh import curl
+
     emu_fasta = outdir / "emu.fasta"
 
     curl(EMU_GITHUB / "species_taxid.fasta", "-o", emu_fasta)
@@ -66,6 +85,8 @@ def fetch_fasta(outdir: Path) -> Path:
 
 
 def fetch_taxonomy(outdir: Path) -> Path:
+    from sh import curl
+
     emu_taxonomy = outdir / "emu.tsv"
 
     curl(EMU_GITHUB / "taxonomy.tsv", "-o", emu_taxonomy)
@@ -82,49 +103,184 @@ def fetch_db(outdir: Path) -> tuple[Path, Path]:
     return emu_fasta, emu_taxonomy
 
 
+def get_lineage_table(taxonomy: dict[int, str], tax_ids: set[int]) -> pd.DataFrame:
+    """One row per tax_id and one column per rank, without rank prefixes."""
+    lineages = pd.Series({tax_id: taxonomy[tax_id] for tax_id in sorted(tax_ids)})
+
+    lineage_df = (
+        lineages.str.split("|", expand=True)
+        .apply(lambda col: col.str[2:])
+        .set_axis(RANKS, axis=1)
+    )
+
+    return lineage_df.rename_axis("tax_id").reset_index()
+
+
 @with_yaspin("--- Parsing taxonomy...")
-def write_db(outdir: Path, emu_fasta: Path, emu_taxonomy: Path) -> Path:
+def write_db(
+    outdir: Path, emu_fasta: Path, emu_taxonomy: Path, full_headers: bool = False
+) -> Path:
+    """Write db.fasta, with its lineage table and manifest next to it.
+
+    Headers are short (accession:tax_id) and lineages are looked up in the
+    lineage table. With full_headers, each header carries the full lineage
+    instead and no lineage table is written.
+    """
+    # Only needed here, and slow to import.
+    from Bio import SeqIO
+    from Bio.SeqRecord import SeqRecord
+
     db_fasta = outdir / "db.fasta"
 
-    df = pd.read_csv(emu_taxonomy, sep="\t")
+    taxonomy = load_taxonomy(emu_taxonomy)
+    tax_ids: set[int] = set()
 
-    lst = []
-    with emu_fasta.open("r") as f:
-        for rec in SeqIO.parse(f, "fasta"):
+    def annotate(records: Iterator[SeqRecord]) -> Iterator[SeqRecord]:
+        for rec in records:
             tax_id = get_tax_id(rec.id)
             accession = get_accession(rec.description)
-            taxonomy = get_taxonomy(tax_id, df)
+            lineage = get_taxonomy(tax_id, taxonomy)
 
-            rec.id = f"accession={accession};tax_id={tax_id};taxonomy={taxonomy}"
+            if full_headers:
+                rec.id = f"accession={accession};tax_id={tax_id};taxonomy={lineage}"
+            else:
+                rec.id = short_header(accession, tax_id)
             rec.description = ""
 
-            lst.append(rec)
+            tax_ids.add(int(tax_id))
+            yield rec
+
+    # Records are written as they are parsed, nothing is kept in memory.
+    with emu_fasta.open("r") as f_in, db_fasta.open("w") as f_out:
+        num_records = SeqIO.write(annotate(SeqIO.parse(f_in, "fasta")), f_out, "fasta")
 
-    with db_fasta.open("w") as f:
-        SeqIO.write(lst, f, "fasta")
+    if not full_headers:
+        write_lineage(get_lineage_table(taxonomy, tax_ids), db_fasta)
+        write_manifest(db_fasta, num_records)
 
     assert db_fasta.is_file()
     return db_fasta
 
 
-def main(outdir: Path) -> Path:
-    emu_fasta, emu_taxonomy = fetch_db(outdir)
+@with_yaspin("--- Building BLAST database...")
+def write_blast_db(db_fasta: Path) -> Path:
+    return build_blast_db(db_fasta)
 
-    db_fasta = write_db(outdir, emu_fasta, emu_taxonomy)
 
-    emu_fasta.unlink()
-    emu_taxonomy.unlink()
+@with_yaspin("--- Building k-mer index...")
+def write_sintax_index(db_fasta: Path) -> Path:
+    return write_kmer_index(db_fasta, SintaxConfig().kmer_size)
+
+
+def main(
+    outdir: Path,
+    blast_db: bool = False,
+    full_headers: bool = False,
+    fasta: Path | None = None,
+    taxonomy: Path | None = None,
+    build_cfg: BuildConfig | None = None,
+    sintax_index: bool = False,
+) -> Path:
+    """Build db.fasta from the EMU database or, with fasta, from local files."""
+    with recording() as records:
+        match fasta:
+            case None:
+                emu_fasta, emu_taxonomy = fetch_db(outdir)
+
+                db_fasta = write_db(outdir, emu_fasta, emu_taxonomy, full_headers)
+
+                emu_fasta.unlink()
+                emu_taxonomy.unlink()
+            case _:
+                db_fasta = build_db(outdir, fasta, taxonomy, build_cfg)
+
+        if blast_db:
+            write_blast_db(db_fasta)
+
+        if sintax_index:
+            write_sintax_index(db_fasta)
+
+    write_metrics(records, outdir)
 
     return db_fasta
 
 
 if __name__ == "__main__":
+    configure_logging()
+
     # Arguments.
     parser = argparse.ArgumentParser()
     parser.add_argument("-o", "--outdir", help="Output directory", required=True)
+    parser.add_argument(
+        "--blast_db",
+        action="store_true",
+        help="Also build a BLAST database of the reference sequences",
+    )
+    parser.add_argument(
+        "--sintax_index",
+        action="store_true",
+        help="Also build the k-mer index of main.py --sintax_engine numpy",
+    )
+    parser.add_argument(
+        "--full_headers",
+        action="store_true",
+        help="Write the full lineage to each fasta header instead of a lineage table",
+    )
+    parser.add_argument(
+        "--fasta",
+        help="Build from this local fasta instead of downloading EMU",
+    )
+    parser.add_argument(
+        "--taxonomy",
+        help="Tsv with the lineage of each --fasta record (id, lineage). "
+        "If omitted, lineages are read from the fasta headers (>id lineage)",
+    )
+    parser.add_argument(
+        "--region",
+        choices=list(REGIONS),
+        help="Trim --fasta records to this 16S region",
+    )
+    parser.add_argument(
+        "--no_dereplicate",
+        action="store_true",
+        help="Keep identical --fasta sequences as separate records",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=8,
+        help="Processes for building from --fasta",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=10_000,
+        help="Records per chunk for building from --fasta",
+    )
     args = parser.parse_args()
 
+    if args.fasta is None and (args.taxonomy is not None or args.region is not None):
+        parser.error("--taxonomy and --region require --fasta")
+
+    if args.fasta is not None and args.full_headers:
+        parser.error("--full_headers is not supported with --fasta")
+
     outdir = Path(args.outdir)
     outdir.mkdir(exist_ok=True, parents=True)
 
-    _ = main(outdir)
+    build_cfg = BuildConfig(
+        threads=args.threads,
+        chunk_size=args.chunk_size,
+        region=args.region,
+        dereplicate=not args.no_dereplicate,
+    )
+
+    _ = main(
+        outdir,
+        args.blast_db,
+        args.full_headers,
+        Path(args.fasta) if args.fasta else None,
+        Path(args.taxonomy) if args.taxonomy else None,
+        build_cfg,
+        args.sintax_index,
+    )
@@ -0,0 +1,247 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+from pydantic import BaseModel
+import json
+import logging
+import os
+import pickle
+import socket
+import time
+
+log = logging.getLogger(__name__)
+
+
+class QueueConfig(BaseModel):
+    """Settings of a run, which its tasks carry to the workers."""
+
+    # Seconds between checks for new tasks or finished ones.
+    poll_sec: float = 1.0
+    # Seconds between heartbeats of a running task.
+    heartbeat_sec: float = 10.0
+    # A running task without a heartbeat for this long is given to another
+    # worker. Must allow for clock differences between nodes.
+    heartbeat_timeout: float = 120.0
+    # Attempts of a task, including the first one.
+    max_attempts: int = 3
+
+
+class Task(BaseModel):
+    """func(*args) of one task, func is a dotted name such as main.run_sample.
+
+    The initializer (also a dotted name) sets up per-process state in the
+    worker, it is called once per distinct initargs. cfg holds the retry and
+    heartbeat settings of the run the task belongs to.
+    """
+
+    task_id: str
+    func: str
+    args: tuple[Any, ...]
+    initializer: str | None = None
+    initargs: tuple[Any, ...] = ()
+    cfg: QueueConfig = QueueConfig()
+    attempt: int = 0
+    errors: list[str] = []
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Broker(ABC):
+    """Hands out tasks to workers and collects their results.
+
+    A task is pending until a worker claims it, then running until the
+    worker completes or fails it. Failed and stale (no heartbeat) tasks are
+    put back as pending until they run out of attempts (see Task.cfg). cfg is
+    used for the tasks this broker creates, and for polling.
+    """
+
+    def __init__(self, cfg: QueueConfig | None = None):
+        self.cfg = cfg or QueueConfig()
+
+    @abstractmethod
+    def put(self, task: Task) -> None: ...
+
+    @abstractmethod
+    def claim(self, worker: str) -> Task | None:
+        """The next pending task, now running for worker, or None if none."""
+        ...
+
+    @abstractmethod
+    def heartbeat(self, task: Task, worker: str) -> bool:
+        """Keep the task running for worker, False if it was given to another."""
+        ...
+
+    @abstractmethod
+    def complete(self, task: Task, worker: str, result: Any) -> None: ...
+
+    @abstractmethod
+    def fail(self, task: Task, worker: str, error: str) -> None: ...
+
+    @abstractmethod
+    def requeue_stale(self) -> list[str]:
+        """Put running tasks without a recent heartbeat back, returns their ids."""
+        ...
+
+    @abstractmethod
+    def collect(self, task_ids: list[str]) -> tuple[dict[str, Any], dict[str, str]]:
+        """Results and errors of the tasks that are finished, keyed by task id."""
+        ...
+
+
+class FileBroker(Broker):
+    """Broker on a (shared) directory, such as an NFS mount all nodes see.
+
+    Each task is a file that moves between the pending, running, done and
+    failed directories. Workers claim a task by renaming it from pending to
+    running, which only one of them can do, since rename is atomic also on
+    NFS. Files are written to a temporary name first and renamed into place,
+    so that nobody reads a partial file. Running tasks have a heartbeat file
+    next to them, whose modification time is refreshed by the worker.
+    """
+
+    def __init__(self, queue_dir: Path, cfg: QueueConfig | None = None):
+        super().__init__(cfg)
+        self.queue_dir = queue_dir
+        # When requeue_stale first saw a running task without a heartbeat.
+        self._no_heartbeat: dict[str, float] = {}
+
+        for state in ("pending", "running", "done", "failed"):
+            (queue_dir / state).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state: str, task_id: str, suffix: str = ".task") -> Path:
+        return self.queue_dir / state / f"{task_id}{suffix}"
+
+    def _write(self, path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f".{path.name}.{worker_id()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def _owner(self, task: Task) -> str | None:
+        try:
+            return self._path("running", task.task_id, ".heartbeat").read_text()
+        except FileNotFoundError:
+            return None
+
+    def _release(self, task: Task) -> None:
+        self._path("running", task.task_id).unlink(missing_ok=True)
+        self._path("running", task.task_id, ".heartbeat").unlink(missing_ok=True)
+
+    def _requeue(self, task: Task, error: str) -> None:
+        """Back to pending, or to failed once out of attempts."""
+        running = self._path("running", task.task_id)
+        requeued = running.with_name(f".{running.name}.requeue")
+
+        # Only one of the worker and the coordinator can put a task back.
+        try:
+            running.rename(requeued)
+        except FileNotFoundError:
+            return
+
+        self._path("running", task.task_id, ".heartbeat").unlink(missing_ok=True)
+
+        task = task.model_copy(
+            update={"attempt": task.attempt + 1, "errors": [*task.errors, error]}
+        )
+
+        if task.attempt < task.cfg.max_attempts:
+            log.warning(f"Retrying {task.task_id} ({error}).")
+            self._write(self._path("pending", task.task_id), pickle.dumps(task))
+        else:
+            log.error(f"{task.task_id} failed {task.attempt} times ({error}).")
+            self._write(
+                self._path("failed", task.task_id, ".json"),
+                json.dumps(task.errors).encode(),
+            )
+
+        requeued.unlink()
+
+    def put(self, task: Task) -> None:
+        for state, suffix in (("done", ".result"), ("failed", ".json")):
+            self._path(state, task.task_id, suffix).unlink(missing_ok=True)
+
+        self._write(self._path("pending", task.task_id), pickle.dumps(task))
+
+    def claim(self, worker: str) -> Task | None:
+        for pending in sorted((self.queue_dir / "pending").glob("*.task")):
+            running = self._path("running", pending.stem)
+
+            try:
+                pending.rename(running)
+            except FileNotFoundError:
+                # Claimed by another worker.
+                continue
+
+            self._write(running.with_suffix(".heartbeat"), worker.encode())
+
+            return pickle.loads(running.read_bytes())
+
+        return None
+
+    def heartbeat(self, task: Task, worker: str) -> bool:
+        if self._owner(task) != worker:
+            return False
+
+        # Without explicit times, the file server sets its own time.
+        os.utime(self._path("running", task.task_id, ".heartbeat"))
+
+        return True
+
+    def complete(self, task: Task, worker: str, result: Any) -> None:
+        # A late result of a task that was given to another worker is as good.
+        self._write(self._path("done", task.task_id, ".result"), pickle.dumps(result))
+
+        if self._owner(task) == worker:
+            self._release(task)
+
+    def fail(self, task: Task, worker: str, error: str) -> None:
+        # Otherwise the task has already been put back.
+        if self._owner(task) == worker:
+            self._requeue(task, error)
+
+    def requeue_stale(self) -> list[str]:
+        stale = []
+
+        running_tasks = sorted((self.queue_dir / "running").glob("*.task"))
+
+        for task_id in self._no_heartbeat.keys() - {r.stem for r in running_tasks}:
+            del self._no_heartbeat[task_id]
+
+        for running in running_tasks:
+            heartbeat = running.with_suffix(".heartbeat")
+
+            try:
+                task = pickle.loads(running.read_bytes())
+            except FileNotFoundError:
+                # Just finished.
+                continue
+
+            try:
+                age = time.time() - heartbeat.stat().st_mtime
+                worker = heartbeat.read_text()
+                self._no_heartbeat.pop(task.task_id, None)
+            except FileNotFoundError:
+                # Just claimed, or the worker died before its first heartbeat.
+                since = self._no_heartbeat.setdefault(task.task_id, time.monotonic())
+                age, worker = time.monotonic() - since, "its worker"
+
+            if age < task.cfg.heartbeat_timeout:
+                continue
+
+            self._no_heartbeat.pop(task.task_id, None)
+            self._requeue(task, f"no heartbeat from {worker} for {age:.0f}s")
+            stale.append(task.task_id)
+
+        return stale
+
+    def collect(self, task_ids: list[str]) -> tuple[dict[str, Any], dict[str, str]]:
+        results, errors = {}, {}
+
+        for task_id in task_ids:
+            if (done := self._path("done", task_id, ".result")).is_file():
+                results[task_id] = pickle.loads(done.read_bytes())
+            elif (failed := self._path("failed", task_id, ".json")).is_file():
+                errors[task_id] = json.loads(failed.read_text())[-1]
+
+        return results, errors
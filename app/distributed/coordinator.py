@@ -0,0 +1,95 @@
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+from .broker import Broker, Task
+from .worker import work
+import logging
+import multiprocessing
+import sys
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def dotted_name(func: Callable[..., Any]) -> str:
+    """Name that workers import func by, also if it is defined in the script run."""
+    module = func.__module__
+    if module == "__main__":
+        module = Path(sys.modules["__main__"].__file__).stem
+
+    return f"{module}.{func.__qualname__}"
+
+
+def run_distributed(
+    func: Callable[..., T],
+    tasks: dict[str, tuple[Any, ...]],
+    broker: Broker,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+    local_workers: int = 0,
+) -> tuple[dict[str, T], dict[str, BaseException]]:
+    """Run func(*args) for every task on the workers of broker.
+
+    Same as run_parallel, but tasks are put on the queue of broker and run by
+    whichever workers (see worker.py) claim them, on any node. Arguments
+    and results are pickled, so paths must be valid on all nodes. With
+    local_workers, that many workers are also started on this node while
+    the tasks run. The tasks carry the retry and heartbeat settings of
+    broker.cfg to the workers.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    names = {f"{run_id}-{name}": name for name in tasks}
+
+    for task_id, name in names.items():
+        broker.put(
+            Task(
+                task_id=task_id,
+                func=dotted_name(func),
+                args=tasks[name],
+                initializer=dotted_name(initializer) if initializer else None,
+                initargs=initargs,
+                cfg=broker.cfg,
+            )
+        )
+
+    log.info(f"Queued {len(tasks)} task(s) of run {run_id}.")
+
+    stop = multiprocessing.Event()
+    workers = [
+        multiprocessing.Process(target=work, args=(broker,), kwargs={"stop": stop})
+        for _ in range(local_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    results, failed = {}, {}
+    remaining = list(names)
+
+    try:
+        while remaining:
+            for task_id in broker.requeue_stale():
+                log.warning(f"{names.get(task_id, task_id)} lost its worker.")
+
+            done, errors = broker.collect(remaining)
+
+            for task_id, result in done.items():
+                results[names[task_id]] = result
+                log.info(f"{names[task_id]} finished.")
+
+            for task_id, error in errors.items():
+                log.error(f"{names[task_id]} failed: {error.splitlines()[0]}")
+                failed[names[task_id]] = RuntimeError(error)
+
+            finished = done.keys() | errors.keys()
+            remaining = [task_id for task_id in remaining if task_id not in finished]
+
+            if remaining:
+                time.sleep(broker.cfg.poll_sec)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    return results, failed
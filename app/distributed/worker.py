@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from importlib import import_module
+from multiprocessing.synchronize import Event
+from typing import Any, Callable, Iterator
+from common.decorator import set_spinner
+from .broker import Broker, Task, worker_id
+import logging
+import threading
+import time
+import traceback
+
+log = logging.getLogger(__name__)
+
+
+def resolve(name: str) -> Callable[..., Any]:
+    """The function of a dotted name, e.g. main.run_sample."""
+    module, _, func = name.rpartition(".")
+
+    return getattr(import_module(module), func)
+
+
+@contextmanager
+def heartbeats(broker: Broker, task: Task, worker: str, interval: float) -> Iterator:
+    """Send heartbeats for task from a background thread, while in the block."""
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(interval):
+            if not broker.heartbeat(task, worker):
+                log.warning(f"{task.task_id} was given to another worker.")
+                return
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_task(
+    broker: Broker,
+    task: Task,
+    worker: str,
+    initialized: set[tuple[str, str]],
+) -> bool:
+    """Run a claimed task and report its result or error, True if it succeeded.
+
+    The task's initializer is called unless its key is in initialized.
+    """
+    try:
+        with heartbeats(broker, task, worker, task.cfg.heartbeat_sec):
+            # E.g. the stage cache and memo of the run the task belongs to.
+            if task.initializer is not None:
+                key = (task.initializer, repr(task.initargs))
+                if key not in initialized:
+                    resolve(task.initializer)(*task.initargs)
+                    initialized.add(key)
+
+            result = resolve(task.func)(*task.args)
+    except Exception as e:
+        log.exception(f"{task.task_id} failed.")
+        broker.fail(task, worker, f"{e!r}\n{traceback.format_exc()}")
+        return False
+
+    broker.complete(task, worker, result)
+    return True
+
+
+def work(
+    broker: Broker,
+    idle_timeout: float | None = None,
+    stop: Event | None = None,
+) -> tuple[int, int]:
+    """Run tasks of broker until idle for idle_timeout seconds, or until stop.
+
+    Returns the number of tasks that succeeded and failed.
+    """
+    worker = worker_id()
+    set_spinner(False)
+
+    initialized: set[tuple[str, str]] = set()
+    num_succeeded = num_failed = 0
+    idle_since = time.monotonic()
+
+    while stop is None or not stop.is_set():
+        if (task := broker.claim(worker)) is None:
+            if (
+                idle_timeout is not None
+                and time.monotonic() - idle_since > idle_timeout
+            ):
+                break
+
+            time.sleep(broker.cfg.poll_sec)
+            continue
+
+        log.info(f"{worker} running {task.task_id} (attempt {task.attempt + 1}).")
+
+        if run_task(broker, task, worker, initialized):
+            num_succeeded += 1
+        else:
+            num_failed += 1
+
+        idle_since = time.monotonic()
+
+    return num_succeeded, num_failed
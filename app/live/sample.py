@@ -0,0 +1,350 @@
+from pathlib import Path
+from pydantic import BaseModel
+from common.fasta import read_fasta, write_fasta
+from common.file import get_file_base
+from preprocess.fastq_rs import FastqConfig, preprocess
+from cluster.otutab import SIZE_PAT
+from cluster.usearch import UsearchConfig, usearch_cluster, usearch_map
+from classification.sintax import run_sintax
+from classification.results import get_results
+from common.lineage import load_lineage
+from classification.report import write_plotly_js, write_report
+import pandas as pd
+import logging
+import shutil
+
+log = logging.getLogger(__name__)
+
+ALLOWED_FASTQ_ENDINGS = (".fastq.gz",)
+
+
+class LiveState(BaseModel):
+    """What a live sample has processed so far, kept in live/state.json."""
+
+    fastqs: list[Path] = []
+    rounds: int = 0
+    num_asvs: int = 0
+
+
+def read_label(header: str) -> str:
+    return header.split()[0]
+
+
+def mapped_reads(mapped_tsv: Path) -> pd.DataFrame:
+    return pd.read_csv(mapped_tsv, sep="\t", names=["read", "asv"], dtype=str).assign(
+        read=lambda df: df["read"].str.split().str[0]
+    )
+
+
+def read_counts(otutab_tsv: Path) -> dict[str, int]:
+    otutab_df = pd.read_csv(otutab_tsv, sep="\t")
+    return dict(zip(otutab_df["asv"], otutab_df["reads"]))
+
+
+def write_counts(counts: dict[str, int], otutab_tsv: Path) -> None:
+    pd.DataFrame({"asv": list(counts), "reads": list(counts.values())}).to_csv(
+        otutab_tsv, sep="\t", index=False
+    )
+
+
+def species_composition(result_dir: Path) -> pd.Series:
+    """Reads per species, from parsed.tsv and otutab.tsv in result_dir."""
+    parsed_df = pd.read_csv(result_dir / "parsed.tsv", sep="\t")
+    counts = read_counts(result_dir / "otutab.tsv")
+
+    species_df = parsed_df[parsed_df["level"] == "species"]
+    return (
+        species_df.assign(reads=species_df["asv"].map(counts).fillna(0))
+        .groupby("hit")["reads"]
+        .sum()
+    )
+
+
+def bray_curtis(previous: pd.Series, current: pd.Series) -> float:
+    """Dissimilarity of two compositions, 0 when identical and 1 when disjoint."""
+    previous, current = previous.align(current, fill_value=0)
+    total = previous.sum() + current.sum()
+
+    return float((previous - current).abs().sum() / total) if total else 0.0
+
+
+class LiveSample:
+    """Incremental analysis of a sample whose reads arrive in chunks.
+
+    New reads are mapped to the existing asvs. Reads that do not map are
+    clustered together with the unmapped reads of earlier rounds, and new
+    asvs (non-singleton centroids) are classified and added to the asv set.
+    Unmapped reads that still do not form an asv are kept for the next round.
+
+    A round writes its outputs to live/round_<n>/commit and only then moves
+    them into place, state.json last. A round that was interrupted while
+    moving them is completed when the sample is loaded again, any other
+    interrupted round is run again.
+    """
+
+    def __init__(
+        self,
+        sample_dir: Path,
+        database: Path,
+        sintax_threshold: float,
+        fastq_cfg: FastqConfig | None = None,
+        usearch_cfg: UsearchConfig | None = None,
+    ):
+        self.sample_dir = sample_dir
+        self.database = database
+        self.sintax_threshold = sintax_threshold
+        self.fastq_cfg = fastq_cfg or FastqConfig()
+        self.usearch_cfg = usearch_cfg or UsearchConfig()
+
+        self.live_dir = sample_dir / "live"
+        self.live_dir.mkdir(parents=True, exist_ok=True)
+
+        self.asv_fasta = sample_dir / "asv.fasta"
+        self.otutab_tsv = sample_dir / "otutab.tsv"
+        self.sintax_tsv = sample_dir / "sintax.tsv"
+        self.parsed_tsv = sample_dir / "parsed.tsv"
+        self.pending_fasta = self.live_dir / "pending.fasta"
+        self.history_tsv = self.live_dir / "history.tsv"
+        self.state_json = self.live_dir / "state.json"
+
+        for staged_state in self.live_dir.glob("round_*/commit/state.json"):
+            log.info(f"{sample_dir.name}: completing {staged_state.parent.parent}.")
+            self.commit(staged_state.parent)
+
+        self.state = (
+            LiveState.model_validate_json(self.state_json.read_text())
+            if self.state_json.is_file()
+            else LiveState()
+        )
+
+        if not self.otutab_tsv.is_file():
+            self.asv_fasta.touch()
+            self.sintax_tsv.touch()
+            self.pending_fasta.touch()
+            write_counts({}, self.otutab_tsv)
+
+    def outputs(self) -> dict[str, Path]:
+        """Where the outputs of a round go, in the order they are moved there."""
+        return {
+            "asv.fasta": self.asv_fasta,
+            "sintax.tsv": self.sintax_tsv,
+            "otutab.tsv": self.otutab_tsv,
+            "parsed.tsv": self.parsed_tsv,
+            "pending.fasta": self.pending_fasta,
+            "history.tsv": self.history_tsv,
+            "state.json": self.state_json,
+        }
+
+    def commit(self, staging_dir: Path) -> None:
+        """Move the outputs in staging_dir into place, state.json last."""
+        for name, path in self.outputs().items():
+            if (staged := staging_dir / name).is_file():
+                staged.replace(path)
+
+        staging_dir.rmdir()
+
+    def preprocess_chunks(self, fastqs: list[Path], reads_fasta: Path) -> None:
+        """Preprocess each new fastq chunk and concatenate the reads."""
+        with reads_fasta.open("wb") as f:
+            for fastq in fastqs:
+                chunk_dir = (
+                    self.live_dir
+                    / "chunks"
+                    / get_file_base(fastq, ALLOWED_FASTQ_ENDINGS)
+                )
+                chunk_dir.mkdir(parents=True, exist_ok=True)
+
+                with preprocess(fastq, chunk_dir, self.fastq_cfg).open("rb") as chunk:
+                    shutil.copyfileobj(chunk, f)
+
+    def map_reads(
+        self, reads_fasta: Path, asv_fasta: Path, outdir: Path, unmapped_fasta: Path
+    ) -> pd.Series:
+        """Reads per asv. Reads that do not map are appended to unmapped_fasta."""
+        outdir.mkdir(exist_ok=True)
+
+        mapped_df = mapped_reads(
+            usearch_map(reads_fasta, asv_fasta, outdir, self.usearch_cfg)
+        )
+        mapped = set(mapped_df["read"])
+
+        with unmapped_fasta.open("a") as f:
+            for header, seq in read_fasta(reads_fasta):
+                if read_label(header) not in mapped:
+                    write_fasta(f, header, seq)
+
+        return mapped_df["asv"].value_counts()
+
+    def add_asvs(
+        self, centroids: Path, new_asv_fasta: Path, asv_fasta: Path, num_asvs: int
+    ) -> int:
+        """Append non-singleton centroids as new asvs, numbered from num_asvs.
+
+        Returns how many were added.
+        """
+        num_new = 0
+
+        with new_asv_fasta.open("w") as f_new, asv_fasta.open("a") as f_all:
+            for header, seq in read_fasta(centroids):
+                if int(SIZE_PAT.search(header)["size"]) <= 1:
+                    break
+
+                asv = f"asv_{num_asvs + num_new}"
+                write_fasta(f_new, asv, seq)
+                write_fasta(f_all, asv, seq)
+                num_new += 1
+
+        return num_new
+
+    def update(self, fastqs: list[Path]) -> pd.DataFrame | None:
+        """Process new fastq chunks, then update otutab.tsv, parsed.tsv and plots.
+
+        Returns the aggregated abundances, or None while there are no asvs yet.
+        """
+        round_dir = self.live_dir / f"round_{self.state.rounds}"
+        round_dir.mkdir(exist_ok=True)
+
+        # Left over from an interrupted attempt at this round.
+        staging_dir = round_dir / "commit"
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir)
+        staging_dir.mkdir()
+        staged = {name: staging_dir / name for name in self.outputs()}
+
+        previous = (
+            species_composition(self.sample_dir) if self.parsed_tsv.is_file() else None
+        )
+
+        reads_fasta = round_dir / "reads.fasta"
+        self.preprocess_chunks(fastqs, reads_fasta)
+
+        counts = read_counts(self.otutab_tsv)
+        state = self.state.model_copy(deep=True)
+
+        # Unmapped reads of earlier rounds, followed by the unmapped new reads.
+        candidates_fasta = round_dir / "candidates.fasta"
+        shutil.copyfile(self.pending_fasta, candidates_fasta)
+
+        if state.num_asvs:
+            new_counts = self.map_reads(
+                reads_fasta, self.asv_fasta, round_dir / "existing", candidates_fasta
+            )
+            for asv, num_reads in new_counts.items():
+                counts[asv] = counts.get(asv, 0) + int(num_reads)
+        else:
+            with reads_fasta.open("rb") as f_in, candidates_fasta.open("ab") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+
+        # Look for new asvs among the reads that did not map.
+        shutil.copyfile(self.asv_fasta, staged["asv.fasta"])
+        staged["pending.fasta"].touch()
+        new_asv_fasta = round_dir / "asv.fasta"
+        num_new = 0
+
+        if candidates_fasta.stat().st_size:
+            centroids = usearch_cluster(candidates_fasta, round_dir, self.usearch_cfg)
+            num_new = self.add_asvs(
+                centroids, new_asv_fasta, staged["asv.fasta"], state.num_asvs
+            )
+            state.num_asvs += num_new
+
+        shutil.copyfile(self.sintax_tsv, staged["sintax.tsv"])
+
+        if num_new:
+            new_counts = self.map_reads(
+                candidates_fasta,
+                new_asv_fasta,
+                round_dir / "new",
+                staged["pending.fasta"],
+            )
+            for asv, num_reads in new_counts.items():
+                counts[asv] = counts.get(asv, 0) + int(num_reads)
+
+            # Only the new asvs are classified.
+            new_sintax_tsv = run_sintax(new_asv_fasta, self.database, round_dir)
+            sintax_tsv = staged["sintax.tsv"]
+            with new_sintax_tsv.open("rb") as f_in, sintax_tsv.open("ab") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        else:
+            shutil.copyfile(candidates_fasta, staged["pending.fasta"])
+
+        write_counts(
+            {f"asv_{i}": counts.get(f"asv_{i}", 0) for i in range(state.num_asvs)},
+            staged["otutab.tsv"],
+        )
+
+        agg_df = None
+        change = None
+
+        if state.num_asvs:
+            agg_df = get_results(
+                staged["sintax.tsv"],
+                staged["otutab.tsv"],
+                self.sintax_threshold,
+                staging_dir,
+                load_lineage(self.database),
+            )
+            if previous is not None:
+                change = bray_curtis(previous, species_composition(staging_dir))
+
+        state.fastqs += [fastq.resolve() for fastq in fastqs]
+        state.rounds += 1
+
+        if self.history_tsv.is_file():
+            shutil.copyfile(self.history_tsv, staged["history.tsv"])
+        self.record_round(state, staging_dir, len(fastqs), counts, num_new, change)
+
+        # Written last, a round is only complete once its state is staged.
+        staged["state.json"].write_text(state.model_dump_json(indent=2))
+        self.commit(staging_dir)
+        self.state = state
+
+        if state.num_asvs:
+            write_report(self.sample_dir, write_plotly_js(self.sample_dir.parent))
+
+        log.info(
+            f"{self.sample_dir.name}: round {state.rounds}, "
+            f"{state.num_asvs} asvs ({num_new} new), "
+            f"composition change {change}"
+        )
+
+        return agg_df
+
+    def record_round(
+        self,
+        state: LiveState,
+        staging_dir: Path,
+        num_fastqs: int,
+        counts: dict[str, int],
+        num_new: int,
+        change: float | None,
+    ) -> None:
+        """Append the round to history.tsv in staging_dir.
+
+        composition_change is the Bray-Curtis dissimilarity of the species
+        abundances before and after the round. Once it stays close to 0,
+        more sequencing does not change the result.
+        """
+        history_tsv = staging_dir / "history.tsv"
+        num_pending = sum(1 for _ in read_fasta(staging_dir / "pending.fasta"))
+        row = pd.DataFrame(
+            [
+                {
+                    "round": state.rounds,
+                    "fastqs": len(state.fastqs),
+                    "new_fastqs": num_fastqs,
+                    "assigned_reads": sum(counts.values()),
+                    "pending_reads": num_pending,
+                    "asvs": state.num_asvs,
+                    "new_asvs": num_new,
+                    "composition_change": change,
+                }
+            ]
+        )
+        row.to_csv(
+            history_tsv,
+            sep="\t",
+            index=False,
+            mode="a",
+            header=not history_tsv.is_file(),
+        )
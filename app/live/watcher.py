@@ -0,0 +1,53 @@
+from pathlib import Path
+from typing import Iterable, Iterator
+import time
+
+
+class DirectoryWatcher:
+    """Polls a directory tree for new files that are no longer being written.
+
+    A file is considered complete once it has not been modified for settle_sec.
+    Each file is returned by poll() only once.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        pattern: str = "*.fastq.gz",
+        settle_sec: float = 30.0,
+        seen: Iterable[Path] = (),
+    ):
+        self.directory = directory
+        self.pattern = pattern
+        self.settle_sec = settle_sec
+        self.seen = {f.resolve() for f in seen}
+
+    def poll(self) -> list[Path]:
+        now = time.time()
+        ready = []
+
+        for f in sorted(self.directory.rglob(self.pattern)):
+            if f.resolve() in self.seen:
+                continue
+
+            if now - f.stat().st_mtime >= self.settle_sec:
+                ready.append(f)
+                self.seen.add(f.resolve())
+
+        return ready
+
+
+def watch(
+    watcher: DirectoryWatcher, interval: float, idle_timeout: float | None = None
+) -> Iterator[list[Path]]:
+    """Yield batches of new files until no new file appeared for idle_timeout."""
+    idle_since = time.monotonic()
+
+    while True:
+        if files := watcher.poll():
+            idle_since = time.monotonic()
+            yield files
+        elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+            return
+        else:
+            time.sleep(interval)
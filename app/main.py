@@ -1,69 +1,370 @@
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, TypeVar
 from common.file import _file, get_file_base
-from preprocess.fastq_rs import preprocess
+from common.log import configure_logging
+from common.scheduler import SchedulerConfig, run_parallel
+from common.cache import StageCache, configure_cache
+from common.memo import ClassificationMemo, configure_memo
+from common.metrics import aggregate_metrics, recording, write_metrics
+from common.store import write_run_store
+from distributed.broker import Broker, FileBroker, QueueConfig
+from distributed.coordinator import run_distributed
+from preprocess.fastq_rs import preprocess, FastqConfig
 from cluster.main import cluster
-from classification.main import classify
+from cluster.usearch import UsearchConfig
+from cluster.depth import DepthConfig
+from classification.main import classify, classify_batch
+from classification.config import SintaxConfig
+from classification.report import write_reports
 import sys
 import pandas as pd
 from blast.main import run_blast
+from blast.config import BlastnConfig
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 sys.path.append(str(PROJECT_ROOT))
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 ALLOWED_FASTQ_ENDINGS = (".fastq.gz",)
 ALLOWED_FASTA_ENDINGS = (".fasta",)
 
 
+def configure_process(
+    cache_dir: Path | None,
+    force: bool,
+    memo_db: Path | None,
+    memo_max_entries: int,
+) -> None:
+    """Set up the stage cache and classification memo for this process."""
+    configure_cache(cache_dir, force)
+    configure_memo(memo_db, memo_max_entries)
+
+
+def stage_configs(
+    threads: int | None,
+    sort_chunk_size: int | None = None,
+    read_stats: bool = False,
+) -> tuple[FastqConfig, UsearchConfig, BlastnConfig]:
+    """Stage settings for a sample that may use at most `threads` cores."""
+    if threads is None:
+        return (
+            FastqConfig(chunk_size=sort_chunk_size, read_stats=read_stats),
+            UsearchConfig(),
+            BlastnConfig(),
+        )
+
+    # fastq_rs runs filter, sort and fq2-fa concurrently in one pipe.
+    return (
+        FastqConfig(
+            threads=max(1, threads // 3),
+            chunk_size=sort_chunk_size,
+            read_stats=read_stats,
+        ),
+        UsearchConfig(threads=threads),
+        BlastnConfig(threads=threads),
+    )
+
+
+def blast_sample(
+    asv_fasta: Path, database: Path, sample_dir: Path, blastn_cfg: BlastnConfig
+) -> Path:
+    blast_hits_tsv = sample_dir / "blast_hits.tsv"
+
+    blast_df = run_blast(asv_fasta, database, sample_dir, blastn_cfg)
+    blast_df.to_csv(blast_hits_tsv, sep="\t")
+
+    return blast_hits_tsv
+
+
+def cluster_sample(
+    fastq: Path,
+    outdir: Path,
+    threads: int | None = None,
+    sort_chunk_size: int | None = None,
+    read_stats: bool = False,
+    depth_cfg: DepthConfig | None = None,
+) -> tuple[Path, Path, Path]:
+    """Preprocess the reads of a sample and cluster them into asvs."""
+    sample_name = get_file_base(fastq, ALLOWED_FASTQ_ENDINGS)
+    sample_dir = outdir / sample_name
+    sample_dir.mkdir(exist_ok=True)
+
+    fastq_cfg, usearch_cfg, _ = stage_configs(threads, sort_chunk_size, read_stats)
+
+    # Preprocess and convert fastq to fasta.
+    fasta = preprocess(fastq, sample_dir, fastq_cfg)
+
+    # Cluster reads into asvs.
+    asv_fasta, otutab_tsv = cluster(fasta, sample_dir, usearch_cfg, depth_cfg)
+
+    return asv_fasta, otutab_tsv, sample_dir
+
+
+def prepare_sample(
+    fastq: Path,
+    database: Path,
+    blast: bool,
+    outdir: Path,
+    threads: int | None = None,
+    sort_chunk_size: int | None = None,
+    read_stats: bool = False,
+    depth_cfg: DepthConfig | None = None,
+) -> tuple[Path, Path, Path]:
+    """All stages up to (but not including) SINTAX classification."""
+    _, _, blastn_cfg = stage_configs(threads, sort_chunk_size, read_stats)
+
+    with recording() as records:
+        asv_fasta, otutab_tsv, sample_dir = cluster_sample(
+            fastq, outdir, threads, sort_chunk_size, read_stats, depth_cfg
+        )
+
+        # BLAST classification
+        match blast:
+            case True:
+                log.info("Running BLAST classification.")
+                blast_sample(asv_fasta, database, sample_dir, blastn_cfg)
+            case False:
+                log.info("Skipping BLAST classification.")
+
+    write_metrics(records, sample_dir)
+
+    return asv_fasta, otutab_tsv, sample_dir
+
+
 def run_sample(
     fastq: Path,
     database: Path,
     sintax_threshold: float,
     blast: bool,
     outdir: Path,
+    threads: int | None = None,
+    sort_chunk_size: int | None = None,
+    read_stats: bool = False,
+    depth_cfg: DepthConfig | None = None,
+    sintax_cfg: SintaxConfig | None = None,
 ) -> pd.DataFrame:
+    """Process one sample from reads to classified asvs.
+
+    BLAST and SINTAX only depend on the asvs, so BLAST runs in a thread of
+    its own alongside SINTAX and is waited for once SINTAX is done.
+    """
     sample_name = get_file_base(fastq, ALLOWED_FASTQ_ENDINGS)
-    sample_dir = outdir / sample_name
-    sample_dir.mkdir(exist_ok=True)
+    _, _, blastn_cfg = stage_configs(threads, sort_chunk_size, read_stats)
 
-    # Preprocess and convert fastq to fasta.
-    fasta = preprocess(fastq, sample_dir)
+    with recording() as records, ThreadPoolExecutor(max_workers=1) as executor:
+        asv_fasta, otutab_tsv, sample_dir = cluster_sample(
+            fastq, outdir, threads, sort_chunk_size, read_stats, depth_cfg
+        )
 
-    # Cluster reads into asvs.
-    asv_fasta, otutab_tsv = cluster(fasta, sample_dir)
+        # BLAST classification
+        match blast:
+            case True:
+                log.info("Running BLAST classification.")
+                blast_future = executor.submit(
+                    blast_sample, asv_fasta, database, sample_dir, blastn_cfg
+                )
+            case False:
+                log.info("Skipping BLAST classification.")
+                blast_future = None
 
-    # BLAST classification
-    match blast:
-        case True:
-            log.info("Running BLAST classification.")
-            blast_df = run_blast(asv_fasta, database, sample_dir)
-            blast_df.to_csv(sample_dir / "blast_hits.tsv", sep="\t")
-        case False:
-            log.info("Skipping BLAST classification.")
+        # Classify asvs.
+        agg_df = classify(
+            asv_fasta, otutab_tsv, database, sintax_threshold, sample_dir, sintax_cfg
+        )
+        agg_df["sample_name"] = sample_name
 
-    # Classify asvs.
-    agg_df = classify(asv_fasta, otutab_tsv, database, sintax_threshold, sample_dir)
-    agg_df["sample_name"] = sample_name
+        if blast_future is not None:
+            blast_future.result()
+
+    write_metrics(records, sample_dir)
 
     return agg_df
 
 
+def classify_samples(
+    samples: dict[str, tuple[Path, Path, Path]],
+    database: Path,
+    sintax_threshold: float,
+    outdir: Path,
+    sintax_cfg: SintaxConfig | None = None,
+) -> dict[str, pd.DataFrame]:
+    """classify_batch, with its metrics written to outdir/batch."""
+    with recording() as records:
+        results = classify_batch(
+            samples, database, sintax_threshold, outdir, sintax_cfg
+        )
+
+    write_metrics(records, outdir / "batch")
+
+    return results
+
+
+def run_tasks(
+    func: Callable[..., T],
+    tasks: dict[str, tuple[Any, ...]],
+    jobs: int,
+    process_args: tuple[Any, ...],
+    broker: Broker | None = None,
+    local_workers: int = 0,
+) -> tuple[dict[str, T], dict[str, BaseException]]:
+    """Run tasks in local processes, or with a broker, on distributed workers."""
+    match broker:
+        case None:
+            return run_parallel(
+                func,
+                tasks,
+                jobs,
+                initializer=configure_process,
+                initargs=process_args,
+            )
+        case _:
+            return run_distributed(
+                func,
+                tasks,
+                broker,
+                initializer=configure_process,
+                initargs=process_args,
+                local_workers=local_workers,
+            )
+
+
 def main(
     fastqs: list[Path],
     database: Path,
     sintax_threshold: float,
     blast: bool,
     outdir: Path,
-) -> None:
-    for fastq in fastqs:
-        run_sample(fastq, database, sintax_threshold, blast, outdir)
+    scheduler_cfg: SchedulerConfig | None = None,
+    cache: StageCache | None = None,
+    batch_classify: bool = False,
+    memo: ClassificationMemo | None = None,
+    sort_chunk_size: int | None = None,
+    read_stats: bool = False,
+    depth_cfg: DepthConfig | None = None,
+    report: bool = False,
+    sintax_cfg: SintaxConfig | None = None,
+    broker: Broker | None = None,
+    local_workers: int = 0,
+) -> dict[str, BaseException]:
+    """Process all samples, on this node or with a broker on distributed workers.
+
+    With a broker, every sample (and with batch_classify, the classification
+    of all samples) is a task that any worker may run.
+    """
+    scheduler_cfg = scheduler_cfg or SchedulerConfig()
+
+    process_args = (
+        *((cache.cache_dir, cache.force) if cache else (None, False)),
+        *((memo.db, memo.max_entries) if memo else (None, 0)),
+    )
+    configure_process(*process_args)
+    threads = scheduler_cfg.threads_per_job()
+
+    sample_names = [get_file_base(fastq, ALLOWED_FASTQ_ENDINGS) for fastq in fastqs]
+    metrics_dirs = {sample_name: outdir / sample_name for sample_name in sample_names}
+
+    results: dict[str, pd.DataFrame] = {}
+
+    match batch_classify:
+        case True:
+            # Classify the asvs of all samples in one go, once they are clustered.
+            tasks = {
+                sample_name: (
+                    fastq,
+                    database,
+                    blast,
+                    outdir,
+                    threads,
+                    sort_chunk_size,
+                    read_stats,
+                    depth_cfg,
+                )
+                for sample_name, fastq in zip(sample_names, fastqs)
+            }
+            samples, failed = run_tasks(
+                prepare_sample,
+                tasks,
+                scheduler_cfg.jobs,
+                process_args,
+                broker,
+                local_workers,
+            )
+
+            if samples:
+                batch, batch_failed = run_tasks(
+                    classify_samples,
+                    {
+                        "batch": (
+                            samples,
+                            database,
+                            sintax_threshold,
+                            outdir,
+                            sintax_cfg,
+                        )
+                    },
+                    1,
+                    process_args,
+                    broker,
+                    local_workers,
+                )
+                results = batch.get("batch", {})
+                failed.update(batch_failed)
+
+                metrics_dirs["batch"] = outdir / "batch"
+
+                for sample_name, agg_df in results.items():
+                    agg_df["sample_name"] = sample_name
+        case False:
+            tasks = {
+                sample_name: (
+                    fastq,
+                    database,
+                    sintax_threshold,
+                    blast,
+                    outdir,
+                    threads,
+                    sort_chunk_size,
+                    read_stats,
+                    depth_cfg,
+                    sintax_cfg,
+                )
+                for sample_name, fastq in zip(sample_names, fastqs)
+            }
+            results, failed = run_tasks(
+                run_sample,
+                tasks,
+                scheduler_cfg.jobs,
+                process_args,
+                broker,
+                local_workers,
+            )
+
+    for sample_name, e in failed.items():
+        log.error(f"Sample {sample_name} failed: {e!r}")
+
+    aggregate_metrics(metrics_dirs, outdir)
+
+    if report:
+        write_reports([outdir / sample_name for sample_name in results], outdir)
+
+    # All samples' results in one place, for the comparison dashboard.
+    write_run_store(
+        results,
+        {sample_name: outdir / sample_name for sample_name in results},
+        outdir,
+    )
+
+    return failed
 
 
 if __name__ == "__main__":
-    # logging.basicConfig(level=logging.DEBUG, handlers=[logging.StreamHandler()])
+    configure_logging()
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -79,6 +380,161 @@ if __name__ == "__main__":
     parser.add_argument(
         "--blast", action="store_true", help="Run additional classifiction with BLAST"
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of samples to process concurrently.",
+    )
+    parser.add_argument(
+        "-t",
+        "--max_threads",
+        type=int,
+        required=False,
+        default=None,
+        help="Total number of threads shared by all concurrent samples.",
+    )
+    parser.add_argument(
+        "--batch_classify",
+        action="store_true",
+        help="Classify the (deduplicated) asvs of all samples in one SINTAX run.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        required=False,
+        default=None,
+        help="Stage cache directory [<outdir>/.cache].",
+    )
+    parser.add_argument(
+        "--no_cache", action="store_true", help="Do not use the stage cache."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-run all stages, replacing their cache entries.",
+    )
+    parser.add_argument(
+        "--prune_cache",
+        type=float,
+        required=False,
+        default=None,
+        metavar="DAYS",
+        help="Remove cache entries not used within DAYS days before running.",
+    )
+    parser.add_argument(
+        "--memo",
+        required=False,
+        default=None,
+        help="SQLite classification memo, shared between runs, so that "
+        "previously seen asv sequences are not classified again.",
+    )
+    parser.add_argument(
+        "--memo_max_entries",
+        type=int,
+        required=False,
+        default=1_000_000,
+        help="Evict the least recently used memo entries beyond this size.",
+    )
+    parser.add_argument(
+        "--sort_chunk_size",
+        type=int,
+        required=False,
+        default=None,
+        help="Sort the filtered reads in chunks of this many reads, to bound memory "
+        "on very large runs. Reads are then only sorted within each chunk.",
+    )
+    parser.add_argument(
+        "--read_stats",
+        action="store_true",
+        help="Write statistics of the input and filtered reads to read_stats.json. "
+        "The reads then pass through Python between fastq_rs filter and sort.",
+    )
+    parser.add_argument(
+        "--max_reads",
+        type=int,
+        required=False,
+        default=None,
+        help="Cluster a random subsample of at most this many reads. All reads are "
+        "then mapped to the asvs to count them.",
+    )
+    parser.add_argument(
+        "--saturation",
+        type=float,
+        required=False,
+        default=None,
+        help="Cluster increasing subsamples (doubling from --start_reads) until less "
+        "than this fraction of the asvs are new.",
+    )
+    parser.add_argument(
+        "--start_reads",
+        type=int,
+        required=False,
+        default=DepthConfig().start_reads,
+        help="Size of the first subsample with --saturation.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        required=False,
+        default=DepthConfig().seed,
+        help="Seed for read subsampling.",
+    )
+    parser.add_argument(
+        "--sintax_engine",
+        choices=["sintax_rs", "numpy"],
+        default=SintaxConfig().engine,
+        help="Classify with sintax_rs, or in-process with a k-mer index that is "
+        "built next to the database on first use.",
+    )
+    parser.add_argument(
+        "--sintax_daemon",
+        required=False,
+        default=None,
+        help="Socket of a running serve.py, which classifies with the database "
+        "index already loaded. Implies --sintax_engine numpy, which runs "
+        "in-process if no daemon serves the database.",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Write html plots per sample after the run, see also report.py.",
+    )
+    parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="Queue the samples for worker.py processes, on this or other nodes "
+        "that share the file system, instead of processing them here.",
+    )
+    parser.add_argument(
+        "--queue_dir",
+        required=False,
+        default=None,
+        help="Queue directory of --distributed [<outdir>/.queue].",
+    )
+    parser.add_argument(
+        "--local_workers",
+        type=int,
+        required=False,
+        default=0,
+        help="With --distributed, also run this many workers on this node.",
+    )
+    parser.add_argument(
+        "--max_attempts",
+        type=int,
+        required=False,
+        default=QueueConfig().max_attempts,
+        help="With --distributed, attempts of a sample before it is failed.",
+    )
+    parser.add_argument(
+        "--heartbeat_timeout",
+        type=float,
+        required=False,
+        default=QueueConfig().heartbeat_timeout,
+        help="With --distributed, seconds without a heartbeat before a sample "
+        "is given to another worker.",
+    )
     args = parser.parse_args()
 
     fastq = [_file(fastq, ALLOWED_FASTQ_ENDINGS) for fastq in args.fastq]
@@ -89,4 +545,64 @@ if __name__ == "__main__":
     outdir = Path(args.outdir)
     outdir.mkdir(exist_ok=True)
 
-    main(fastq, database, sintax_threshold, args.blast, outdir)
+    broker = None
+    if args.distributed:
+        # Workers may run on other nodes, or in other directories.
+        fastq = [f.resolve() for f in fastq]
+        database, outdir = database.resolve(), outdir.resolve()
+
+        queue_dir = Path(args.queue_dir) if args.queue_dir else outdir / ".queue"
+        queue_cfg = QueueConfig(
+            max_attempts=args.max_attempts, heartbeat_timeout=args.heartbeat_timeout
+        )
+        broker = FileBroker(queue_dir.resolve(), queue_cfg)
+
+        log.info(f"Run workers with: python worker.py --queue {queue_dir.resolve()}")
+
+    scheduler_cfg = SchedulerConfig(jobs=args.jobs, max_threads=args.max_threads)
+
+    cache = None
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else outdir / ".cache"
+        cache = StageCache(cache_dir.absolute(), force=args.force)
+
+        if args.prune_cache is not None:
+            num_removed = cache.prune(args.prune_cache)
+            log.info(f"Removed {num_removed} cache entries.")
+
+    memo = None
+    if args.memo:
+        memo = ClassificationMemo(Path(args.memo).absolute(), args.memo_max_entries)
+
+    failed = main(
+        fastq,
+        database,
+        sintax_threshold,
+        args.blast,
+        outdir,
+        scheduler_cfg,
+        cache,
+        args.batch_classify,
+        memo,
+        args.sort_chunk_size,
+        args.read_stats,
+        DepthConfig(
+            max_reads=args.max_reads,
+            saturation=args.saturation,
+            start_reads=args.start_reads,
+            seed=args.seed,
+        ),
+        args.report,
+        SintaxConfig(
+            engine="numpy" if args.sintax_daemon else args.sintax_engine,
+            socket=Path(args.sintax_daemon) if args.sintax_daemon else None,
+        ),
+        broker,
+        args.local_workers,
+    )
+
+    if memo:
+        log.info(f"Classification memo: {memo.stats()}")
+
+    if failed:
+        sys.exit(1)
@@ -1,21 +1,36 @@
 from sh import fastq_rs
 from common.decorator import with_yaspin
+from common.cache import cached
+from preprocess.stats import (
+    READ_STATS_JSON,
+    ReadStats,
+    fastq_blocks,
+    fastq_text,
+    split_blocks,
+)
+from itertools import groupby
+from operator import itemgetter
 from pydantic import BaseModel
 from pathlib import Path
+import shutil
+
+# Size of the chunks read from the input fastq and the filter output.
+PIPE_BUFSIZE = 1 << 20
 
 
 class FastqConfig(BaseModel):
     min_len: int = 1200
     max_len: int = 1700
-    max_error: int = 0.05
+    max_error: float = 0.05
     threads: int = 2
+    # Sort at most this many reads at a time, which bounds the memory of fastq_rs sort.
+    # Reads are then only sorted within each chunk.
+    chunk_size: int | None = None
+    # Collect ReadStats of the input and filtered reads into READ_STATS_JSON.
+    read_stats: bool = False
 
 
-@with_yaspin("Running preprocessing...")
-def preprocess(fastq: Path, outdir: Path):
-    cfg = FastqConfig()
-    fasta_out = outdir / "preprocess.fasta"
-
+def fastq_rs_commands(cfg: FastqConfig):
     filter = fastq_rs.bake(
         "filter",
         "--min-len",
@@ -27,15 +42,78 @@ def preprocess(fastq: Path, outdir: Path):
         "-t",
         cfg.threads,
         "-f",
-        _piped=True,
     )
     sort = fastq_rs.bake(
         "sort", "--by", "minimizer", "--reverse", "-t", cfg.threads, _piped=True
     )
     to_fa = fastq_rs.bake("fq2-fa", "-t", cfg.threads)
 
+    return filter, sort, to_fa
+
+
+@cached("preprocess.fasta")
+def filter_and_sort(fastq: Path, outdir: Path, cfg: FastqConfig) -> Path:
+    fasta_out = outdir / "preprocess.fasta"
+    filter, sort, to_fa = fastq_rs_commands(cfg)
+
     # Filter, sort and convert to fasta.
-    to_fa("-o", fasta_out, _in=sort(_in=filter(fastq)))
+    to_fa("-o", fasta_out, _in=sort(_in=filter(fastq, _piped=True)))
 
     assert fasta_out.is_file()
     return fasta_out
+
+
+@cached("preprocess.fasta", READ_STATS_JSON)
+def filter_and_sort_observed(fastq: Path, outdir: Path, cfg: FastqConfig) -> Path:
+    """filter_and_sort, passing the reads through Python on the way.
+
+    The fastq is decompressed here instead of by fastq_rs filter, which reads it
+    from stdin, so that the input reads are counted in the same pass. The
+    filtered reads go on to sort through ReadStats, and in chunks of
+    cfg.chunk_size reads if set.
+    """
+    fasta_out = outdir / "preprocess.fasta"
+    filter, sort, to_fa = fastq_rs_commands(cfg)
+
+    stats = ReadStats()
+    filtered = filter(
+        "/dev/stdin",
+        _in=stats.count_input(fastq, PIPE_BUFSIZE),
+        _iter=True,
+        _tty_out=False,
+        _out_bufsize=PIPE_BUFSIZE,
+    )
+    blocks = stats.observe(fastq_blocks(filtered))
+
+    match cfg.chunk_size:
+        case None:
+            to_fa("-o", fasta_out, _in=sort(_in=fastq_text(blocks)))
+        case chunk_size:
+            # Sort and convert each chunk separately, then concatenate.
+            with fasta_out.open("wb") as f:
+                for i, chunk in groupby(
+                    split_blocks(blocks, chunk_size), key=itemgetter(0)
+                ):
+                    chunk_fasta = outdir / f"preprocess.{i}.fasta"
+                    chunk_blocks = (lines for _, lines in chunk)
+                    to_fa("-o", chunk_fasta, _in=sort(_in=fastq_text(chunk_blocks)))
+
+                    with chunk_fasta.open("rb") as chunk_f:
+                        shutil.copyfileobj(chunk_f, f)
+                    chunk_fasta.unlink()
+
+    stats.write(outdir)
+
+    assert fasta_out.is_file()
+    return fasta_out
+
+
+@with_yaspin("Running preprocessing...")
+def preprocess(fastq: Path, outdir: Path, cfg: FastqConfig | None = None):
+    cfg = cfg or FastqConfig()
+
+    # Chunked sorting splits the reads in Python anyway, so it collects the stats too.
+    if cfg.read_stats or cfg.chunk_size is not None:
+        return filter_and_sort_observed(fastq, outdir, cfg)
+
+    return filter_and_sort(fastq, outdir, cfg)
@@ -0,0 +1,142 @@
+from pathlib import Path
+from typing import Iterable, Iterator
+from pydantic import BaseModel
+import numpy as np
+import gzip
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+READ_STATS_JSON = "read_stats.json"
+
+LENGTH_BIN = 50
+
+# Log progress every this many filtered reads.
+PROGRESS_INTERVAL = 1_000_000
+
+# Error probability per phred+33 quality character.
+ERROR_PROBS = 10 ** (-np.arange(256, dtype=np.float64) / 10)
+
+
+class ReadStats(BaseModel):
+    """Statistics of the reads that pass filtering, out of input_reads.
+
+    length_hist is keyed by read length, in bins of LENGTH_BIN.
+    error_pct_hist is keyed by the mean error rate of a read, in whole percent.
+    """
+
+    input_reads: int = 0
+    reads: int = 0
+    bases: int = 0
+    length_hist: dict[int, int] = {}
+    error_pct_hist: dict[int, int] = {}
+
+    def add(self, lines: list[str]) -> None:
+        """Add a block of complete fastq records."""
+        seqs, quals = lines[1::4], lines[3::4]
+        num_reads = len(seqs)
+
+        if num_reads == 0:
+            return
+
+        lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=num_reads)
+        phred = np.frombuffer("".join(quals).encode("ascii"), dtype=np.uint8) - 33
+
+        # Sum the error probabilities of each (non-empty) read.
+        nonempty = lengths[lengths > 0]
+        starts = np.cumsum(nonempty) - nonempty
+        mean_errors = (
+            np.add.reduceat(ERROR_PROBS.take(phred), starts) / nonempty
+            if len(nonempty)
+            else nonempty
+        )
+
+        self.reads += num_reads
+        self.bases += int(lengths.sum())
+        _update_hist(self.length_hist, lengths // LENGTH_BIN * LENGTH_BIN)
+        _update_hist(self.error_pct_hist, (mean_errors * 100).astype(np.int64))
+
+    def count_input(self, fastq: Path, bufsize: int) -> Iterator[bytes]:
+        """Decompressed chunks of the (gzipped) fastq, counting its reads."""
+        num_lines = 0
+
+        with (gzip.open if fastq.suffix == ".gz" else open)(fastq, "rb") as f:
+            while chunk := f.read(bufsize):
+                num_lines += chunk.count(b"\n")
+                yield chunk
+
+        # The last record may lack a trailing newline.
+        self.input_reads = -(-num_lines // 4)
+
+    def observe(self, blocks: Iterable[list[str]]) -> Iterator[list[str]]:
+        """Pass blocks of fastq records through, adding them on the way."""
+        start = time.perf_counter()
+        next_report = PROGRESS_INTERVAL
+
+        for lines in blocks:
+            self.add(lines)
+
+            if self.reads >= next_report:
+                rate = self.reads / (time.perf_counter() - start)
+                log.info(f"{self.reads:,} reads passed filtering ({rate:,.0f} reads/s)")
+                next_report += PROGRESS_INTERVAL
+
+            yield lines
+
+    def write(self, outdir: Path) -> Path:
+        stats_json = outdir / READ_STATS_JSON
+        stats_json.write_text(self.model_dump_json(indent=2))
+
+        return stats_json
+
+
+def _update_hist(hist: dict[int, int], values: np.ndarray) -> None:
+    for value, count in zip(*np.unique(values, return_counts=True)):
+        hist[int(value)] = hist.get(int(value), 0) + int(count)
+
+
+def fastq_blocks(chunks: Iterable[str]) -> Iterator[list[str]]:
+    """Lines of complete fastq records, from text split at arbitrary points."""
+    pending = ""
+
+    for chunk in chunks:
+        *lines, pending = (pending + chunk).split("\n")
+        complete = len(lines) - len(lines) % 4
+
+        if complete < len(lines):
+            pending = "\n".join([*lines[complete:], pending])
+
+        if complete:
+            yield lines[:complete]
+
+    # The last record may lack a trailing newline.
+    if pending:
+        lines = pending.split("\n")
+        assert len(lines) % 4 == 0, "Truncated fastq record."
+        yield lines
+
+
+def split_blocks(
+    blocks: Iterable[list[str]], chunk_size: int
+) -> Iterator[tuple[int, list[str]]]:
+    """Tag blocks with the index of the chunk of chunk_size reads they belong to.
+
+    Blocks that cross a chunk boundary are split.
+    """
+    num_reads = 0
+
+    for lines in blocks:
+        while lines:
+            chunk_index, offset = divmod(num_reads, chunk_size)
+            num_block_reads = min(len(lines) // 4, chunk_size - offset)
+
+            yield chunk_index, lines[: 4 * num_block_reads]
+
+            lines = lines[4 * num_block_reads :]
+            num_reads += num_block_reads
+
+
+def fastq_text(blocks: Iterable[list[str]]) -> Iterator[str]:
+    for lines in blocks:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,198 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypeVar
+from pydantic import BaseModel
+import hashlib
+import logging
+import pandas as pd
+from common.decorator import with_yaspin
+from common.fasta import read_fasta, write_fasta
+from common.lineage import RANKS, short_header, write_lineage, write_manifest
+from .primers import trim
+from .taxonomy import Lineages, lowest_common_lineage, read_taxonomy
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Chunks submitted ahead of the one being written, per worker.
+CHUNKS_PER_WORKER = 2
+
+
+class BuildConfig(BaseModel):
+    """Settings for building a database from local files."""
+
+    threads: int = 8
+    # Records per chunk handed to a worker.
+    chunk_size: int = 10_000
+    # Only keep the part between the primers of this region (see REGIONS).
+    region: str | None = None
+    # Collapse identical sequences into one record.
+    dereplicate: bool = True
+
+
+def chunked(items: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    it = iter(items)
+
+    while chunk := list(islice(it, chunk_size)):
+        yield chunk
+
+
+def imap_ordered(
+    executor: Executor | None,
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_pending: int,
+) -> Iterator[R]:
+    """func over items in order, with at most max_pending items in flight."""
+    if executor is None:
+        yield from map(func, items)
+        return
+
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_chunk(
+    records: list[tuple[str, str]], region: str | None = None
+) -> list[tuple[str, str | None, bytes | None]]:
+    """(header, sequence, digest) of each record, the sequence trimmed to region.
+
+    The sequence and digest are None for records where a primer is missing.
+    """
+    processed = []
+
+    for header, seq in records:
+        seq = seq.upper().replace("U", "T")
+
+        if region is not None and (seq := trim(seq, region)) is None:
+            processed.append((header, None, None))
+            continue
+
+        digest = hashlib.blake2b(seq.encode(), digest_size=16).digest()
+        processed.append((header, seq, digest))
+
+    return processed
+
+
+def _process_chunk(args: tuple[list[tuple[str, str]], str | None]):
+    return process_chunk(*args)
+
+
+def get_lineage_table(lineages: Lineages, tax_lineages: list[int]) -> pd.DataFrame:
+    """One row per tax_id (i.e. record), ranks are categorical."""
+    lineage_df = pd.DataFrame({"tax_id": range(len(tax_lineages))})
+
+    for i, rank in enumerate(RANKS):
+        codes, names = pd.factorize(pd.Series([lin[i] for lin in lineages.lineages]))
+        lineage_df[rank] = pd.Categorical.from_codes(codes[tax_lineages], names)
+
+    return lineage_df
+
+
+@with_yaspin("--- Building database...")
+def build_db(
+    outdir: Path,
+    fasta: Path,
+    taxonomy: Path | None = None,
+    cfg: BuildConfig | None = None,
+) -> Path:
+    """Write db.fasta with its lineage table and manifest from local files.
+
+    Lineages are read from taxonomy (see read_taxonomy) or, without it, from
+    the fasta headers (>id lineage). Records are normalized, trimmed and
+    hashed in parallel chunks and written as they come in. Every written
+    record gets its own tax_id. Identical sequences are written once, and
+    if their lineages differ, the lowest common lineage is used.
+    """
+    cfg = cfg or BuildConfig()
+    db_fasta = outdir / "db.fasta"
+
+    lineages = Lineages()
+    seq_codes = read_taxonomy(taxonomy, lineages) if taxonomy is not None else None
+
+    # Lineage code of each tax_id, tax_ids of dereplicated sequences and the
+    # distinct lineages of those that are in conflict.
+    tax_lineages: list[int] = []
+    tax_ids: dict[bytes, int] = {}
+    conflicts: dict[int, set[int]] = {}
+
+    num_records = num_untrimmed = num_missing = num_duplicates = 0
+
+    executor = ProcessPoolExecutor(max_workers=cfg.threads) if cfg.threads > 1 else None
+    chunks = (
+        (chunk, cfg.region) for chunk in chunked(read_fasta(fasta), cfg.chunk_size)
+    )
+
+    try:
+        records = (
+            record
+            for processed in imap_ordered(
+                executor, _process_chunk, chunks, cfg.threads * CHUNKS_PER_WORKER
+            )
+            for record in processed
+        )
+
+        with db_fasta.open("w") as f:
+            for header, seq, digest in records:
+                num_records += 1
+                seq_id, _, description = header.partition(" ")
+
+                match seq_codes:
+                    case None if description:
+                        code = lineages.parse(description)
+                    case None:
+                        code = None
+                    case _:
+                        code = seq_codes.get(seq_id)
+
+                if code is None:
+                    num_missing += 1
+                    continue
+
+                if seq is None:
+                    num_untrimmed += 1
+                    continue
+
+                if cfg.dereplicate and (tax_id := tax_ids.get(digest)) is not None:
+                    num_duplicates += 1
+
+                    if (first_code := tax_lineages[tax_id]) != code:
+                        conflicts.setdefault(tax_id, {first_code}).add(code)
+                    continue
+
+                tax_id = len(tax_lineages)
+                tax_lineages.append(code)
+                if cfg.dereplicate:
+                    tax_ids[digest] = tax_id
+
+                write_fasta(f, short_header(seq_id, tax_id), seq)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    for tax_id, codes in conflicts.items():
+        lineage = lowest_common_lineage([lineages[code] for code in codes])
+        tax_lineages[tax_id] = lineages.code(lineage)
+
+    log.info(
+        f"{len(tax_lineages)} of {num_records} records written. "
+        f"Missing taxonomy: {num_missing}, primers not found: {num_untrimmed}, "
+        f"duplicates: {num_duplicates} ({len(conflicts)} with conflicting lineages)."
+    )
+
+    write_lineage(get_lineage_table(lineages, tax_lineages), db_fasta)
+    write_manifest(db_fasta, len(tax_lineages))
+
+    assert db_fasta.is_file()
+    return db_fasta
@@ -0,0 +1,64 @@
+from functools import lru_cache
+import re
+
+# 16S primer pairs (forward, reverse) of the variable regions, 5' to 3'.
+REGIONS = {
+    "V1-V2": ("AGAGTTTGATCMTGGCTCAG", "GCTGCCTCCCGTAGGAGT"),
+    "V1-V3": ("AGAGTTTGATCMTGGCTCAG", "ATTACCGCGGCTGCTGG"),
+    "V3-V4": ("CCTACGGGNGGCWGCAG", "GACTACHVGGGTATCTAATCC"),
+    "V3-V5": ("CCTACGGGNGGCWGCAG", "CCGYCAATTYMTTTRAGTTT"),
+    "V4": ("GTGYCAGCMGCCGCGGTAA", "GGACTACNVGGGTWTCTAAT"),
+    "V4-V5": ("GTGYCAGCMGCCGCGGTAA", "CCGYCAATTYMTTTRAGTTT"),
+    "V6-V8": ("AAACTYAAAKGAATTGRCGG", "ACGGGCGGTGTGTRC"),
+    "V1-V9": ("AGAGTTTGATCMTGGCTCAG", "GGTTACCTTGTTACGACTT"),
+}
+
+IUPAC = {
+    "A": "A",
+    "C": "C",
+    "G": "G",
+    "T": "T",
+    "R": "[AG]",
+    "Y": "[CT]",
+    "S": "[CG]",
+    "W": "[AT]",
+    "K": "[GT]",
+    "M": "[AC]",
+    "B": "[CGT]",
+    "D": "[AGT]",
+    "H": "[ACT]",
+    "V": "[ACG]",
+    "N": "[ACGT]",
+}
+
+COMPLEMENT = str.maketrans("ACGTRYSWKMBDHVN", "TGCAYRSWMKVHDBN")
+
+
+def reverse_complement(primer: str) -> str:
+    return primer.translate(COMPLEMENT)[::-1]
+
+
+def primer_pattern(primer: str) -> str:
+    return "".join(IUPAC[base] for base in primer)
+
+
+@lru_cache
+def region_pattern(region: str) -> re.Pattern:
+    """Amplicon of region on the forward strand, primers excluded."""
+    if region not in REGIONS:
+        raise ValueError(f"Unknown region {region}, expected one of {list(REGIONS)}")
+
+    fwd, rev = REGIONS[region]
+    fwd_pattern = primer_pattern(fwd)
+    rev_pattern = primer_pattern(reverse_complement(rev))
+
+    return re.compile(f"{fwd_pattern}(?P<amplicon>[A-Z]+?){rev_pattern}")
+
+
+def trim(seq: str, region: str) -> str | None:
+    """Part of seq between the primers of region, None if a primer is missing."""
+    match region_pattern(region).search(seq):
+        case None:
+            return None
+        case _ as amplicon_match:
+            return amplicon_match.group("amplicon")
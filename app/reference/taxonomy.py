@@ -0,0 +1,104 @@
+from pathlib import Path
+import re
+from common.lineage import RANKS
+
+# Rank prefixes of QIIME style lineages, e.g. d__ (GTDB) or D_0__ (SILVA).
+RANK_PREFIX_PAT = re.compile(r"^[a-zA-Z](_\d+)?__")
+
+Lineage = tuple[str, ...]
+
+
+def sanitize(s: str) -> str:
+    return s.lower().replace(" ", "_")
+
+
+def unclassified(name: str) -> str:
+    """Name of the ranks below name, if they are unknown or ambiguous."""
+    return name if name.endswith("_unclassified") else f"{name}_unclassified"
+
+
+def parse_lineage(lineage: str) -> Lineage:
+    """One sanitized name per rank of a ';' separated lineage.
+
+    Missing (trailing or empty) ranks are named after the lowest known rank.
+    """
+    names = [RANK_PREFIX_PAT.sub("", name.strip()) for name in lineage.split(";")]
+
+    while names and not names[-1]:
+        names.pop()
+
+    if len(names) > len(RANKS):
+        raise ValueError(f"More than {len(RANKS)} ranks in {lineage}")
+
+    parsed = []
+    for name in names + [""] * (len(RANKS) - len(names)):
+        match name, parsed:
+            case "", []:
+                raise ValueError(f"Missing {RANKS[0]} in {lineage}")
+            case "", _:
+                parsed.append(unclassified(parsed[-1]))
+            case _:
+                parsed.append(sanitize(name))
+
+    return tuple(parsed)
+
+
+def lowest_common_lineage(lineages: list[Lineage]) -> Lineage:
+    """Ranks that all lineages agree on, the ones below are unclassified."""
+    common = []
+    for names in zip(*lineages):
+        if len(set(names)) > 1:
+            break
+        common.append(names[0])
+
+    if not common:
+        common.append(unclassified("root"))
+
+    return tuple(common + [unclassified(common[-1])] * (len(RANKS) - len(common)))
+
+
+class Lineages:
+    """Distinct lineages, each referred to by an integer code."""
+
+    def __init__(self):
+        self.lineages: list[Lineage] = []
+        self.codes: dict[Lineage, int] = {}
+        self.parsed: dict[str, int] = {}
+
+    def __getitem__(self, code: int) -> Lineage:
+        return self.lineages[code]
+
+    def code(self, lineage: Lineage) -> int:
+        if (code := self.codes.get(lineage)) is None:
+            code = self.codes[lineage] = len(self.lineages)
+            self.lineages.append(lineage)
+
+        return code
+
+    def parse(self, lineage: str) -> int:
+        """Code of an unparsed lineage, each distinct string is only parsed once."""
+        if (code := self.parsed.get(lineage)) is None:
+            code = self.parsed[lineage] = self.code(parse_lineage(lineage))
+
+        return code
+
+
+def read_taxonomy(taxonomy: Path, lineages: Lineages) -> dict[str, int]:
+    """Map each sequence id to the code of its lineage.
+
+    Reads a two column (id, lineage) tsv, which is the format of the SILVA
+    and GTDB taxonomy files distributed for QIIME. A header line is skipped
+    if present.
+    """
+    seq_codes: dict[str, int] = {}
+
+    with taxonomy.open("r") as f:
+        for i, line in enumerate(f):
+            seq_id, _, lineage = line.rstrip("\n").partition("\t")
+
+            if i == 0 and seq_id.lower() in ("feature id", "id", "seq_id"):
+                continue
+
+            seq_codes[seq_id] = lineages.parse(lineage)
+
+    return seq_codes
@@ -0,0 +1,52 @@
+import argparse
+import logging
+from pathlib import Path
+from common.log import configure_logging
+from classification.report import write_reports
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.append(str(PROJECT_ROOT))
+
+log = logging.getLogger(__name__)
+
+
+def find_sample_dirs(outdir: Path, sample_names: list[str] | None) -> list[Path]:
+    """Sample directories of a finished run that have results to plot."""
+    sample_dirs = sorted(
+        parsed_tsv.parent
+        for parsed_tsv in outdir.glob("*/parsed.tsv")
+        if (parsed_tsv.parent / "otutab.tsv").is_file()
+    )
+
+    if sample_names:
+        sample_dirs = [d for d in sample_dirs if d.name in sample_names]
+
+    return sample_dirs
+
+
+if __name__ == "__main__":
+    configure_logging()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o", "--outdir", required=True, help="Output directory of a run."
+    )
+    parser.add_argument(
+        "--samples",
+        nargs="+",
+        required=False,
+        default=None,
+        help="Only write reports for these samples.",
+    )
+    args = parser.parse_args()
+
+    outdir = Path(args.outdir)
+    if not outdir.is_dir():
+        raise NotADirectoryError(outdir)
+
+    sample_dirs = find_sample_dirs(outdir, args.samples)
+    if not sample_dirs:
+        log.warning("No samples with results found.")
+
+    write_reports(sample_dirs, outdir)
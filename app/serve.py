@@ -0,0 +1,77 @@
+import argparse
+import logging
+import signal
+from pathlib import Path
+from classification.config import SintaxConfig
+from classification.daemon import SintaxServer, is_serving
+from classification.kmer_index import MAX_KMER_SIZE
+from common.file import _file
+from common.log import configure_logging
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.append(str(PROJECT_ROOT))
+
+log = logging.getLogger(__name__)
+
+ALLOWED_FASTA_ENDINGS = (".fasta",)
+
+
+def main(database: Path, socket_path: Path, kmer_size: int) -> None:
+    """Classify asvs for main.py --sintax_daemon until stopped.
+
+    The k-mer index of database is loaded once, and reloaded if database
+    changes.
+    """
+    if socket_path.exists():
+        if is_serving(socket_path, database, kmer_size):
+            sys.exit(f"A sintax daemon is already running at {socket_path}.")
+
+        # Left behind by a daemon that did not shut down.
+        socket_path.unlink()
+
+    server = SintaxServer(socket_path, database, kmer_size)
+
+    # Shut down cleanly on SIGTERM too, not just on Ctrl-C.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    log.info(f"Serving {database} at {socket_path}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    configure_logging()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d", "--database", help="Path to database fasta", required=True
+    )
+    parser.add_argument(
+        "--socket",
+        required=True,
+        type=str,
+        help="Unix socket to listen on, pass the same path to main.py "
+        "--sintax_daemon.",
+    )
+    parser.add_argument(
+        "--kmer_size",
+        type=int,
+        default=SintaxConfig().kmer_size,
+        help=f"k-mer size, at most {MAX_KMER_SIZE}.",
+    )
+    args = parser.parse_args()
+
+    if not 1 <= args.kmer_size <= MAX_KMER_SIZE:
+        parser.error(f"--kmer_size must be between 1 and {MAX_KMER_SIZE}")
+
+    main(
+        _file(args.database, ALLOWED_FASTA_ENDINGS),
+        Path(args.socket),
+        args.kmer_size,
+    )
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Modules are imported as in the scripts, relative to the app directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,41 @@
+import pytest
+from blast.config import ParseConfig
+from blast.parse import parse_blast_tsv
+
+# reference, asv, pident
+HITS = [
+    ("ref_a;s:a", "asv_0", 99.0),
+    ("ref_b;s:b", "asv_0", 100.0),
+    ("ref_c;s:c", "asv_0", 100.0),
+    ("ref_d;s:d", "asv_0", 98.0),
+    ("ref_e;s:e", "asv_1", 95.0),
+]
+
+
+@pytest.fixture
+def blast_tsv(tmp_path):
+    blast_tsv = tmp_path / "blast.tsv"
+    blast_tsv.write_text(
+        "".join(
+            f"{ref}\t100\t1\t100\t1\t{asv}\t100\t1\t100\t1\t100\t{pident}\n"
+            for ref, asv, pident in HITS
+        )
+    )
+    return blast_tsv
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_best_hit(blast_tsv, chunk_size):
+    df = parse_blast_tsv(blast_tsv, cfg=ParseConfig(chunk_size=chunk_size))
+
+    assert df["subject_id"].tolist() == ["asv_0", "asv_1"]
+    assert df["species"].tolist() == ["b", "e"]
+    assert df["num_ties"].tolist() == [2, 1]
+
+
+def test_top_n(blast_tsv):
+    df = parse_blast_tsv(blast_tsv, cfg=ParseConfig(top_n=3))
+
+    # Ties are reported in blast.tsv order, up to top_n hits per asv.
+    assert df["species"].tolist() == ["b", "c", "a", "e"]
+    assert df["rank"].tolist() == [1, 1, 2, 1]
@@ -0,0 +1,41 @@
+import time
+from distributed.broker import FileBroker, QueueConfig, Task
+
+
+def make_broker(tmp_path, **cfg) -> FileBroker:
+    broker = FileBroker(tmp_path, QueueConfig(**cfg))
+    broker.put(Task(task_id="t", func="tasks.run", args=(), cfg=broker.cfg))
+
+    return broker
+
+
+def test_claim(tmp_path):
+    broker = make_broker(tmp_path)
+    task = broker.claim("w1")
+
+    assert task.task_id == "t"
+    assert broker.claim("w2") is None
+    assert broker.heartbeat(task, "w1") and not broker.heartbeat(task, "w2")
+
+
+def test_requeue_without_heartbeat(tmp_path):
+    broker = make_broker(tmp_path, heartbeat_timeout=0.2)
+
+    # The worker died between claiming the task and its first heartbeat.
+    (tmp_path / "pending" / "t.task").rename(tmp_path / "running" / "t.task")
+    assert broker.requeue_stale() == []
+
+    time.sleep(0.3)
+    assert broker.requeue_stale() == ["t"]
+    assert broker.claim("w2").attempt == 1
+
+
+def test_max_attempts_from_task(tmp_path):
+    broker = make_broker(tmp_path, max_attempts=1)
+
+    # A worker with default settings still follows those of the run.
+    worker_broker = FileBroker(tmp_path)
+    task = worker_broker.claim("w1")
+    worker_broker.fail(task, "w1", "broken")
+
+    assert broker.collect(["t"]) == ({}, {"t": "broken"})
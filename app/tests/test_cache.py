@@ -0,0 +1,45 @@
+from pathlib import Path
+import pytest
+from common.cache import cached, configure_cache
+
+calls = []
+
+
+@cached("out.txt")
+def stage(text: str, outdir: Path) -> Path:
+    calls.append(text)
+    out_txt = outdir / "out.txt"
+
+    # Written in place, as the external tools do.
+    with out_txt.open("w") as f:
+        f.write(text)
+
+    return out_txt
+
+
+@pytest.fixture
+def outdir(tmp_path):
+    configure_cache(tmp_path / "cache")
+    calls.clear()
+    (outdir := tmp_path / "sample").mkdir()
+
+    yield outdir
+
+    configure_cache(None)
+
+
+def test_outputs_are_linked(outdir):
+    stage("a", outdir)
+    (outdir / "out.txt").unlink()
+
+    assert stage("a", outdir).read_text() == "a"
+    assert calls == ["a"]
+    assert (outdir / "out.txt").stat().st_nlink == 2
+
+
+def test_rerun_does_not_overwrite_entry(outdir):
+    stage("a", outdir)
+    stage("b", outdir)
+
+    assert stage("a", outdir).read_text() == "a"
+    assert calls == ["a", "b"]
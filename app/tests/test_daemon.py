@@ -0,0 +1,51 @@
+import socketserver
+import threading
+import pytest
+from benchmark.synthetic import make_references, write_db_fasta
+from classification.daemon import SintaxServer, is_serving
+
+
+def serve(server: socketserver.BaseServer) -> None:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def db_fasta(tmp_path):
+    return write_db_fasta(tmp_path / "db.fasta", make_references(5, seq_len=50))
+
+
+def test_serving(tmp_path, db_fasta):
+    socket_path = tmp_path / "sintax.sock"
+    server = SintaxServer(socket_path, db_fasta, 15)
+    serve(server)
+
+    try:
+        assert is_serving(socket_path, db_fasta, 15)
+        assert not is_serving(socket_path, db_fasta, 13)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_nothing_listening(tmp_path, db_fasta):
+    assert not is_serving(tmp_path / "sintax.sock", db_fasta, 15)
+
+
+@pytest.mark.parametrize(
+    "reply", [b"", b"\n", b"not json\n", b"\xff\xfe\n", b"[1, 2]\n", b"{}\n"]
+)
+def test_garbled_reply(tmp_path, db_fasta, reply):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.rfile.readline()
+            self.wfile.write(reply)
+
+    socket_path = tmp_path / "sintax.sock"
+    server = socketserver.UnixStreamServer(str(socket_path), Handler)
+    serve(server)
+
+    try:
+        assert not is_serving(socket_path, db_fasta, 15)
+    finally:
+        server.shutdown()
+        server.server_close()
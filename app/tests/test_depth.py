@@ -0,0 +1,30 @@
+import pytest
+from common.fasta import read_fasta, write_fasta
+
+# Imports the tool wrappers, i.e. needs usearch on PATH.
+depth = pytest.importorskip("cluster.depth", exc_type=ImportError)
+
+
+def test_count_mapped_reads(tmp_path, monkeypatch):
+    asv_fasta, otutab_tsv = tmp_path / "asv.fasta", tmp_path / "otutab.tsv"
+    with asv_fasta.open("w") as f:
+        for i, seq in enumerate(["AAAA", "CCCC", "GGGG", "TTTT"]):
+            write_fasta(f, f"asv_{i}", seq)
+    otutab_tsv.write_text("asv\treads\nasv_0\t5\nasv_1\t4\nasv_2\t3\nasv_3\t2\n")
+
+    # asv_1 gets no reads, asv_3 gets the most.
+    mapped = ["asv_0", "asv_2", "asv_2", "asv_3", "asv_3", "asv_3"]
+    mapped_tsv = tmp_path / "mapped.tsv"
+    mapped_tsv.write_text("".join(f"read_{i}\t{asv}\n" for i, asv in enumerate(mapped)))
+    monkeypatch.setattr(depth, "usearch_map", lambda *_: mapped_tsv)
+
+    depth.count_mapped_reads(
+        tmp_path / "reads.fasta", asv_fasta, otutab_tsv, tmp_path, None
+    )
+
+    assert otutab_tsv.read_text() == "asv\treads\nasv_0\t3\nasv_1\t2\nasv_2\t1\n"
+    assert list(read_fasta(asv_fasta)) == [
+        ("asv_0", "TTTT"),
+        ("asv_1", "GGGG"),
+        ("asv_2", "AAAA"),
+    ]
@@ -0,0 +1,22 @@
+import pytest
+from benchmark.importtime import (
+    BUDGET_MS,
+    ENTRY_POINTS,
+    importtime,
+    lazy_violations,
+    total_ms,
+)
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point(module):
+    # Entry points that wrap the external tools only import with them on PATH.
+    pytest.importorskip(module, exc_type=ImportError)
+
+    # The fastest of a few runs, as in benchmark.importtime.
+    df = min(
+        (importtime(module) for _ in range(3)), key=lambda df: total_ms(df, module)
+    )
+
+    assert lazy_violations(df) == []
+    assert total_ms(df, module) < BUDGET_MS
@@ -0,0 +1,18 @@
+import pytest
+from benchmark.synthetic import make_references, write_db_fasta
+from classification.kmer_index import encode_kmers, get_kmer_index
+
+
+def test_encode_kmers():
+    # K-mers with an N are skipped.
+    assert encode_kmers("ACGTNACGT", 4).tolist() == [27]
+    assert encode_kmers("ACGTACGT", 4).tolist() == [27, 108, 177, 198]
+    assert encode_kmers("T" * 16, 16).tolist() == [2**32 - 1]
+
+
+@pytest.mark.parametrize("kmer_size", [0, 17])
+def test_kmer_size_out_of_range(tmp_path, kmer_size):
+    db_fasta = write_db_fasta(tmp_path / "db.fasta", make_references(5, seq_len=50))
+
+    with pytest.raises(ValueError, match="between 1 and 16"):
+        get_kmer_index(db_fasta, kmer_size)
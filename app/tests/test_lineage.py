@@ -0,0 +1,38 @@
+import pytest
+from benchmark.synthetic import make_references, write_db_fasta, write_lineage_db
+from common.lineage import (
+    LineageTableError,
+    lineage_path,
+    load_lineage,
+    manifest_path,
+)
+
+
+def test_load_lineage(tmp_path):
+    refs = make_references(20, seq_len=50)
+    lineage = load_lineage(write_lineage_db(tmp_path / "db.fasta", refs))
+
+    assert lineage.loc[refs[3].tax_id, "species"] == refs[3].lineage[-1]
+
+
+def test_full_headers_without_lineage_table(tmp_path):
+    db_fasta = write_db_fasta(tmp_path / "db.fasta", make_references(20, seq_len=50))
+
+    assert load_lineage(db_fasta) is None
+
+
+def test_short_headers_without_manifest(tmp_path):
+    db_fasta = write_lineage_db(tmp_path / "db.fasta", make_references(20, seq_len=50))
+    manifest_path(db_fasta).unlink()
+
+    with pytest.raises(LineageTableError, match="missing"):
+        load_lineage(db_fasta)
+
+
+def test_short_headers_with_outdated_lineage_table(tmp_path):
+    db_fasta = write_lineage_db(tmp_path / "db.fasta", make_references(20, seq_len=50))
+    write_lineage_db(tmp_path / "other.fasta", make_references(30, seq_len=50))
+    lineage_path(tmp_path / "other.fasta").replace(lineage_path(db_fasta))
+
+    with pytest.raises(LineageTableError, match="does not match"):
+        load_lineage(db_fasta)
@@ -0,0 +1,147 @@
+from collections import Counter
+import pytest
+from benchmark.synthetic import make_references, write_db_fasta
+from common.fasta import read_fasta, write_fasta
+
+# Imports the tool wrappers, i.e. needs fastq_rs and usearch on PATH.
+sample = pytest.importorskip("live.sample", exc_type=ImportError)
+
+REFS = make_references(4, seq_len=60)
+
+# References of the reads in each fastq chunk.
+CHUNKS = {
+    "chunk_0": [0, 0, 0, 1, 1, 2],
+    "chunk_1": [0, 2, 3],
+    "chunk_2": [3],
+}
+
+
+def fake_preprocess(fastq, outdir, cfg):
+    fasta = outdir / "preprocess.fasta"
+
+    with fasta.open("w") as f:
+        for i, ref in enumerate(CHUNKS[fastq.name.removesuffix(".fastq.gz")]):
+            write_fasta(f, f"{fastq.name}_{i} ref={ref}", REFS[ref].seq)
+
+    return fasta
+
+
+def fake_map(reads_fasta, asv_fasta, outdir, cfg):
+    """Reads map to the asv with the same sequence."""
+    asvs = {seq: header for header, seq in read_fasta(asv_fasta)}
+    mapped_tsv = outdir / "mapped.tsv"
+
+    with mapped_tsv.open("w") as f:
+        for header, seq in read_fasta(reads_fasta):
+            if seq in asvs:
+                f.write(f"{header}\t{asvs[seq]}\n")
+
+    return mapped_tsv
+
+
+def fake_cluster(reads_fasta, outdir, cfg):
+    """One centroid per distinct sequence, sorted by decreasing size."""
+    sizes = Counter(seq for _, seq in read_fasta(reads_fasta))
+    centroids = outdir / "centroids.fasta"
+
+    with centroids.open("w") as f:
+        for i, (seq, size) in enumerate(sizes.most_common()):
+            write_fasta(f, f"centroid_{i};size={size};", seq)
+
+    return centroids
+
+
+def fake_sintax(asv_fasta, database, outdir):
+    """Every bootstrap iteration hits the reference the asv was clustered from."""
+    headers = {ref.seq: ref.header for ref in REFS}
+    sintax_tsv = outdir / "sintax.tsv"
+
+    with sintax_tsv.open("w") as f:
+        for asv, seq in read_fasta(asv_fasta):
+            for iteration in range(10):
+                f.write(f"{asv}\t{headers[seq]}\t32\t{iteration}\n")
+
+    return sintax_tsv
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    monkeypatch.setattr(sample, "preprocess", fake_preprocess)
+    monkeypatch.setattr(sample, "usearch_map", fake_map)
+    monkeypatch.setattr(sample, "usearch_cluster", fake_cluster)
+    monkeypatch.setattr(sample, "run_sintax", fake_sintax)
+
+    database = write_db_fasta(tmp_path / "db.fasta", REFS)
+    fastqs = {name: tmp_path / f"{name}.fastq.gz" for name in CHUNKS}
+
+    def load():
+        return sample.LiveSample(tmp_path / "s", database, 0.8)
+
+    return load, fastqs
+
+
+def outputs(live_sample):
+    return {name: path.read_bytes() for name, path in live_sample.outputs().items()}
+
+
+def species_reads(live_sample):
+    return sample.species_composition(live_sample.sample_dir).to_dict()
+
+
+def test_two_rounds(live):
+    load, fastqs = live
+    live_sample = load()
+
+    live_sample.update([fastqs["chunk_0"]])
+
+    # The singleton read of reference 2 waits for the next round.
+    assert sample.read_counts(live_sample.otutab_tsv) == {"asv_0": 3, "asv_1": 2}
+    assert species_reads(live_sample) == {"species_0": 3, "species_1": 2}
+    assert len(list(read_fasta(live_sample.pending_fasta))) == 1
+
+    live_sample.update([fastqs["chunk_1"]])
+
+    assert sample.read_counts(live_sample.otutab_tsv) == {
+        "asv_0": 4,
+        "asv_1": 2,
+        "asv_2": 2,
+    }
+    assert species_reads(live_sample) == {
+        "species_0": 4,
+        "species_1": 2,
+        "species_2": 2,
+    }
+    assert [seq for _, seq in read_fasta(live_sample.pending_fasta)] == [REFS[3].seq]
+
+    reloaded = load()
+    assert reloaded.state.rounds == 2
+    assert reloaded.state.num_asvs == 3
+
+
+def test_failed_round(live, monkeypatch):
+    load, fastqs = live
+    live_sample = load()
+    live_sample.update([fastqs["chunk_0"]])
+    live_sample.update([fastqs["chunk_1"]])
+    committed = outputs(live_sample)
+
+    def broken_sintax(asv_fasta, database, outdir):
+        raise RuntimeError("sintax_rs failed")
+
+    # The round finds a new asv, which fails to classify.
+    monkeypatch.setattr(sample, "run_sintax", broken_sintax)
+    with pytest.raises(RuntimeError):
+        live_sample.update([fastqs["chunk_2"]])
+
+    assert outputs(live_sample) == committed
+    assert live_sample.state.rounds == 2
+
+    # Run again once the classification works.
+    monkeypatch.setattr(sample, "run_sintax", fake_sintax)
+    live_sample = load()
+    assert live_sample.state.rounds == 2
+
+    live_sample.update([fastqs["chunk_2"]])
+
+    assert live_sample.state.rounds == 3
+    assert sample.read_counts(live_sample.otutab_tsv)["asv_3"] == 2
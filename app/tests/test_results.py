@@ -0,0 +1,39 @@
+import pandas as pd
+from benchmark.levels import coded_results, legacy_results
+from benchmark.synthetic import (
+    make_references,
+    write_lineage_db,
+    write_otutab,
+    write_sintax_tsv,
+)
+from common.lineage import load_lineage
+
+
+def as_written(dfs: tuple[pd.DataFrame, pd.DataFrame]) -> list[str]:
+    return [df.to_csv(sep="\t", index=False) for df in dfs]
+
+
+def test_full_headers(tmp_path):
+    refs = make_references(200, seq_len=50)
+    sintax_tsv = write_sintax_tsv(tmp_path / "sintax.tsv", refs, 100, 20)
+    otutab_df = pd.read_csv(write_otutab(tmp_path / "otutab.tsv", 100), sep="\t")
+
+    assert as_written(coded_results(sintax_tsv, otutab_df, 0.5)) == as_written(
+        legacy_results(sintax_tsv, otutab_df, 0.5)
+    )
+
+
+def test_short_headers_with_lineage_table(tmp_path):
+    refs = make_references(200, seq_len=50)
+    full_tsv = write_sintax_tsv(tmp_path / "full.tsv", refs, 100, 20)
+    short_tsv = write_sintax_tsv(
+        tmp_path / "short.tsv", refs, 100, 20, short_headers=True
+    )
+    otutab_df = pd.read_csv(write_otutab(tmp_path / "otutab.tsv", 100), sep="\t")
+
+    lineage = load_lineage(write_lineage_db(tmp_path / "db.fasta", refs))
+    assert lineage is not None
+
+    assert as_written(coded_results(short_tsv, otutab_df, 0.5, lineage)) == as_written(
+        legacy_results(full_tsv, otutab_df, 0.5)
+    )
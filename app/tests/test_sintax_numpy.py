@@ -0,0 +1,52 @@
+import pytest
+from benchmark.sintax_engine import accuracy, consensus, write_asvs
+from benchmark.synthetic import make_references, write_db_fasta
+from classification.config import SintaxConfig
+from classification.kmer_index import get_kmer_index
+from classification.sintax_numpy import bootstrap, sintax_numpy
+from reference.primers import reverse_complement
+
+# Lowest accepted fraction of synthetic asvs (3% errors, half of them on the
+# minus strand) with the true consensus hit. The engine is approximate, since
+# only the best candidates are counted (see sintax_numpy.NUM_CANDIDATES).
+MIN_ACCURACY = {
+    "kingdom": 0.99,
+    "phylum": 0.99,
+    "class": 0.99,
+    "order": 0.99,
+    "family": 0.99,
+    "genus": 0.97,
+    "species": 0.85,
+}
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    tmpdir = tmp_path_factory.mktemp("db")
+    refs = make_references(300, seq_len=1500)
+
+    return refs, write_db_fasta(tmpdir / "db.fasta", refs)
+
+
+def test_minus_strand(db):
+    refs, db_fasta = db
+    index, cfg = get_kmer_index(db_fasta, 15), SintaxConfig(engine="numpy")
+
+    for seq in (refs[7].seq, reverse_complement(refs[7].seq)):
+        hits = bootstrap(seq, index, cfg)
+
+        assert len(hits) == cfg.num_bootstrap
+        assert {index.header(ref) for ref, _, _ in hits} == {refs[7].header}
+
+
+def test_accuracy(db, tmp_path):
+    refs, db_fasta = db
+    truth = write_asvs(tmp_path / "asv.fasta", refs, 200, error_rate=0.03, seed=1)
+
+    sintax_tsv = sintax_numpy(
+        tmp_path / "asv.fasta", db_fasta, tmp_path, SintaxConfig(engine="numpy")
+    )
+    level_accuracy = accuracy(consensus(sintax_tsv, 0.8), truth)
+
+    for level, min_accuracy in MIN_ACCURACY.items():
+        assert level_accuracy[level] >= min_accuracy, level
@@ -0,0 +1,66 @@
+import logging
+import pytest
+
+# Imports the tool wrappers, i.e. needs fastq_rs and usearch on PATH.
+watch = pytest.importorskip("watch", exc_type=ImportError)
+
+
+def fake_update(self, fastqs):
+    if self.sample_dir.name == "bad":
+        raise RuntimeError("broken chunk")
+
+    self.state.fastqs += [fastq.resolve() for fastq in fastqs]
+    self.state.rounds += 1
+    self.state_json.write_text(self.state.model_dump_json())
+
+
+def add_chunk(input_dir, sample, name):
+    (input_dir / sample).mkdir(parents=True, exist_ok=True)
+    (input_dir / sample / f"{name}.fastq.gz").touch()
+
+
+def run(input_dir, outdir):
+    return watch.main(
+        input_dir,
+        outdir / "db.fasta",
+        0.8,
+        outdir,
+        interval=0.01,
+        settle_sec=0,
+        idle_timeout=0.05,
+    )
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch.LiveSample, "update", fake_update)
+    input_dir, outdir = tmp_path / "fastq_pass", tmp_path / "out"
+    outdir.mkdir()
+
+    add_chunk(input_dir, "good", "chunk_0")
+    add_chunk(input_dir, "bad", "chunk_0")
+
+    return input_dir, outdir
+
+
+def test_failed_sample(dirs, caplog):
+    with caplog.at_level(logging.ERROR):
+        samples = run(*dirs)
+
+    assert samples["good"].state.rounds == 1
+    assert samples["bad"].state.rounds == 0
+    assert "bad: failed to process chunk_0.fastq.gz" in caplog.text
+
+
+def test_restart(dirs):
+    input_dir, outdir = dirs
+    run(input_dir, outdir)
+    add_chunk(input_dir, "good", "chunk_1")
+
+    samples = run(input_dir, outdir)
+
+    assert [fastq.name for fastq in samples["good"].state.fastqs] == [
+        "chunk_0.fastq.gz",
+        "chunk_1.fastq.gz",
+    ]
+    assert samples["good"].state.rounds == 2
@@ -0,0 +1,143 @@
+import argparse
+import logging
+from pathlib import Path
+from common.cache import configure_cache
+from common.file import _file
+from common.log import configure_logging
+from live.sample import LiveSample
+from live.watcher import DirectoryWatcher, watch
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.append(str(PROJECT_ROOT))
+
+log = logging.getLogger(__name__)
+
+ALLOWED_FASTA_ENDINGS = (".fasta",)
+
+
+def main(
+    input_dir: Path,
+    database: Path,
+    sintax_threshold: float,
+    outdir: Path,
+    interval: float = 60.0,
+    settle_sec: float = 30.0,
+    idle_timeout: float | None = None,
+) -> dict[str, LiveSample]:
+    """Analyze fastq chunks as they appear in input_dir, until idle_timeout.
+
+    Chunks are grouped into samples by the directory they are in (e.g.
+    fastq_pass/barcode01). Each sample is updated once per batch of new chunks.
+    A sample whose update fails is logged and skipped, the chunks of the
+    failed update are processed again after a restart.
+    """
+    samples: dict[str, LiveSample] = {}
+
+    # Chunks processed before a restart are not processed again.
+    for live_dir in sorted(outdir.glob("*/live")):
+        try:
+            samples[live_dir.parent.name] = LiveSample(
+                live_dir.parent, database, sintax_threshold
+            )
+        except Exception:
+            log.exception(f"{live_dir.parent.name}: failed to load.")
+
+    seen = [fastq for sample in samples.values() for fastq in sample.state.fastqs]
+    watcher = DirectoryWatcher(input_dir, settle_sec=settle_sec, seen=seen)
+
+    for fastqs in watch(watcher, interval, idle_timeout):
+        by_sample: dict[str, list[Path]] = {}
+        for fastq in fastqs:
+            by_sample.setdefault(fastq.parent.name, []).append(fastq)
+
+        for sample_name, sample_fastqs in by_sample.items():
+            log.info(f"{sample_name}: {len(sample_fastqs)} new fastq file(s).")
+
+            try:
+                if sample_name not in samples:
+                    sample_dir = outdir / sample_name
+                    sample_dir.mkdir(exist_ok=True)
+                    samples[sample_name] = LiveSample(
+                        sample_dir, database, sintax_threshold
+                    )
+
+                samples[sample_name].update(sample_fastqs)
+            except Exception:
+                log.exception(
+                    f"{sample_name}: failed to process "
+                    f"{', '.join(fastq.name for fastq in sample_fastqs)}."
+                )
+
+    return samples
+
+
+if __name__ == "__main__":
+    configure_logging()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input_dir",
+        required=True,
+        help="Directory that fastq.gz chunks are written to, e.g. MinKNOW fastq_pass.",
+    )
+    parser.add_argument(
+        "-d", "--database", help="Path to database fasta", required=True
+    )
+    parser.add_argument("-o", "--outdir", required=True)
+    parser.add_argument(
+        "-s", "--sintax_threshold", type=float, required=False, default=0.80
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        required=False,
+        default=60.0,
+        help="Seconds between checks for new files.",
+    )
+    parser.add_argument(
+        "--settle_sec",
+        type=float,
+        required=False,
+        default=30.0,
+        help="Only process files that have not been modified for this many seconds.",
+    )
+    parser.add_argument(
+        "--idle_timeout",
+        type=float,
+        required=False,
+        default=None,
+        help="Stop once no new file has appeared for this many seconds.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        required=False,
+        default=None,
+        help="Stage cache directory, not used by default.",
+    )
+    args = parser.parse_args()
+
+    input_dir = Path(args.input_dir)
+    if not input_dir.is_dir():
+        raise NotADirectoryError(input_dir)
+
+    database = _file(args.database, ALLOWED_FASTA_ENDINGS)
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(exist_ok=True)
+
+    configure_cache(Path(args.cache_dir) if args.cache_dir else None)
+
+    try:
+        main(
+            input_dir,
+            database,
+            args.sintax_threshold,
+            outdir,
+            args.interval,
+            args.settle_sec,
+            args.idle_timeout,
+        )
+    except KeyboardInterrupt:
+        log.info("Stopped watching.")
@@ -0,0 +1,69 @@
+import argparse
+import logging
+import multiprocessing
+from pathlib import Path
+from common.log import configure_logging
+from distributed.broker import FileBroker
+from distributed.worker import work
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.append(str(PROJECT_ROOT))
+
+log = logging.getLogger(__name__)
+
+
+def main(
+    queue_dir: Path,
+    processes: int = 1,
+    idle_timeout: float | None = None,
+) -> None:
+    """Run tasks of main.py --distributed from queue_dir, on this node.
+
+    Each of the processes claims one task at a time, until the queue has been
+    empty for idle_timeout seconds (forever by default). Retry and heartbeat
+    settings come with the tasks, i.e. from the main.py run that queued them.
+    """
+    broker = FileBroker(queue_dir)
+
+    workers = [
+        multiprocessing.Process(target=work, args=(broker, idle_timeout))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    log.info(f"{processes} worker(s) running tasks from {queue_dir}.")
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    configure_logging()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-q",
+        "--queue",
+        required=True,
+        help="Queue directory of the run, <outdir>/.queue by default.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of tasks to run at a time on this node.",
+    )
+    parser.add_argument(
+        "--idle_timeout",
+        type=float,
+        default=None,
+        help="Stop once no task has been claimed for this many seconds.",
+    )
+    args = parser.parse_args()
+
+    try:
+        main(Path(args.queue), args.processes, args.idle_timeout)
+    except KeyboardInterrupt:
+        log.info("Stopped working.")